@@ -1,8 +1,12 @@
 # gemini_helper.py
+import asyncio
+import json
 import os
+import random
 from dotenv import load_dotenv
-import requests
+import httpx
 import logging
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -13,54 +17,254 @@ USE_LOCAL_LLM = os.getenv("USE_LOCAL_LLM", "false").lower() == "true"
 
 GEMINI_API_URL = os.getenv("GEMINI_API_URL")  # e.g., "https://api.mistral.ai/v1/chat/completions"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")  # if needed
+# Streaming endpoint; derived from GEMINI_API_URL (":generateContent" -> ":streamGenerateContent") when unset
+GEMINI_STREAM_URL = os.getenv("GEMINI_STREAM_URL")
 
+# HTTP client configuration
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "60"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", "10"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))  # in-flight requests
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))  # seconds
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "8"))
 
-def call_gemini_api(payload):
-    headers = {"Content-Type": "application/json"}
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+SERVICE_ERROR = "Error communicating with Gemini AI service."
+
+
+class GeminiError(Exception):
+    """A Gemini request failed; the message is safe to show to users."""
+
+
+def parse_gemini_response(api_response: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Extract (result, error) from a generateContent response body."""
+    # Get the first candidate (assuming the structure matches Postman results)
+    candidates = api_response.get("candidates", [])
+    if not candidates:
+        return None, "Gemini API returned no results."
+
+    # Extract the answer from the first candidate
+    candidate = candidates[0]
+    answer_text = candidate.get("content", {}).get("parts", [{}])[0].get("text", "").strip()
+
+    if candidate.get("finishReason") == "SAFETY":
+        logger.error("Gemini API blocked the response due to safety concerns.")
+        return None, "The response was blocked due to safety concerns. Please try rephrasing the input."
+
+    if not answer_text:
+        return None, "No answer text found in Gemini API response."
+
+    # Return the parsed answer and metadata
+    return {
+        "answer": answer_text,
+        "geminiMetadata": api_response.get("usageMetadata", {})
+    }, None
+
+
+def _error_message(response: httpx.Response) -> str:
     try:
-        # Make the request to the Gemini API
-        response = requests.post(
-            f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-            headers=headers,
-            json=payload
-        )
-
-        # Check for non-200 status codes
-        if response.status_code != 200:
-            error_message = response.json().get("error", {}).get("message", "Unknown error")
-            logger.error(f"Gemini API error: {error_message}")
-            return None, f"Error communicating with Gemini AI service."
-
-        # Parse the response JSON
-        api_response = response.json()
-        print(api_response)
+        return response.json().get("error", {}).get("message", "Unknown error")
+    except ValueError:
+        return response.text[:200] or "Unknown error"
+
+
+class GeminiClient:
+    """
+    Async Gemini client sharing one pooled keep-alive connection pool.
+
+    Requests are bounded by a semaphore and retried with jittered exponential
+    backoff on timeouts, connection errors and retryable status codes. Pass a
+    custom `transport` (e.g. httpx.MockTransport) or base URLs to test against
+    a local stub server.
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str] = GEMINI_API_URL,
+        api_key: Optional[str] = GEMINI_API_KEY,
+        stream_url: Optional[str] = GEMINI_STREAM_URL,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        max_retries: int = GEMINI_MAX_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.stream_url = stream_url or self._derive_stream_url(api_url)
+        self.max_retries = max_retries
+        self._max_concurrency = max_concurrency
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def _derive_stream_url(api_url: Optional[str]) -> Optional[str]:
+        if api_url and ":generateContent" in api_url:
+            return api_url.replace(":generateContent", ":streamGenerateContent")
+        return api_url
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(GEMINI_READ_TIMEOUT, connect=GEMINI_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=GEMINI_MAX_CONNECTIONS,
+                    max_keepalive_connections=GEMINI_MAX_KEEPALIVE
+                ),
+                headers={"Content-Type": "application/json"},
+                transport=self._transport
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._client
+
+    def _params(self, **extra) -> Dict[str, str]:
+        params = {"key": self.api_key} if self.api_key else {}
+        params.update(extra)
+        return params
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends it."""
+        if retry_after:
+            try:
+                return min(float(retry_after), GEMINI_BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** attempt))
+
+    async def generate(self, payload: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Call generateContent; returns (result, error) like the original helper."""
+        try:
+            response = await self._post_with_retries(payload)
+        except GeminiError as e:
+            return None, str(e)
 
-        # Debug: Log the full response to understand its structure
+        api_response = response.json()
         logger.debug(f"Gemini API full response: {api_response}")
+        return parse_gemini_response(api_response)
+
+    async def _post_with_retries(self, payload: Dict[str, Any]) -> httpx.Response:
+        client = self.client
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    response = await client.post(self.api_url, params=self._params(), json=payload)
+                if response.status_code == 200:
+                    return response
+                if response.status_code not in RETRYABLE_STATUS:
+                    logger.error(f"Gemini API error: {_error_message(response)}")
+                    raise GeminiError(SERVICE_ERROR)
+                logger.warning(f"Gemini API returned {response.status_code} (attempt {attempt + 1})")
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError as e:
+                logger.warning(f"Gemini API transport error (attempt {attempt + 1}): {e!r}")
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        logger.error(f"Gemini API failed after {self.max_retries + 1} attempts")
+        raise GeminiError(SERVICE_ERROR)
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream streamGenerateContent over SSE, yielding {"text": delta} for each
+        token chunk and finally {"done": True, "geminiMetadata": ...}.
+
+        Only connecting is retried: once tokens have been forwarded a retry
+        would duplicate them. Raises GeminiError on failure.
+        """
+        client = self.client
+        metadata: Dict[str, Any] = {}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                # Held while tokens stream, but not through the backoff between attempts
+                async with self._semaphore, client.stream(
+                    "POST", self.stream_url, params=self._params(alt="sse"), json=payload
+                ) as response:
+                    if response.status_code == 200:
+                        async for event in self._sse_events(response):
+                            candidate = (event.get("candidates") or [{}])[0]
+                            if candidate.get("finishReason") == "SAFETY":
+                                raise GeminiError(
+                                    "The response was blocked due to safety concerns. Please try rephrasing the input."
+                                )
+                            for part in candidate.get("content", {}).get("parts", []):
+                                if part.get("text"):
+                                    yield {"text": part["text"]}
+                            metadata = event.get("usageMetadata", metadata)
+                        yield {"done": True, "geminiMetadata": metadata}
+                        return
+
+                    await response.aread()
+                    if response.status_code not in RETRYABLE_STATUS:
+                        logger.error(f"Gemini API error: {_error_message(response)}")
+                        raise GeminiError(SERVICE_ERROR)
+                    logger.warning(f"Gemini stream returned {response.status_code} (attempt {attempt + 1})")
+                    retry_after = response.headers.get("Retry-After")
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                logger.warning(f"Gemini stream connect error (attempt {attempt + 1}): {e!r}")
+            except httpx.TransportError as e:
+                logger.error(f"Gemini stream interrupted: {e!r}")
+                raise GeminiError(SERVICE_ERROR)
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        logger.error(f"Gemini stream failed after {self.max_retries + 1} attempts")
+        raise GeminiError(SERVICE_ERROR)
+
+    @staticmethod
+    async def _sse_events(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+        """Decode the JSON `data:` payloads of a server-sent-events response."""
+        data_lines = []
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                data_lines.append(line[5:].strip())
+            elif not line and data_lines:
+                yield json.loads("\n".join(data_lines))
+                data_lines = []
+        if data_lines:
+            yield json.loads("\n".join(data_lines))
 
-        # Get the first candidate (assuming the structure matches Postman results)
-        candidates = api_response.get("candidates", [])
-        if not candidates:
-            return None, "Gemini API returned no results."
-
-        # Extract the answer from the first candidate
-        answer_text = candidates[0].get("content", {}).get("parts", [{}])[0].get("text", "").strip()
-        candidate = candidates[0]
-        
-        if candidate.get("finishReason") == "SAFETY":
-            logger.error("Gemini API blocked the response due to safety concerns.")
-            return None, "The response was blocked due to safety concerns. Please try rephrasing the input."
-        
-        if not answer_text:
-            return None, "No answer text found in Gemini API response."
-
-        # Return the parsed answer and metadata
-        return {
-            "answer": answer_text,
-            "geminiMetadata": api_response.get("usageMetadata", {})
-        }, None
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
+
+_default_client: Optional[GeminiClient] = None
+
+
+def get_gemini_client() -> GeminiClient:
+    """Process-wide client, so every request shares the connection pool."""
+    global _default_client
+    if _default_client is None:
+        _default_client = GeminiClient()
+    return _default_client
+
+
+async def call_gemini_api(payload):
+    """Call the Gemini API without blocking the event loop. Returns (result, error)."""
+    try:
+        return await get_gemini_client().generate(payload)
     except Exception as e:
         # Log any unexpected errors
         logger.error(f"Error communicating with Gemini API: {e}")
-        return None, "Error communicating with Gemini AI service."
\ No newline at end of file
+        return None, SERVICE_ERROR
+
+
+async def stream_gemini_api(payload) -> AsyncIterator[Dict[str, Any]]:
+    """Stream answer tokens from the Gemini API (see GeminiClient.stream)."""
+    async for event in get_gemini_client().stream(payload):
+        yield event
+
+
+async def close_gemini_client():
+    global _default_client
+    if _default_client is not None:
+        await _default_client.aclose()
+        _default_client = None
@@ -1,51 +1,46 @@
 # main.py
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+import threading
 import datetime
 import os
 import json
 import logging
 from pathlib import Path
 import re
-from typing import Any, List, Dict, Optional
+from typing import Any, Iterable, List, Dict, Optional
 import traceback
 
-from jinja2 import BaseLoader
-
 import requests
 
 import faiss
 import numpy as np
-from fastapi import FastAPI, Form, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
-from nltk.tokenize import word_tokenize
 from dotenv import load_dotenv
-import nltk
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt', quiet=True)
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords', quiet=True)
-
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet', quiet=True)
-from utils.pdf_extractor import PDFExtractor
-from utils.amharic_rag import ConcurrentTranslator
+from utils.pdf_extractor import PDFExtractor, shutdown_process_pool
 
 from utils.rag_processor import ChunkMetadata, RAGProcessor
-from utils.query_preprocessor import QueryPreprocessor
-from gemini_helper import call_gemini_api
+from utils.bm25_index import IncrementalBM25
+from utils.chunk_store import open_chunk_store
+from utils.index_snapshot import SnapshotPublisher, current_snapshot_name, load_snapshot
+from utils.ingestion import IngestionCoordinator
+from utils.job_queue import STAGE_COMMITTING, JobCancelError, JobQueue
+from utils.index_factory import (
+    ensure_id_addressable, index_type_of, needs_rebuild, new_index, rebuild_index, remove_ids, stored_ids
+)
+from utils.query_preprocessor import get_query_preprocessor
+from utils.result_cache import QueryResultCache
+from utils.answer_cache import SemanticAnswerCache, chunk_set_key, prompt_key
+from gemini_helper import SERVICE_ERROR, GeminiError, call_gemini_api, close_gemini_client, stream_gemini_api
 from summary import summarize_with_gemini
 
-from googletrans import Translator
-translator = ConcurrentTranslator()
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # Load environment variables
 load_dotenv()
@@ -55,10 +50,36 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 CACHE_DIR = Path("./cache")
-DOCUMENTS_STORE_PATH = CACHE_DIR / "documents_store.json"
+DOCUMENTS_STORE_PATH = CACHE_DIR / "documents_store.json"  # Legacy store, migrated into CHUNK_STORE_DIR
+CHUNK_STORE_DIR = CACHE_DIR / "chunk_store"
 FAISS_INDEX_PATH = CACHE_DIR / "faiss_index_file.index"
-BM25_STORE_PATH = CACHE_DIR / "bm25_store.json"  # New path for BM25 data
+BM25_STORE_PATH = CACHE_DIR / "bm25_store.json"  # Legacy, BM25 is rebuilt from the chunk store
 DIMENSION = 768    # for "all-MiniLM-L6-v2"
+FAISS_COMPACT_RATIO = float(os.getenv("FAISS_COMPACT_RATIO", "0.3"))  # tombstoned share that triggers compaction
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))  # seconds
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))  # answers per bot
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+# "background" binds the port right away and loads models and indexes behind the
+# readiness gate; "eager" loads everything before the server accepts connections
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background").lower()
+# "single": one process owns and persists the index (default)
+# "writer": as single, and publishes a read-only snapshot of the saved state to SNAPSHOT_DIR
+# "reader": serves searches from the latest snapshot (run with --workers N) and rejects writes
+INDEX_ROLE = os.getenv("INDEX_ROLE", "single").lower()
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", str(CACHE_DIR / "snapshots")))
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "2"))
+SNAPSHOT_MIN_INTERVAL = float(os.getenv("SNAPSHOT_MIN_INTERVAL", "5"))  # seconds between published generations
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))  # documents extracted and embedded at once
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "64"))  # documents committed per index update
+INGEST_BATCH_WINDOW = float(os.getenv("INGEST_BATCH_WINDOW", "0.5"))  # seconds to wait for documents still in flight
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(INGEST_CONCURRENCY)))  # queued jobs run at once
+JOBS_DB_PATH = CACHE_DIR / "jobs.sqlite"
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "1"))  # seconds between progress writes per job
+# Paths served while models and indexes are still loading
+UNGATED_PATHS = {"/", "/health", "/ready", "/docs", "/redoc", "/openapi.json"}
 
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -70,145 +91,413 @@ class GlobalState:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.initialize()
+            cls._instance.is_initialized = False
+            cls._instance.phase = "starting"  # starting -> loading_models -> loading_index -> ready | failed
+            cls._instance.startup_error = None
+            cls._instance.startup_timings = {"imports": round(IMPORT_SECONDS, 3)}  # stage -> seconds
+            cls._instance.snapshot_name = None  # snapshot being served (reader) or last published (writer)
+            cls._instance.snapshot_publisher = SnapshotPublisher(SNAPSHOT_DIR) if INDEX_ROLE == "writer" else None
+            cls._instance._save_lock = threading.Lock()  # one save at a time; they share the temporary index file
         return cls._instance
     
     def initialize(self):
-        """Initialize or load the FAISS index, BM25, and documents store"""
-        self.documents_store = []
-        self.tokenized_texts = []
-        self.is_initialized = False
-        
+        """Load the models once, then the FAISS index, BM25, and documents store"""
+        started = time.perf_counter()
+        try:
+            self.phase = "loading_models"
+            self._load_models()
+            self.startup_timings["models"] = round(time.perf_counter() - started, 3)
+
+            checkpoint = time.perf_counter()
+            # NLTK data and the lemmatizer, rather than on the first English query
+            get_query_preprocessor().warm_up()
+            self.startup_timings["query_preprocessor"] = round(time.perf_counter() - checkpoint, 3)
+
+            self.phase = "loading_index"
+            if INDEX_ROLE == "reader":
+                self.load_snapshot()
+            else:
+                self.load_state()
+                if self.snapshot_publisher is not None:
+                    self.publish_snapshot()
+        except Exception as e:
+            self.phase = "failed"
+            self.startup_error = str(e)
+            logger.error(f"Startup failed: {e}\n{traceback.format_exc()}")
+            raise
+
+        self.phase = "ready"
+        self.startup_timings["total"] = round(IMPORT_SECONDS + time.perf_counter() - started, 3)
+        breakdown = ", ".join(f"{stage} {seconds}s" for stage, seconds in self.startup_timings.items() if stage != "total")
+        logger.info(f"Startup complete in {self.startup_timings['total']}s ({breakdown})")
+
+    def _load_models(self):
+        """Load the embedding model. Only done once per process."""
+        self.rag_processor = RAGProcessor(
+            embedding_model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
+            batch_size=32,
+            # The on-disk embedding and stemmer caches have a single writer; readers keep theirs in memory
+            cache_dir=str(CACHE_DIR) if INDEX_ROLE != "reader" else None
+        )
+
+    def load_state(self):
+        """
+        Load the FAISS index, BM25, and documents store from disk, reusing the loaded models.
+        The new state is built first and swapped in under the exclusive state lock, so searches
+        keep using the old state meanwhile; run it off the event loop.
+        """
+        with self._save_lock:  # no save flushes the store being replaced meanwhile
+            previous_store = getattr(self, "chunk_store", None)
+            self._apply_state(*self._read_state())
+        if previous_store is not None:
+            previous_store.close()
+        self.is_initialized = True
+        logger.info("System fully initialized with Document store, FAISS index, and BM25.")
+
+    def _read_state(self):
+        """Read the FAISS index and chunk store and build chunks metadata and BM25 from them."""
+        checkpoint = time.perf_counter()
+
         # Initialize FAISS index first
+        loaded_index = False
         try:
             if FAISS_INDEX_PATH.exists():
-                self.faiss_index = faiss.read_index(str(FAISS_INDEX_PATH))
+                index = faiss.read_index(str(FAISS_INDEX_PATH))
+                loaded_index = True
                 logger.info("Loaded existing FAISS index")
             else:
-                self.faiss_index = faiss.IndexFlatIP(DIMENSION)
+                index = new_index(DIMENSION)
                 logger.info("Created new FAISS index")
         except Exception as e:
             logger.error(f"Error initializing FAISS index: {e}")
-            self.faiss_index = faiss.IndexFlatIP(DIMENSION)
-        
-        # Initialize RAG processor
-        self.rag_processor = RAGProcessor(
-            embedding_model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
-            batch_size=32,
-            cache_dir=str(CACHE_DIR),
-            faiss_index=self.faiss_index
+            index = new_index(DIMENSION)
+
+        # Indexes written before chunks had stable ids are addressed by position
+        addressable_index = ensure_id_addressable(index)
+        # A new or converted index is not on disk yet; the next save writes it (snapshots link that file)
+        persisted = loaded_index and addressable_index is index
+        index = addressable_index
+
+        # Migrate the stored index if a different FAISS_INDEX_TYPE is configured for its size
+        try:
+            target = needs_rebuild(index)
+            if target is not None:
+                index = rebuild_index(index, target)
+                persisted = False
+        except Exception as e:
+            logger.error(f"Error migrating FAISS index, keeping the stored index: {e}")
+        self.startup_timings["faiss_index"] = round(time.perf_counter() - checkpoint, 3)
+        checkpoint = time.perf_counter()
+
+        # Load documents store from the chunk store (migrating documents_store.json on first run)
+        try:
+            chunk_store = open_chunk_store(CHUNK_STORE_DIR, legacy_json_path=DOCUMENTS_STORE_PATH)
+            logger.info(f"Loaded existing documents store with {len(chunk_store.entries)} documents")
+        except Exception as e:
+            logger.error(f"Failed to load documents store: {e}")
+            raise
+        self.startup_timings["chunk_store"] = round(time.perf_counter() - checkpoint, 3)
+        checkpoint = time.perf_counter()
+
+        chunks_metadata = self._chunks_from_entries(chunk_store.entries)
+        tokenized_texts = [chunk_metadata.processed_text.split() for chunk_metadata in chunks_metadata]
+        bm25 = IncrementalBM25()
+        bm25.add_documents([
+            None if chunk_metadata.deleted else tokens
+            for chunk_metadata, tokens in zip(chunks_metadata, tokenized_texts)
+        ])
+        if self._drop_orphaned_vectors(index, chunks_metadata):
+            persisted = False
+        self.startup_timings["chunks_and_bm25"] = round(time.perf_counter() - checkpoint, 3)
+        return index, persisted, chunk_store, chunks_metadata, tokenized_texts, bm25
+
+    def _apply_state(self, index, persisted: bool, chunk_store, chunks_metadata, tokenized_texts, bm25):
+        """Swap every structure to the loaded state at once, under the exclusive state lock."""
+        with self.rag_processor.state_lock.write():
+            self.rag_processor.update_index(index)
+            self.rag_processor.chunks_metadata = chunks_metadata
+            self.rag_processor.tokenized_texts = tokenized_texts
+            self.rag_processor.bm25 = bm25
+            self.faiss_index = index
+            self.chunk_store = chunk_store
+            self.documents_store = chunk_store.entries
+            self.chunks_metadata = chunks_metadata
+            self.tokenized_texts = tokenized_texts
+            self._persisted_index_version = self.rag_processor.index_version if persisted else None
+
+    def refresh_state(self):
+        """
+        Reconcile in-memory structures after documents were embedded or re-associated
+        in place. Reuses the loaded models and index and never reads from disk.
+        """
+        if self.rag_processor.chunks_metadata is not self.chunks_metadata:
+            self.chunks_metadata = self.rag_processor.chunks_metadata
+        self.faiss_index = self.rag_processor.index
+        self.tokenized_texts = self.rag_processor.tokenized_texts
+
+        if len(self.documents_store) != self.rag_processor.num_live_chunks:
+            logger.warning("State inconsistency detected during refresh. Rebuilding chunks from documents store...")
+            self._rebuild_chunks_from_store()
+
+        logger.info(
+            f"State refreshed: {len(self.documents_store)} documents, "
+            f"{self.rag_processor.num_live_chunks} chunks, FAISS size {self.faiss_index.ntotal}"
         )
+
+    def _rebuild_chunks_from_store(self):
+        """
+        Reconstruct chunks metadata and BM25 from the documents store. Each entry sits
+        at its embedding_idx (its FAISS id); unused positions become tombstones.
+        """
+        with self.rag_processor.state_lock.write():
+            self.chunks_metadata = self._chunks_from_entries(self.documents_store)
         
-        # Load documents store if exists
-        if DOCUMENTS_STORE_PATH.exists():
-            try:
-                with open(DOCUMENTS_STORE_PATH, 'r', encoding='utf-8') as f:
-                    self.documents_store = json.load(f)
-                logger.info(f"Loaded existing documents store with {len(self.documents_store)} documents")
-                
-                # Reconstruct chunks metadata from documents
-                self.chunks_metadata = []
-                for idx, doc in enumerate(self.documents_store):
-                    # Handle both old format (bot_id) and new format (bot_ids)
-                    if 'bot_ids' in doc:
-                        bot_ids = doc['bot_ids']
-                    elif 'bot_id' in doc:
-                        bot_ids = [doc['bot_id']]
-                    else:
-                        bot_ids = []
-                    
-                    chunk_metadata = ChunkMetadata(
-                        doc_id=doc['doc_id'],
-                        bot_ids=bot_ids,  # Use bot_ids instead of bot_id
-                        chunk_id=idx,
-                        original_text=doc['text'],
-                        processed_text=self._clean_text_for_reload(doc['text']),
-                        embedding_idx=idx,
-                        special_matches=self._extract_special_matches(doc['text']),
-                        language=doc['language']
-                    )
-                    self.chunks_metadata.append(chunk_metadata)
-                
-                # Update RAG processor with loaded metadata
-                self.rag_processor.chunks_metadata = self.chunks_metadata
-                
-                # Initialize tokenized texts from processed text
-                self.tokenized_texts = [
-                    chunk_metadata.processed_text.split()
-                    for chunk_metadata in self.chunks_metadata
-                ]
-                
-                # Update RAG processor with tokenized texts
-                self.rag_processor.tokenized_texts = self.tokenized_texts
-                self.rag_processor.update_bm25(self.tokenized_texts)
+            # Update RAG processor with loaded metadata
+            self.rag_processor.chunks_metadata = self.chunks_metadata
+        
+            # Initialize tokenized texts from processed text
+            self.tokenized_texts = [
+                chunk_metadata.processed_text.split()
+                for chunk_metadata in self.chunks_metadata
+            ]
+        
+            # Update RAG processor with tokenized texts
+            self.rag_processor.tokenized_texts = self.tokenized_texts
+            self.rag_processor.update_bm25([
+                None if chunk_metadata.deleted else tokens
+                for chunk_metadata, tokens in zip(self.chunks_metadata, self.tokenized_texts)
+            ])
+            if self._drop_orphaned_vectors(self.faiss_index, self.chunks_metadata):
+                self.rag_processor.index_version += 1
+                self.rag_processor.generation += 1
+
+    def _chunks_from_entries(self, entries: Iterable[Dict[str, Any]]) -> List[ChunkMetadata]:
+        """Chunks metadata indexed by embedding position, with tombstones for unused positions."""
+        # One pass: the chunk store decodes its documents as they are iterated
+        chunks_by_position: Dict[int, ChunkMetadata] = {}
+        doc_chunk_counts: Dict[str, int] = {}
+        for ordinal, doc in enumerate(entries):
+            # Handle both old format (bot_id) and new format (bot_ids)
+            if 'bot_ids' in doc:
+                bot_ids = doc['bot_ids']
+            elif 'bot_id' in doc:
+                bot_ids = [doc['bot_id']]
+            else:
+                bot_ids = []
             
-            except Exception as e:
-                logger.error(f"Failed to load documents store: {e}")
-                self.documents_store = []
-                self.chunks_metadata = []
-                self.tokenized_texts = []
-        else:
-            self.chunks_metadata = []
-            self.rag_processor.update_bm25([["placeholder"]])
-
-        if len(self.documents_store) != len(self.chunks_metadata):
-            logger.warning("State inconsistency detected during initialization. Rebuilding state...")
-            self.chunks_metadata = []
-            for doc in self.documents_store:
-                # Handle both old format (bot_id) and new format (bot_ids)
-                if 'bot_ids' in doc:
-                    bot_ids = doc['bot_ids']
-                elif 'bot_id' in doc:
-                    bot_ids = [doc['bot_id']]
-                else:
-                    bot_ids = []
-                    
-                chunk_metadata = ChunkMetadata(
-                    doc_id=doc['doc_id'],
-                    bot_ids=bot_ids,  # Add this with bot_ids
-                    chunk_id=len(self.chunks_metadata),
-                    original_text=doc['text'],
-                    processed_text=self._clean_text_for_reload(doc['text']),
-                    embedding_idx=len(self.chunks_metadata),
-                    special_matches=self._extract_special_matches(doc['text']),
-                    language=doc['language']
-                )
-                self.chunks_metadata.append(chunk_metadata)
+            # chunk_id is the chunk's ordinal within its document, as in process_document
+            chunk_id = doc_chunk_counts.get(doc['doc_id'], 0)
+            doc_chunk_counts[doc['doc_id']] = chunk_id + 1
             
-        self.rag_processor.chunks_metadata = self.chunks_metadata
-        self.is_initialized = True
-        logger.info("System fully initialized with Document store, FAISS index, and BM25.")
+            # Entries imported before positions were stamped at migration are still in FAISS order
+            position = doc.get("embedding_idx", ordinal)
+            if position in chunks_by_position:
+                logger.warning(f"Duplicate embedding position {position} for document {doc['doc_id']}")
+            
+            chunk_metadata = ChunkMetadata(
+                doc_id=doc['doc_id'],
+                bot_ids=bot_ids,  # Use bot_ids instead of bot_id
+                chunk_id=chunk_id,
+                original_text=doc['text'],
+                processed_text=self._clean_text_for_reload(doc['text']),
+                embedding_idx=position,
+                special_matches=self._extract_special_matches(doc['text']),
+                language=doc['language']
+            )
+            chunks_by_position[position] = chunk_metadata
+        
+        num_positions = max(chunks_by_position, default=-1) + 1
+        return [
+            chunks_by_position.get(position) or ChunkMetadata(
+                doc_id="", bot_ids=[], chunk_id=-1, original_text="", processed_text="",
+                embedding_idx=position, special_matches={}, language="", deleted=True
+            )
+            for position in range(num_positions)
+        ]
 
-    async def save_state(self):
-        """Save the current state to disk"""
-        try:
-            if not self.is_initialized:
-                logger.warning("Attempted to save uninitialized state")
+    def load_snapshot(self):
+        """Serve the latest published snapshot (reader workers), waiting for the writer to publish one."""
+        name = current_snapshot_name(SNAPSHOT_DIR)
+        while name is None:
+            self.phase = "waiting_for_snapshot"
+            logger.info(f"No index snapshot in {SNAPSHOT_DIR} yet, waiting for the writer")
+            time.sleep(SNAPSHOT_POLL_SECONDS)
+            name = current_snapshot_name(SNAPSHOT_DIR)
+        checkpoint = time.perf_counter()
+        self.apply_snapshot(*self.read_snapshot(name))
+        self.startup_timings["snapshot"] = round(time.perf_counter() - checkpoint, 3)
+
+    def read_snapshot(self, name: str):
+        """Open a snapshot and build its chunks metadata; safe to run off the event loop."""
+        snapshot = load_snapshot(SNAPSHOT_DIR, name)
+        return snapshot, self._chunks_from_entries(snapshot.chunk_store.entries)
+
+    def apply_snapshot(self, snapshot, chunks_metadata: List[ChunkMetadata]):
+        """
+        Swap every search structure to the snapshot at once, under the exclusive
+        state lock, so a search sees either the old or the new snapshot.
+        """
+        with self.rag_processor.state_lock.write():
+            self.rag_processor.update_index(snapshot.index)
+            self.rag_processor.chunks_metadata = chunks_metadata
+            self.rag_processor.tokenized_texts = []  # only needed to mutate BM25, which readers never do
+            self.rag_processor.bm25 = snapshot.bm25
+            self.faiss_index = snapshot.index
+            self.chunk_store = snapshot.chunk_store
+            self.documents_store = snapshot.chunk_store.entries
+            self.chunks_metadata = chunks_metadata
+            self.tokenized_texts = []
+            self.snapshot_name = snapshot.name
+            self.is_initialized = True
+        logger.info(f"Serving index snapshot {snapshot.name} with {len(self.documents_store)} documents")
+
+    def publish_snapshot(self):
+        """
+        Publish the saved state for reader workers if it changed since the last publish.
+        Holds the shared state lock, blocking index updates but not searches; run it off the event loop.
+        """
+        with self._save_lock, self.rag_processor.state_lock.read():
+            if self.snapshot_publisher.published_generation == self.rag_processor.generation:
                 return
+            self._persist()  # the snapshot links the saved files instead of serializing the state again
+            self.snapshot_name = self.snapshot_publisher.publish(
+                FAISS_INDEX_PATH, self.chunk_store, self.rag_processor.bm25, self.rag_processor.generation
+            )
 
-            # Save FAISS index
-            faiss.write_index(self.faiss_index, str(FAISS_INDEX_PATH))
-            
-            # Save documents store
-            with open(DOCUMENTS_STORE_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.documents_store, f, ensure_ascii=False, indent=2)
-            
-            # Save BM25 data if available
-            if hasattr(self.rag_processor, 'tokenized_texts'):
-                bm25_data = {
-                    'tokenized_texts': self.rag_processor.tokenized_texts
-                }
-                with open(BM25_STORE_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(bm25_data, f, ensure_ascii=False, indent=2)
+    def _drop_orphaned_vectors(self, index, chunks_metadata: List[ChunkMetadata]) -> int:
+        """
+        Remove FAISS vectors that no live chunk refers to (e.g. left behind by old re-uploads).
+        Returns the number removed.
+        """
+        ids = stored_ids(index)
+        live = np.fromiter(
+            (
+                0 <= int(i) < len(chunks_metadata) and not chunks_metadata[int(i)].deleted
+                for i in ids
+            ),
+            dtype=bool,
+            count=ids.size
+        )
+        # HNSW cannot remove vectors; remove_ids leaves them for compaction and returns 0
+        removed = remove_ids(index, ids[~live])
+        if removed:
+            logger.warning(f"Removed {removed} orphaned vectors from the FAISS index")
+        return removed
+
+    def delete_document(self, doc_id: str) -> int:
+        """
+        Remove a document's chunks from every index and the documents store.
+        Blocks on the exclusive state lock; run it off the event loop.
+        """
+        with self.rag_processor.state_lock.write():
+            removed = self.rag_processor.remove_document(doc_id)
+            if self.chunk_store.document_entries(doc_id):
+                self.chunk_store.delete_document(doc_id)
+        return removed
+
+    def commit_documents(self, batch, uploaded_at: str) -> List[Dict[str, Any]]:
+        """
+        Add (prepared document, upload metadata) pairs to the indices and the documents store.
+        Blocks on the exclusive state lock and may retrain the index; run it off the event loop.
+        """
+        with self.rag_processor.state_lock.write():
+            results = self.rag_processor.commit_documents([prepared for prepared, _ in batch])
+            for (prepared, upload), result in zip(batch, results):
+                # Existing entries for this doc_id are replaced
+                base_index = len(self.documents_store) - len(self.chunk_store.document_entries(prepared.doc_id))
+                doc_entries = [
+                    {
+                        "doc_id": prepared.doc_id,
+                        "bot_ids": chunk_data["bot_ids"],  # Use bot_ids consistently
+                        "title": upload["title"],
+                        "text": chunk_data["original_text"],
+                        "index": base_index + offset,
+                        "embedding_idx": chunk_data["embedding_idx"],
+                        "uploadDate": uploaded_at,
+                        "docScope": upload["docScope"],
+                        "category": upload["category"],
+                        "language": upload["language"],
+                        "status": "completed"
+                    }
+                    for offset, chunk_data in enumerate(result["chunk_data"])
+                ]
+                self.replace_document_entries(prepared.doc_id, doc_entries)
 
-            logger.info(f"System state saved successfully with {len(self.documents_store)} documents")
-            logger.debug(f"Documents store contents: {self.documents_store}")
+            # Switch to an approximate index type once the corpus crosses the configured size
+            try:
+                if self.rag_processor.maybe_rebuild_index():
+                    self.faiss_index = self.rag_processor.index
+            except Exception as e:
+                logger.error(f"Error rebuilding FAISS index, keeping the current index: {e}")
+        return results
+
+    def compact_indices(self) -> int:
+        """
+        Drop tombstoned positions, renumbering chunks and their stored embedding positions.
+        Rebuilds FAISS and BM25 under the exclusive state lock; run it off the event loop.
+        """
+        with self.rag_processor.state_lock.write():
+            mapping = self.rag_processor.compact()
             
+            # Persist the renumbered entries as a fresh snapshot
+            def renumber(ordinal, doc):
+                doc["embedding_idx"] = mapping[doc.get("embedding_idx", ordinal)]
+            self.chunk_store.compact(renumber)
+            self.refresh_state()
+        return len(mapping)
+
+    def needs_compaction(self) -> bool:
+        total = len(self.rag_processor.chunks_metadata)
+        return total > 0 and self.rag_processor.num_deleted / total >= FAISS_COMPACT_RATIO
+
+    async def save_state(self):
+        """Save the current state to disk, on the search executor to keep the event loop free"""
+        if not self.is_initialized:
+            logger.warning("Attempted to save uninitialized state")
+            return
+        if INDEX_ROLE == "reader":
+            return  # snapshots are read-only; the writer persists and publishes
+        try:
+            await self.rag_processor.search_executor.run(self._save_state_locked)
         except Exception as e:
             logger.error(f"Error saving system state: {e}")
             raise
 
-    
+    def _save_state_locked(self):
+        """
+        Write the changed state under the shared state lock: searches keep running,
+        but no index update can interleave with the serialization.
+        """
+        with self._save_lock, self.rag_processor.state_lock.read():
+            records = self._persist()
+        logger.info(
+            f"System state saved successfully with {len(self.documents_store)} documents "
+            f"({records} chunk store records written)"
+        )
+
+    def _persist(self) -> int:
+        """Bring the files on disk up to date; the caller holds the save and state locks."""
+        # Save FAISS index only when it changed, via atomic rename
+        if self.rag_processor.index_version != self._persisted_index_version:
+            tmp_path = FAISS_INDEX_PATH.with_suffix(".tmp")
+            faiss.write_index(self.faiss_index, str(tmp_path))
+            os.replace(tmp_path, FAISS_INDEX_PATH)
+            self._persisted_index_version = self.rag_processor.index_version
+
+        # Append pending documents store changes to the chunk store log
+        records = self.chunk_store.flush()
+        if self.rag_processor.embedding_cache is not None:
+            self.rag_processor.embedding_cache.flush()
+        return records
+
+    def replace_document_entries(self, doc_id: str, entries: List[Dict[str, Any]]):
+        """Replace all documents store entries of a document (re-embedding appends at the end)."""
+        self.chunk_store.put_document(doc_id, entries)
+
+    def add_bot_to_entries(self, doc_ids: List[str], bot_id: str):
+        """Associate a bot with every documents store entry of the given documents."""
+        self.chunk_store.add_bot(doc_ids, bot_id)
+
     def _clean_text_for_reload(self, text: str) -> str:
         """Clean text using same logic as RAGProcessor."""
         # Simplified version of RAGProcessor's _clean_text_sync
@@ -233,22 +522,27 @@ class GlobalState:
     def clear_and_reset_state(self):
         """Clear and reset the system state."""
         try:
-            # Reset FAISS index
-            self.faiss_index = faiss.IndexFlatIP(DIMENSION)
+            with self.rag_processor.state_lock.write():
+                # Reset FAISS index
+                self.faiss_index = new_index(DIMENSION)
 
-            # Clear document storage
-            self.documents_store = []
+                # Clear document storage
+                self.chunk_store.clear()
+                self.documents_store = self.chunk_store.entries
+                self.chunks_metadata = []
+                self.tokenized_texts = []
 
-            # Reset RAG processor
-            self.rag_processor.chunks_metadata = []
-            self.rag_processor.tokenized_texts = []
-            self.rag_processor.update_index(self.faiss_index)
-            self.rag_processor.update_bm25([["placeholder"]])
+                # Reset RAG processor
+                self.rag_processor.chunks_metadata = self.chunks_metadata
+                self.rag_processor.tokenized_texts = self.tokenized_texts
+                self.rag_processor.update_index(self.faiss_index)
+                self.rag_processor.update_bm25([])
 
             # Remove stored files
             for path in [DOCUMENTS_STORE_PATH, FAISS_INDEX_PATH, BM25_STORE_PATH]:
                 if path.exists():
                     path.unlink()
+            self._persisted_index_version = None
 
             logger.info("System state cleared and reset successfully")
             
@@ -262,6 +556,12 @@ class GlobalState:
 # Initialize FastAPI
 app = FastAPI()
 global_state = GlobalState()
+search_result_cache = QueryResultCache(max_entries=SEARCH_CACHE_SIZE, ttl_seconds=SEARCH_CACHE_TTL)
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL
+)
 
 # CORS Middleware configuration
 app.add_middleware(
@@ -272,14 +572,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def readiness_gate(request: Request, call_next):
+    """Reject requests that need models or indexes until they are loaded."""
+    if global_state.is_initialized or request.url.path in UNGATED_PATHS:
+        return await call_next(request)
+    return JSONResponse(
+        status_code=503,
+        content={"status": global_state.phase, "detail": "Service is starting up, retry shortly"},
+        headers={"Retry-After": "5"}
+    )
+
+def require_writer():
+    """Index mutations are only accepted by the process that owns the index."""
+    if INDEX_ROLE == "reader":
+        raise HTTPException(
+            status_code=409,
+            detail="This worker serves a read-only index snapshot; send writes to the writer instance"
+        )
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once models and indexes are loaded, 503 before."""
+    body = {"status": global_state.phase}
+    if global_state.startup_error:
+        body["error"] = global_state.startup_error
+    return JSONResponse(status_code=200 if global_state.is_initialized else 503, content=body)
+
 @app.get("/health")
 async def health_check():
+    """Liveness probe; always 200, with index statistics once ready."""
+    if not global_state.is_initialized:
+        return {
+            "status": "initializing" if global_state.phase != "failed" else "failed",
+            "phase": global_state.phase,
+            "startup_timings": global_state.startup_timings,
+            "error": global_state.startup_error
+        }
     return {
-        "status": "healthy" if global_state.is_initialized else "initializing",
+        "status": "healthy",
+        "phase": global_state.phase,
+        "startup_timings": global_state.startup_timings,
+        "index_role": INDEX_ROLE,
+        "snapshot": global_state.snapshot_name,
         "documents_count": len(global_state.documents_store),
-        "chunks_count": len(global_state.rag_processor.chunks_metadata),
+        "chunks_count": global_state.rag_processor.num_live_chunks,
+        "deleted_chunks": global_state.rag_processor.num_deleted,
         "faiss_size": global_state.faiss_index.ntotal,
-        "tokenized_texts": len(global_state.tokenized_texts)
+        "tokenized_texts": len(global_state.tokenized_texts),
+        "search_cache": search_result_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "search_executor": global_state.rag_processor.search_executor.stats(),
+        "ingestion": ingestion.stats(),
+        "ingestion_jobs": ingestion_jobs.stats() if ingestion_jobs is not None else None,
+        "embedding_cache": (
+            global_state.rag_processor.embedding_cache.stats()
+            if global_state.rag_processor.embedding_cache is not None else None
+        )
     }
 
 @app.get("/faiss/index")
@@ -287,6 +636,7 @@ async def get_faiss_index_info():
     index = global_state.faiss_index
     return {
         "faiss_index": {
+            "type": index_type_of(index),
             "dimension": index.d,
             "number_of_vectors": index.ntotal,
             "metric": index.metric_type
@@ -296,14 +646,15 @@ async def get_faiss_index_info():
 @app.get("/faiss/documents")
 async def list_faiss_documents():
     try:
-        return {"documents": global_state.documents_store}
+        return {"documents": list(global_state.documents_store)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.delete("/faiss/clear")
+@app.delete("/faiss/clear", dependencies=[Depends(require_writer)])
 async def clear_faiss_index():
     try:
         global_state.clear_and_reset_state()  # Remove await here
+        answer_cache.clear()
         await global_state.save_state()
 
         return {"status": "success", "message": "FAISS index and documents cleared"}
@@ -313,112 +664,137 @@ async def clear_faiss_index():
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize system state on startup."""
-    logger.info("Application starting up with initialized global state")
+    """Load models and indexes, in the background unless STARTUP_MODE=eager."""
+    loop = asyncio.get_running_loop()
+    if STARTUP_MODE == "eager":
+        await loop.run_in_executor(None, global_state.initialize)
+        initialization = None
+    else:
+        # Not awaited: the port is bound immediately and the readiness gate holds traffic
+        initialization = app.state.startup_task = loop.run_in_executor(None, global_state.initialize)
+        logger.info(f"Accepting connections after {IMPORT_SECONDS:.2f}s of imports; loading models in the background")
+    if INDEX_ROLE == "reader":
+        app.state.snapshot_task = asyncio.create_task(follow_snapshots())
+    else:
+        app.state.jobs_task = asyncio.create_task(start_ingestion_jobs(initialization))
+    if INDEX_ROLE == "writer":
+        app.state.publish_task = asyncio.create_task(publish_snapshots())
+
+async def start_ingestion_jobs(initialization):
+    """Start the ingestion job workers, resuming interrupted jobs, once the index is loaded."""
+    if initialization is not None:
+        try:
+            await initialization
+        except Exception:
+            return  # logged by initialize; jobs stay queued for the next start
+    ingestion_jobs.start()
+
+async def swap_to_latest_snapshot() -> bool:
+    """Load the newest published snapshot off the event loop, then swap to it."""
+    name = current_snapshot_name(SNAPSHOT_DIR)
+    if name is None or name == global_state.snapshot_name:
+        return False
+    loaded = await asyncio.get_running_loop().run_in_executor(None, global_state.read_snapshot, name)
+    global_state.apply_snapshot(*loaded)
+    return True
+
+async def follow_snapshots():
+    """Reader workers: hot-swap to each snapshot the writer publishes."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_POLL_SECONDS)
+        if not global_state.is_initialized:
+            continue
+        try:
+            await swap_to_latest_snapshot()
+        except Exception as e:
+            # e.g. the generation was pruned while loading; the next poll picks up a newer one
+            logger.error(f"Error switching index snapshot: {e}")
+
+async def publish_snapshots():
+    """Writer: publish the saved state for reader workers, coalescing the changes of each SNAPSHOT_MIN_INTERVAL."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_MIN_INTERVAL)
+        if not global_state.is_initialized:
+            continue
+        try:
+            await global_state.rag_processor.search_executor.run(global_state.publish_snapshot)
+        except Exception as e:
+            logger.error(f"Error publishing index snapshot: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Save state on shutdown."""
-    await global_state.save_state()
+    if ingestion_jobs is not None:
+        # Jobs still running are queued again and resumed on the next start
+        await ingestion_jobs.stop()
+    if global_state.is_initialized:
+        await global_state.save_state()
+        if global_state.snapshot_publisher is not None:
+            # Readers get the final changes rather than waiting for the next start
+            await global_state.rag_processor.search_executor.run(global_state.publish_snapshot)
+        global_state.rag_processor.close()
+        await global_state.rag_processor.stemmer.aclose()
+    shutdown_process_pool()
+    await close_gemini_client()
 
 @app.post("/reload")
 async def reload_state():
     """Reload the global state from disk"""
     try:
-        global_state.initialize()  # Reinitialize the state
+        if INDEX_ROLE == "reader":
+            await swap_to_latest_snapshot()
+        else:
+            # Reload index and documents, keep the loaded models; searches use the old state until the swap
+            await global_state.rag_processor.search_executor.run(global_state.load_state)
         return {"status": "success", "message": "State reloaded from disk"}
     except Exception as e:
         logger.error(f"Error reloading state: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/embed_documents")
+@app.post("/embed_documents", dependencies=[Depends(require_writer)])
 async def embed_documents(
     doc_ids: List[str] = Form(...),
     bot_ids: List[str] = Form(...),
     pdf_paths: List[str] = Form(...),
     doc_scopes: List[str] = Form(...),
     categories: List[str] = Form(...),
-    languages: List[str] = Form(["en"])
+    languages: List[str] = Form(["en"]),
+    wait: bool = Form(False)
 ) -> Dict[str, Any]:
+    """
+    Queue one ingestion job per document and return the job IDs right away;
+    poll /jobs/{job_id} or /documents/{doc_id}/status for progress. With
+    wait=true the response is held until every job has finished.
+    """
     if len(doc_ids) != len(bot_ids) or len(bot_ids) != len(pdf_paths):
         raise HTTPException(status_code=400, detail="Mismatched input lengths")
-    
-    print("doc_ids", doc_ids)
-    print("bot_ids", bot_ids)
-
-    async def process_single_document(idx: int):
-        try:
-            doc_id = doc_ids[idx]
-            bot_id = bot_ids[idx]
-            pdf_path = pdf_paths[idx]
-            doc_scope = doc_scopes[idx]
-            category = categories[idx]
-            language = languages[idx] if idx < len(languages) else "en"
-
-            logger.info(f"Processing doc_id={doc_id}, pdf_path={pdf_path}")
-
-            # Extract text from PDF
-            text = PDFExtractor.extract_content(pdf_path)
-            if not text:
-                raise HTTPException(status_code=400, detail=f"No text extracted from PDF {pdf_path}")
-
-            # Process document with RAG system
-            result = await global_state.rag_processor.process_document(doc_id, text, language, bot_id)
-
-            # Update documents store with new entries
-            current_time = datetime.datetime.utcnow().isoformat()
-            filename = os.path.basename(pdf_path)
-
-            # Remove any existing entries for this doc_id
-            global_state.documents_store = [
-                doc for doc in global_state.documents_store
-                if doc["doc_id"] != doc_id
-            ]
-
-            # Create lock once and use it to guard appending each entry
-            state_lock = asyncio.Lock()
-            async with state_lock:
-                for chunk_data in result["chunk_data"]:
-                    doc_entry = {
-                        "doc_id": doc_id,
-                        "bot_ids": chunk_data["bot_ids"],  # Use bot_ids consistently
-                        "title": filename,
-                        "text": chunk_data["original_text"],
-                        "index": len(global_state.documents_store),
-                        "uploadDate": current_time,
-                        "docScope": doc_scope,
-                        "category": category,
-                        "language": language,
-                        "status": "completed"
-                    }
-                    global_state.documents_store.append(doc_entry)
-                    
-            return {
-                "status": "success",
-                "doc_id": doc_id,
-                "chunks_added": result["num_chunks"],
-                "stats": result["metadata"]
-            }
-        
-        except Exception as e:
-            logger.error(f"Error embedding document {doc_ids[idx]}: {e}\n{traceback.format_exc()}")
-            return {"doc_id": doc_ids[idx], "error": str(e)}
 
-    # Process all documents concurrently
-    results = await asyncio.gather(*[process_single_document(i) for i in range(len(doc_ids))])
+    job_ids = ingestion_jobs.enqueue([
+        {
+            "doc_id": doc_id,
+            "bot_id": bot_ids[idx],
+            "pdf_path": pdf_paths[idx],
+            "doc_scope": doc_scopes[idx],
+            "category": categories[idx],
+            "language": languages[idx] if idx < len(languages) else "en"
+        }
+        for idx, doc_id in enumerate(doc_ids)
+    ])
+    logger.info(f"Queued ingestion jobs for documents {doc_ids}")
+    if not wait:
+        return {
+            "status": "queued",
+            "jobs": [{"job_id": job_id, "doc_id": doc_id} for job_id, doc_id in zip(job_ids, doc_ids)]
+        }
 
-    # Save state after processing all documents
-    try:
-        await global_state.save_state()
-        await associate_with_general_bot(doc_ids)
-        await reload_state()  # Reload state if needed
-    except Exception as e:
-        logger.error(f"Error saving global state: {e}\n{traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail="Failed to save state after processing documents")
+    jobs = await asyncio.gather(*[ingestion_jobs.wait(job_id) for job_id in job_ids])
 
     # Separate successes and errors
-    successes = [res for res in results if "error" not in res]  
-    errors = [res for res in results if "error" in res]
+    successes = [job["result"] for job in jobs if job["state"] == "completed"]
+    errors = [
+        {"doc_id": job["doc_id"], "job_id": job["id"], "error": job["error"] or job["state"]}
+        for job in jobs if job["state"] != "completed"
+    ]
 
     return {
         "status": "partial_success" if errors else "success",
@@ -426,7 +802,103 @@ async def embed_documents(
         "errors": errors
     }
 
-# In main.py, add this helper function
+async def run_ingestion_job(job: Dict[str, Any], progress) -> Dict[str, Any]:
+    """Extract, embed and commit one queued document, reporting progress for each stage."""
+    payload = job["payload"]
+    doc_id = payload["doc_id"]
+    pdf_path = payload["pdf_path"]
+    logger.info(f"Processing doc_id={doc_id}, pdf_path={pdf_path} (job {job['id']})")
+
+    async def prepare():
+        # Stream pages from the parallel extractor straight into chunking and embedding
+        ocr_pages = 0
+
+        def report_pages(done: int, total: int, page):
+            nonlocal ocr_pages
+            ocr_pages += page.ocr
+            progress(pages_done=done, pages_total=total, ocr_pages=ocr_pages)
+
+        pages = PDFExtractor(progress_callback=report_pages).aiter_pages(pdf_path)
+        prepared = await global_state.rag_processor.prepare_document_pages(
+            doc_id, pages, payload["language"], payload["bot_id"],
+            progress_callback=lambda embedded: progress(chunks_embedded=embedded)
+        )
+        progress(stage=STAGE_COMMITTING)
+        return prepared, {
+            "title": os.path.basename(pdf_path),
+            "docScope": payload["doc_scope"],
+            "category": payload["category"],
+            "language": payload["language"]
+        }
+
+    # Committed together with any other documents that finish meanwhile
+    return await ingestion.submit(prepare)
+
+async def commit_ingested_documents(batch) -> List[Dict[str, Any]]:
+    """
+    Add a batch of prepared documents to the indices and the documents store,
+    in order and under one exclusive state lock, then persist once. The locked
+    section runs on the search executor, so the event loop keeps serving while
+    it waits for in-flight searches and while an index rebuild trains.
+    """
+    run = global_state.rag_processor.search_executor.run
+    doc_ids = list(dict.fromkeys(prepared.doc_id for prepared, _ in batch))
+
+    results = await run(global_state.commit_documents, batch, datetime.datetime.utcnow().isoformat())
+    answer_cache.invalidate_documents(doc_ids)
+
+    await associate_with_general_bot(doc_ids)
+    # One flush for the whole batch
+    await global_state.save_state()
+    await run(global_state.refresh_state)  # Reconcile in-memory state, no model reload
+    return [
+        {
+            "status": "success",
+            "doc_id": result["doc_id"],
+            "chunks_added": result["num_chunks"],
+            "stats": result["metadata"]
+        }
+        for result in results
+    ]
+
+ingestion = IngestionCoordinator(
+    commit_ingested_documents,
+    max_concurrency=INGEST_CONCURRENCY,
+    max_batch=INGEST_MAX_BATCH,
+    batch_window=INGEST_BATCH_WINDOW
+)
+# Readers never ingest, so they leave the job database to the writer
+ingestion_jobs = JobQueue(
+    JOBS_DB_PATH, run_ingestion_job, workers=INGEST_WORKERS, progress_interval=JOB_PROGRESS_INTERVAL
+) if INDEX_ROLE != "reader" else None
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(require_writer)])
+async def get_job(job_id: str) -> Dict[str, Any]:
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {**job, "progress": job_progress(job)}
+
+@app.post("/jobs/{job_id}/cancel", dependencies=[Depends(require_writer)])
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    try:
+        job = await ingestion_jobs.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    except JobCancelError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "success", "job_id": job_id, "state": job["state"]}
+
+def job_progress(job: Dict[str, Any]) -> int:
+    """Overall percentage: extraction and embedding up to 90, committing 95, done 100."""
+    if job["state"] == "completed":
+        return 100
+    if job["stage"] == STAGE_COMMITTING:
+        return 95
+    if job["state"] == "running" and job["pages_total"]:
+        return int(90 * job["pages_done"] / job["pages_total"])
+    return 0
+
 async def associate_with_general_bot(doc_ids):
     """Simple helper to associate documents with the general bot"""
     general_bot_id = '67d4b83762342b42e90eec51'
@@ -438,15 +910,8 @@ async def associate_with_general_bot(doc_ids):
         # Use your existing function to associate documents
         await global_state.rag_processor.add_bot_to_documents(doc_ids, general_bot_id)
         
-        # Update documents_store for consistency
-        for doc in global_state.documents_store:
-            if doc["doc_id"] in doc_ids:
-                if "bot_ids" not in doc:
-                    doc["bot_ids"] = [doc.get("bot_id")] if doc.get("bot_id") else []
-                if general_bot_id not in doc["bot_ids"]:
-                    doc["bot_ids"].append(general_bot_id)
-        
-        await global_state.save_state()
+        # Update documents_store for consistency (persisted by the caller's save)
+        global_state.add_bot_to_entries(doc_ids, general_bot_id)
         return True
     except Exception as e:
         logger.error(f"Error associating documents with general bot: {e}")
@@ -458,7 +923,9 @@ async def search_similar_chunks(
     top_k: int = Form(3),
     semantic_weight: float = Form(0.7),
     language: Optional[str] = Form("en"),
-    bot_id: Optional[str] = Form(None)
+    bot_id: Optional[str] = Form(None),
+    nprobe: Optional[int] = Form(None),
+    ef_search: Optional[int] = Form(None)
 ) -> Dict[str, Any]:
     """
     Hybrid search endpoint using the new RAG system.
@@ -467,6 +934,8 @@ async def search_similar_chunks(
         query: Search query text
         top_k: Number of results to return
         semantic_weight: Weight for semantic search vs lexical search (0-1)
+        nprobe: IVF lists to probe (IVF index types only)
+        ef_search: HNSW search breadth (HNSW index type only)
     """
     try:
         if not global_state.is_initialized:
@@ -481,53 +950,245 @@ async def search_similar_chunks(
         
         # Perform hybrid search
         if language == "en":
-            ab=QueryPreprocessor()
-            query = ab.preprocess_query(query)
-            print("eng",query)
+            query = get_query_preprocessor().preprocess_query(query)
         else:
-            query = global_state.rag_processor.stem_text(query)
-            print("amh",query)
+            query = await global_state.rag_processor.stem_text(query)
+
+        # Queries that preprocess alike are served from the result cache until the indices change
+        bot_id = bot_id or None  # an empty form field means no filter, as in /search/batch
+        cache_key = (query, language, bot_id, top_k, semantic_weight, nprobe, ef_search)
+        generation = global_state.rag_processor.generation
+        cached = search_result_cache.get(cache_key, generation)
+        if cached is not None:
+            return dict(cached)
 
         # Process document with RAG system
         raw_results = await global_state.rag_processor.search(
             query=query,
             top_k=top_k,
             semantic_weight=semantic_weight,
-            bot_id=bot_id  # Pass bot_id here
+            bot_id=bot_id,  # Pass bot_id here
+            nprobe=nprobe,
+            ef_search=ef_search
         )
 
-        # Format results with document metadata
-        formatted_results = []
-        for result in raw_results:
-            # Find corresponding document store entry
-            doc_entry = next(
-                (doc for doc in global_state.documents_store 
-                 if doc["doc_id"] == result["doc_id"] and 
-                 doc["text"] == result["text"]),
-                None
+        response = {
+            "results": format_search_results(raw_results),
+            "query_processed": query
+        }
+        search_result_cache.put(cache_key, generation, response)
+        return dict(response)
+
+    except Exception as e:
+        logger.error(f"Search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def format_search_results(raw_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Format search results with document metadata"""
+    formatted_results = []
+    for result in raw_results:
+        # Direct (doc_id, chunk_id) lookup of the document store entry
+        doc_entry = global_state.chunk_store.get_entry(result["doc_id"], result["chunk_id"])
+        
+        # Skip chunks left over from a previous upload of a re-embedded document
+        if doc_entry and doc_entry["text"] == result["text"]:
+            formatted_results.append({
+                "doc_id": result["doc_id"],
+                "text": result["text"],
+                "similarity": result["score"],
+                "title": doc_entry.get("title", ""),
+                "docScope": doc_entry.get("docScope", ""),
+                "category": doc_entry.get("category", ""),
+                "uploadDate": doc_entry.get("uploadDate", ""),
+                "special_matches": result["special_matches"]
+            })
+    return formatted_results
+
+@app.post("/search/batch")
+async def search_batch(
+    queries: List[str] = Form(...),
+    bot_ids: List[str] = Form([]),
+    languages: List[str] = Form(["en"]),
+    top_k: int = Form(3),
+    semantic_weight: float = Form(0.7),
+    nprobe: Optional[int] = Form(None),
+    ef_search: Optional[int] = Form(None)
+) -> Dict[str, Any]:
+    """
+    Hybrid search for many queries in one batched pass.
+
+    Args:
+        queries: Search query texts
+        bot_ids: One bot filter for all queries or one per query ("" for no filter)
+        languages: One language for all queries or one per query
+        top_k, semantic_weight, nprobe, ef_search: as for /search, shared by all queries
+
+    Returns one entry per query, in order, shaped like a /search response.
+    """
+    if len(bot_ids) not in (0, 1, len(queries)) or len(languages) not in (1, len(queries)):
+        raise HTTPException(status_code=400, detail="bot_ids and languages need one entry, or one per query")
+    try:
+        if not global_state.is_initialized:
+            return {"results": [], "status": "system_initializing"}
+        if not global_state.rag_processor.chunks_metadata:
+            return {"results": [{"query": query, "results": []} for query in queries], "status": "no_documents"}
+
+        query_bots = bot_ids * len(queries) if len(bot_ids) == 1 else list(bot_ids) or [""] * len(queries)
+        query_bots = [bot_id or None for bot_id in query_bots]  # "" and None both mean no filter, as in /search
+        query_languages = languages * len(queries) if len(languages) == 1 else list(languages)
+
+        processed: Dict[int, str] = {}
+        preprocessor = get_query_preprocessor()
+        amharic = [i for i, language in enumerate(query_languages) if language != "en"]
+        for i, stemmed in zip(amharic, await global_state.rag_processor.stemmer.stem_many([queries[i] for i in amharic])):
+            processed[i] = stemmed
+        for i, query in enumerate(queries):
+            if i not in processed:
+                processed[i] = preprocessor.preprocess_query(query)
+
+        # Queries answered before (by /search or here) are served from the result cache
+        generation = global_state.rag_processor.generation
+        responses: List[Optional[Dict[str, Any]]] = []
+        cache_keys = []
+        for i, (bot_id, language) in enumerate(zip(query_bots, query_languages)):
+            cache_key = (processed[i], language, bot_id, top_k, semantic_weight, nprobe, ef_search)
+            cache_keys.append(cache_key)
+            responses.append(search_result_cache.get(cache_key, generation))
+        pending = [i for i, response in enumerate(responses) if response is None]
+
+        if pending:
+            raw_results = await global_state.rag_processor.search_many(
+                [processed[i] for i in pending],
+                bot_ids=[query_bots[i] for i in pending],
+                top_k=top_k,
+                semantic_weight=semantic_weight,
+                nprobe=nprobe,
+                ef_search=ef_search
             )
-            
-            if doc_entry:
-                formatted_results.append({
-                    "doc_id": result["doc_id"],
-                    "text": result["text"],
-                    "similarity": result["score"],
-                    "title": doc_entry.get("title", ""),
-                    "docScope": doc_entry.get("docScope", ""),
-                    "category": doc_entry.get("category", ""),
-                    "uploadDate": doc_entry.get("uploadDate", ""),
-                    "special_matches": result["special_matches"]
-                })
+            for i, raw in zip(pending, raw_results):
+                responses[i] = {"results": format_search_results(raw), "query_processed": processed[i]}
+                search_result_cache.put(cache_keys[i], generation, responses[i])
 
         return {
-            "results": formatted_results,
-            "query_processed": query
+            "results": [{"query": query, **response} for query, response in zip(queries, responses)],
+            "cached": len(queries) - len(pending)
         }
 
     except Exception as e:
-        logger.error(f"Search error: {e}")
+        logger.error(f"Batch search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _build_qa_payload(
+    query: str,
+    context: str,
+    bot_id: str,
+    top_k: int,
+    system_prompt: Optional[str],
+    language: Optional[str]
+):
+    """Retrieve chunks for the query and build the Gemini prompt. Returns (payload, chunks); payload is None without chunks."""
+    semantic_weight = 0.7
+    # Pass bot_id to search
+    retrieval_res = await search_similar_chunks(
+        query, 
+        top_k,
+        semantic_weight,
+        language=language,
+        bot_id=bot_id,  # Pass it here
+        nprobe=None,
+        ef_search=None
+    )
+    chunks = retrieval_res.get("results", [])
+    if not chunks:
+        return None, []
+
+    context_texts = [context] + [f"Chunk from doc {c['doc_id']}:\n{c['text']}" for c in chunks]
+    context_str = "\n\n".join(context_texts)
+    query_language = language
+    logger.debug(f"Building QA prompt for query language {query_language}")
+
+    file_markers = ["This is the File or Image content the user sent inline", "File content:"]
+    has_file = any(marker in context for marker in file_markers)
+
+    payload = {
+"contents": [{
+    "parts": [
+        {
+            "text": (
+                f"You are a highly contextual legal assistant designed to answer questions based only on the provided information. "
+                f"Follow these rules when answering user queries:\n\n"
+
+                f"1. Always prioritize context in the following order:\n"
+                f"   - Relevant chunks retrieved from the database or knowledge base.\n"
+                f"   - The last 7 messages for conversational relevance.\n"
+                f"   - The conversation summary for broader context.\n\n"
+
+                f"2. For follow-up questions:\n"
+                f"   - Check the last 7 messages and chunks to identify what the user is referring to.\n"
+                f"   - If no clarity is found in the last 5 messages, check the conversation summary.\n\n"
+
+                f"3. NEVER answer based solely on your own knowledge. Only use the context provided in chunks, messages, or summary.\n\n"
+
+                f"4. If the context is insufficient:\n"
+                f"   - Ask the user to clarify or rephrase their query naturally.\n\n"
+
+                f"5. Your responses must be:\n"
+                f"   - Concise and factual.\n"
+                f"   - Integrated naturally into the response without robotic phrasing like 'According to the context' or 'Based on the provided information.'\n"
+                f"   - Polite and professional.\n\n"
+                f"   - if asked to describe more or anything of the sort like explain more, break down and explain using more words.\n\n"
+                f"   - use markdown to format your response.\n\n"
+
+                f"6. **Handling Opinion-Based Questions:**\n"
+                f"   - Questions like 'How do you define...?', 'What do you think about...?', 'Do you believe...?', 'In your opinion, should...?' can and should be answered based on the provided context.\n"
+                f"   - Instead of avoiding such questions, use the retrieved information to craft a natural and confident response.\n"
+                f"   - Do not explicitly state that you are relying on context—just answer as if you have the knowledge.\n\n"
+
+                f"7. **Language Handling Instructions:**\n"
+                f"   - The user's query language is: {query_language}\n"
+                f"   - If the language is Amharic (am), first translate the query and context to English internally,\n"
+                f"     process your answer in English, then translate your final answer back to Amharic.\n"
+                f"   - If the language is English (en), process normally and respond in English.\n"
+                f"   - YOU MUST ALWAYS RESPOND IN THE SAME LANGUAGE AS THE QUERY ({query_language}).\n\n"
+
+                f"8. If the context is insufficient:\n"
+                f"   - Ask the user to clarify or rephrase their query in their language.\n\n"
+
+                f"9. **File Handling Instructions:**\n"
+                f"   - The user has {f'included a file in their message. The file content is included in the context.' if has_file else 'not included any file in their message.'}\n"
+                f"   - If file content is present, analyze it and incorporate relevant information in your response.\n\n"
+
+                f"Now, answer this query naturally without explicitly stating that you are using context:\n\n"
+                f"USER QUERY ({query_language}): {query}\n\n"
+                f"CONTEXT:\n{context_str}\n\n"
+                f"sub-system-prompt:\n {system_prompt.upper()}:"
+                f"YOUR ANSWER IN {query_language.upper()}:"
+            )
+        }
+    ]
+}]
+}
+
+    return payload, chunks
+
+NO_CHUNKS_ANSWER = "No documents found or no index built."
+
+async def _answer_cache_key(query: str, chunks: List[Dict[str, Any]], context: str, system_prompt: Optional[str], language: Optional[str]):
+    """(normalized query embedding, chunk set key, prompt key) used to look up and store cached answers."""
+    loop = asyncio.get_running_loop()
+    rag_processor = global_state.rag_processor
+    embedding = await loop.run_in_executor(rag_processor.executor, rag_processor._get_embedding, query)
+    embedding = np.ascontiguousarray(embedding.reshape(1, -1), dtype=np.float32)
+    faiss.normalize_L2(embedding)
+    return embedding, chunk_set_key(chunks), prompt_key(language, system_prompt, context)
+
+def _store_answer(bot_id: str, cache_key, chunks: List[Dict[str, Any]], answer: str, metadata: Dict[str, Any]):
+    embedding, chunks_key, prompt_inputs_key = cache_key
+    answer_cache.store(
+        bot_id, embedding, chunks_key, prompt_inputs_key, answer, metadata,
+        doc_ids=[c["doc_id"] for c in chunks]
+    )
+
 @app.post("/qa")
 async def rag_qa(
     query: str = Form(...), 
@@ -538,99 +1199,31 @@ async def rag_qa(
     language: Optional[str] = Form("en")
 ):
     try:
-        semantic_weight = 0.7
-        # Pass bot_id to search
-        retrieval_res = await search_similar_chunks(
-            query, 
-            top_k,
-            semantic_weight,
-            language=language,
-            bot_id=bot_id  # Pass it here
-        )
-        chunks = retrieval_res.get("results", [])
-        if not chunks:
-            return {"answer": "No documents found or no index built.", "chunksUsed": []}
-
-        context_texts = [context] + [f"Chunk from doc {c['doc_id']}:\n{c['text']}" for c in chunks]
-        context_str = "\n\n".join(context_texts)
-        print("lang", language)
-        query_language = language
-        print("query_language",query_language)
-
-        file_content = None
-        file_type = None
-        file_markers = ["This is the File or Image content the user sent inline", "File content:"]
-        
-        for marker in file_markers:
-            if marker in context:
-                # Extract the file content part
-                file_start = context.find(marker)
-                file_content_part = context[file_start:]
-
-        payload = {
-    "contents": [{
-        "parts": [
-            {
-                "text": (
-                    f"You are a highly contextual legal assistant designed to answer questions based only on the provided information. "
-                    f"Follow these rules when answering user queries:\n\n"
-
-                    f"1. Always prioritize context in the following order:\n"
-                    f"   - Relevant chunks retrieved from the database or knowledge base.\n"
-                    f"   - The last 7 messages for conversational relevance.\n"
-                    f"   - The conversation summary for broader context.\n\n"
-
-                    f"2. For follow-up questions:\n"
-                    f"   - Check the last 7 messages and chunks to identify what the user is referring to.\n"
-                    f"   - If no clarity is found in the last 5 messages, check the conversation summary.\n\n"
-
-                    f"3. NEVER answer based solely on your own knowledge. Only use the context provided in chunks, messages, or summary.\n\n"
-
-                    f"4. If the context is insufficient:\n"
-                    f"   - Ask the user to clarify or rephrase their query naturally.\n\n"
-
-                    f"5. Your responses must be:\n"
-                    f"   - Concise and factual.\n"
-                    f"   - Integrated naturally into the response without robotic phrasing like 'According to the context' or 'Based on the provided information.'\n"
-                    f"   - Polite and professional.\n\n"
-                    f"   - if asked to describe more or anything of the sort like explain more, break down and explain using more words.\n\n"
-                    f"   - use markdown to format your response.\n\n"
-
-                    f"6. **Handling Opinion-Based Questions:**\n"
-                    f"   - Questions like 'How do you define...?', 'What do you think about...?', 'Do you believe...?', 'In your opinion, should...?' can and should be answered based on the provided context.\n"
-                    f"   - Instead of avoiding such questions, use the retrieved information to craft a natural and confident response.\n"
-                    f"   - Do not explicitly state that you are relying on context—just answer as if you have the knowledge.\n\n"
-
-                    f"7. **Language Handling Instructions:**\n"
-                    f"   - The user's query language is: {query_language}\n"
-                    f"   - If the language is Amharic (am), first translate the query and context to English internally,\n"
-                    f"     process your answer in English, then translate your final answer back to Amharic.\n"
-                    f"   - If the language is English (en), process normally and respond in English.\n"
-                    f"   - YOU MUST ALWAYS RESPOND IN THE SAME LANGUAGE AS THE QUERY ({query_language}).\n\n"
-
-                    f"8. If the context is insufficient:\n"
-                    f"   - Ask the user to clarify or rephrase their query in their language.\n\n"
-
-                    f"9. **File Handling Instructions:**\n"
-                    f"   - The user has {f'included a file in their message. The file content is included in the context.' if file_content else 'not included any file in their message.'}\n"
-                    f"   - If file content is present, analyze it and incorporate relevant information in your response.\n\n"
-
-                    f"Now, answer this query naturally without explicitly stating that you are using context:\n\n"
-                    f"USER QUERY ({query_language}): {query}\n\n"
-                    f"CONTEXT:\n{context_str}\n\n"
-                    f"sub-system-prompt:\n {system_prompt.upper()}:"
-                    f"YOUR ANSWER IN {query_language.upper()}:"
-                )
-            }
-        ]
-    }]
-}
+        payload, chunks = await _build_qa_payload(query, context, bot_id, top_k, system_prompt, language)
+        if payload is None:
+            return {"answer": NO_CHUNKS_ANSWER, "chunksUsed": []}
+
+        # A near-identical question answered from the same chunks skips the LLM call
+        cache_key = None
+        if ANSWER_CACHE_ENABLED:
+            cache_key = await _answer_cache_key(query, chunks, context, system_prompt, language)
+            cached = answer_cache.lookup(bot_id, *cache_key)
+            if cached is not None:
+                return {
+                    "answer": cached.answer,
+                    "chunksUsed": chunks,
+                    "geminiMetadata": cached.metadata,
+                    "cached": True
+                }
 
-        result, error = call_gemini_api(payload)
+        result, error = await call_gemini_api(payload)
         if error:
             logger.error(f"Gemini error: {error}")
             return {"answer": error, "chunksUsed": chunks}
 
+        if cache_key is not None:
+            _store_answer(bot_id, cache_key, chunks, result["answer"], result.get("geminiMetadata", {}))
+
         return {
             "answer": result["answer"],
             "chunksUsed": chunks,
@@ -641,10 +1234,83 @@ async def rag_qa(
         logger.error(f"QA error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/qa/stream")
+async def rag_qa_stream(
+    query: str = Form(...), 
+    context: str = Form(...), 
+    bot_id: str = Form(...),
+    top_k: int = Form(3), 
+    system_prompt: Optional[str] = Form(" "),
+    language: Optional[str] = Form("en")
+):
+    """
+    Server-sent-events variant of /qa. Emits a `chunks` event with the retrieved
+    chunks, `token` events as the answer is generated, then `done` (or `error`).
+    """
+    try:
+        payload, chunks = await _build_qa_payload(query, context, bot_id, top_k, system_prompt, language)
+    except Exception as e:
+        logger.error(f"QA error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        yield _sse("chunks", {"chunksUsed": chunks})
+        if payload is None:
+            yield _sse("token", {"text": NO_CHUNKS_ANSWER})
+            yield _sse("done", {"geminiMetadata": {}})
+            return
+        try:
+            cache_key = None
+            if ANSWER_CACHE_ENABLED:
+                cache_key = await _answer_cache_key(query, chunks, context, system_prompt, language)
+                cached = answer_cache.lookup(bot_id, *cache_key)
+                if cached is not None:
+                    yield _sse("token", {"text": cached.answer})
+                    yield _sse("done", {"geminiMetadata": cached.metadata, "cached": True})
+                    return
+
+            answer_parts = []
+            async for event in stream_gemini_api(payload):
+                if event.get("done"):
+                    if cache_key is not None and answer_parts:
+                        _store_answer(bot_id, cache_key, chunks, "".join(answer_parts).strip(), event.get("geminiMetadata", {}))
+                    yield _sse("done", {"geminiMetadata": event.get("geminiMetadata", {})})
+                else:
+                    answer_parts.append(event["text"])
+                    yield _sse("token", {"text": event["text"]})
+        except GeminiError as e:
+            yield _sse("error", {"message": str(e)})
+        except Exception as e:
+            logger.error(f"QA stream error: {e}")
+            yield _sse("error", {"message": SERVICE_ERROR})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/documents/{doc_id}/status")
 async def get_document_status(doc_id: str):
     try:
-        doc_chunks = [doc for doc in global_state.documents_store if doc["doc_id"] == doc_id]
+        job = ingestion_jobs.latest_for_document(doc_id) if ingestion_jobs is not None else None
+        if job is not None and job["state"] != "completed":
+            return {
+                "status": job["state"] if job["state"] in ("failed", "cancelled") else "processing",
+                "progress": job_progress(job),
+                "job_id": job["id"],
+                "stage": job["stage"],
+                "pages_done": job["pages_done"],
+                "pages_total": job["pages_total"],
+                "ocr_pages": job["ocr_pages"],
+                "chunks_embedded": job["chunks_embedded"],
+                "error": job["error"]
+            }
+
+        doc_chunks = global_state.chunk_store.document_entries(doc_id)
         if not doc_chunks:
             return {"status": "not_found", "progress": 0}
 
@@ -657,7 +1323,43 @@ async def get_document_status(doc_id: str):
         logger.error(f"Error getting document status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/associate_documents_with_bot")
+@app.delete("/documents/{doc_id}", dependencies=[Depends(require_writer)])
+async def delete_document(doc_id: str) -> Dict[str, Any]:
+    """Delete a document's chunks from FAISS, BM25 and the documents store."""
+    try:
+        # Tombstoning and compaction run on the search executor, like searches, to keep the loop free
+        run = global_state.rag_processor.search_executor.run
+        removed = await run(global_state.delete_document, doc_id)
+        if not removed:
+            raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+        answer_cache.invalidate_documents([doc_id])
+        
+        compacted = False
+        if global_state.needs_compaction():
+            await run(global_state.compact_indices)
+            compacted = True
+        
+        await global_state.save_state()
+        await run(global_state.refresh_state)
+        return {"status": "success", "doc_id": doc_id, "chunks_removed": removed, "compacted": compacted}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting document {doc_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/faiss/compact", dependencies=[Depends(require_writer)])
+async def compact_faiss_index() -> Dict[str, Any]:
+    """Drop deleted chunks from the indices and renumber the remaining ones."""
+    try:
+        live_chunks = await global_state.rag_processor.search_executor.run(global_state.compact_indices)
+        await global_state.save_state()
+        return {"status": "success", "chunks": live_chunks, "faiss_size": global_state.faiss_index.ntotal}
+    except Exception as e:
+        logger.error(f"Error compacting indices: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/associate_documents_with_bot", dependencies=[Depends(require_writer)])
 async def associate_documents_with_bot(
     bot_id: str = Form(...),
     doc_ids: List[str] = Form(...)
@@ -668,12 +1370,7 @@ async def associate_documents_with_bot(
         modified_count = await global_state.rag_processor.add_bot_to_documents(doc_ids, bot_id)
         
         # Also update documents_store to maintain consistency
-        for doc in global_state.documents_store:
-            if doc["doc_id"] in doc_ids:
-                if "bot_ids" not in doc:
-                    doc["bot_ids"] = [doc.get("bot_id")] if doc.get("bot_id") else []
-                if bot_id not in doc["bot_ids"]:
-                    doc["bot_ids"].append(bot_id)
+        global_state.add_bot_to_entries(doc_ids, bot_id)
         
         # Save the updated state
         await global_state.save_state()
@@ -688,12 +1385,22 @@ async def associate_documents_with_bot(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+_translator = None
+
+def get_translator():
+    """Create the translator on first use; googletrans is only needed for translation."""
+    global _translator
+    if _translator is None:
+        from utils.amharic_rag import ConcurrentTranslator
+        _translator = ConcurrentTranslator()
+    return _translator
+
 async def translate_to_english(text: str) -> str:
     """Helper function to translate text to English"""
     if not text:
         return ""
     try:
-        result = await translator.translate_text(text, src='am', dest='en')
+        result = await get_translator().translate_text(text, src='am', dest='en')
         return result if result else text
     except Exception as e:
         logger.error(f"Translation to English failed: {str(e)}")
@@ -723,7 +1430,7 @@ def translate_english_to_amharic(text):
 @app.post("/summarize")
 async def summarize(conversationText: str = Form(...)):
     try:
-        summary = summarize_with_gemini(conversationText)
+        summary = await summarize_with_gemini(conversationText)
         if not summary:
             raise HTTPException(status_code=500, detail="Failed to summarize the conversation.")
         return {"summary": summary}
@@ -731,11 +1438,11 @@ async def summarize(conversationText: str = Form(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/summarize_doc")
-def summarize_doc(doc_params: Dict[str, Any]):
+async def summarize_doc(doc_params: Dict[str, Any]):
     doc_id = doc_params.get("docId")
     mode = doc_params.get("mode", "summary")
 
-    relevant_chunks = [d for d in global_state.documents_store if d["doc_id"] == doc_id]
+    relevant_chunks = global_state.chunk_store.document_entries(doc_id)
     if not relevant_chunks:
         return {"error": "No chunks found for this documentId."}
 
@@ -752,18 +1459,18 @@ def summarize_doc(doc_params: Dict[str, Any]):
             }
         ]
     }
-    result, error = call_gemini_api(payload)
+    result, error = await call_gemini_api(payload)
     if error:
         return {"error": error}
     return {"summary": result["answer"]}
 
 @app.post("/classify_doc")
-def classify_doc(doc_params: Dict[str, Any]):
+async def classify_doc(doc_params: Dict[str, Any]):
     doc_id = doc_params.get("docId")
     if not doc_id:
         return {"error": "No docId provided"}
 
-    relevant_chunks = [d for d in global_state.documents_store if d["doc_id"] == doc_id]
+    relevant_chunks = global_state.chunk_store.document_entries(doc_id)
     if not relevant_chunks:
         return {"error": "No chunks found for this docId"}
 
@@ -780,7 +1487,7 @@ def classify_doc(doc_params: Dict[str, Any]):
     payload = {
         "contents": [{"parts": [{"text": prompt}]}]
     }
-    result, error = call_gemini_api(payload)
+    result, error = await call_gemini_api(payload)
     if error:
         return {"error": error}
 
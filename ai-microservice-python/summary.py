@@ -1,10 +1,10 @@
-import requests
-# gemini_helper.py
+# summary.py
 import os
 from dotenv import load_dotenv
-import requests
 import logging
 
+from gemini_helper import call_gemini_api
+
 logger = logging.getLogger(__name__)
 
 load_dotenv(dotenv_path="../backend-node/.env")
@@ -17,7 +17,7 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")  # if needed
 
 
 
-def summarize_with_gemini(conversation_text):
+async def summarize_with_gemini(conversation_text):
     """
     Summarize the given conversation using the Gemini API.
     
@@ -28,7 +28,6 @@ def summarize_with_gemini(conversation_text):
         str: The summarized text or an empty string on failure.
     """
     prompt = f"Summarize the following conversation concisely:\n\n{conversation_text}\n\nSummary:"
-    print("here")
     payload = {
         "contents": [
             {
@@ -36,25 +35,8 @@ def summarize_with_gemini(conversation_text):
             }
         ]
     }
-    headers = {"Content-Type": "application/json"}
-
-    try:
-        response = requests.post(
-            f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-            json=payload,
-            headers=headers
-        )
-
-        if response.status_code == 200:
-            data = response.json()
-            print(data)
-            candidates = data.get("candidates", [])
-            if candidates:
-                return candidates[0]["content"]["parts"][0]["text"].strip()
-        else:
-            print(f"Error: Received status code {response.status_code}")
-    except requests.RequestException as e:
-        print(f"Error: {e}")
-
-    return ""
-
+    result, error = await call_gemini_api(payload)
+    if error:
+        logger.error(f"Summarization failed: {error}")
+        return ""
+    return result["answer"]
@@ -0,0 +1,136 @@
+# conftest.py
+import asyncio
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+import pytest
+
+# The service modules are imported from the service root, as main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.chunk_store import ChunkStore
+from utils.rag_processor import RAGProcessor
+from utils.segmenter import TOKEN_PATTERN
+
+STUB_DIM = 64
+
+
+def _word_id(word: str) -> int:
+    return int(hashlib.md5(word.lower().encode("utf-8")).hexdigest(), 16)
+
+
+class StubTokenizer:
+    """Fast-tokenizer stand-in with one token per word or punctuation mark."""
+
+    is_fast = True
+
+    def num_special_tokens_to_add(self, pair: bool = False) -> int:
+        return 2
+
+    def __call__(self, text, add_special_tokens: bool = True, return_offsets_mapping: bool = False):
+        texts = [text] if isinstance(text, str) else text
+        input_ids, offset_mapping = [], []
+        for item in texts:
+            matches = list(TOKEN_PATTERN.finditer(item))
+            ids = [_word_id(match.group()) % 30000 for match in matches]
+            input_ids.append([101, *ids, 102] if add_special_tokens else ids)
+            offset_mapping.append([match.span() for match in matches])
+        encoded = {"input_ids": input_ids[0] if isinstance(text, str) else input_ids}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = offset_mapping[0] if isinstance(text, str) else offset_mapping
+        return encoded
+
+
+class StubEmbedder:
+    """
+    SentenceTransformer stand-in with deterministic bag-of-words embeddings:
+    texts with the same words embed identically.
+    """
+
+    def __init__(self, max_seq_length: int = 32):
+        self.max_seq_length = max_seq_length
+        self.tokenizer = StubTokenizer()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return STUB_DIM
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, show_progress_bar: bool = False):
+        vectors = np.zeros((len(texts), STUB_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in TOKEN_PATTERN.findall(text):
+                vectors[row, _word_id(word) % STUB_DIM] += 1.0
+        faiss.normalize_L2(vectors)
+        return vectors
+
+
+@pytest.fixture
+def stub_tokenizer():
+    return StubTokenizer()
+
+
+@pytest.fixture
+def rag_processor(monkeypatch):
+    """A RAGProcessor over the stub embedder, with no caches on disk."""
+    monkeypatch.setattr(RAGProcessor, "_initialize_embedding_model", lambda self, name: StubEmbedder())
+    processor = RAGProcessor()
+    yield processor
+    processor.close()
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """main.py, imported from a scratch directory: it opens files under ./cache on import."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("service"))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+@pytest.fixture
+def service_state(main_module, rag_processor, tmp_path, monkeypatch):
+    """The service's global state, initialized empty over `rag_processor` and a fresh chunk store."""
+    state = main_module.global_state
+    chunk_store = ChunkStore(tmp_path / "chunk_store")
+    chunk_store.import_entries([])
+    for name, value in {
+        "rag_processor": rag_processor,
+        "faiss_index": rag_processor.index,
+        "chunk_store": chunk_store,
+        "documents_store": chunk_store.entries,
+        "chunks_metadata": rag_processor.chunks_metadata,
+        "tokenized_texts": rag_processor.tokenized_texts,
+        "_persisted_index_version": None,
+        "is_initialized": True,
+    }.items():
+        monkeypatch.setattr(state, name, value, raising=False)
+    return state
+
+
+@pytest.fixture
+def embed_documents(service_state):
+    """
+    Prepare {doc_id: text} documents concurrently and commit them as one batch
+    for `bot_id`, as the ingestion jobs do.
+    """
+    upload = {"title": "Test", "docScope": "public", "category": "law", "language": "en"}
+
+    async def prepare(doc_id, text, bot_id):
+        async def pages():
+            yield text
+        return await service_state.rag_processor.prepare_document_pages(doc_id, pages(), "en", bot_id)
+
+    async def prepare_all(documents, bot_id):
+        return await asyncio.gather(*(prepare(doc_id, text, bot_id) for doc_id, text in documents.items()))
+
+    def embed(documents, bot_id="bot"):
+        prepared = asyncio.run(prepare_all(documents, bot_id))
+        service_state.commit_documents([(document, upload) for document in prepared], "2026-01-01")
+        service_state.refresh_state()
+    return embed
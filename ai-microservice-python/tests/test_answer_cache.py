@@ -0,0 +1,173 @@
+# test_answer_cache.py
+import asyncio
+import hashlib
+import re
+
+import faiss
+import numpy as np
+import pytest
+
+from utils.answer_cache import SemanticAnswerCache, chunk_set_key, prompt_key
+
+DIM = 64
+
+
+class StubEmbedder:
+    """Deterministic bag-of-words embedding: texts with the same words embed identically."""
+
+    def encode(self, text: str) -> np.ndarray:
+        vector = np.zeros((1, DIM), dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[0, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % DIM] += 1.0
+        faiss.normalize_L2(vector)
+        return vector
+
+
+class StubLLM:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, query: str, chunks) -> str:
+        self.calls.append(query)
+        return f"answer {len(self.calls)} to {query}"
+
+
+def chunks_for(*texts, doc_id="doc-1"):
+    return [{"doc_id": doc_id, "text": text} for text in texts]
+
+
+async def answer(cache, embedder, llm, bot_id, query, chunks, system_prompt=" ", language="en"):
+    """The /qa flow: a qualifying cached answer skips the LLM, otherwise its answer is stored."""
+    key = (embedder.encode(query), chunk_set_key(chunks), prompt_key(language, system_prompt, ""))
+    cached = cache.lookup(bot_id, *key)
+    if cached is not None:
+        return cached.answer, True
+    result = await llm(query, chunks)
+    cache.store(bot_id, *key, result, {}, doc_ids=[c["doc_id"] for c in chunks])
+    return result, False
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(threshold=0.95)
+
+
+def ask(cache, llm, bot_id, query, chunks, **kwargs):
+    return asyncio.run(answer(cache, StubEmbedder(), llm, bot_id, query, chunks, **kwargs))
+
+
+def test_near_identical_question_is_a_hit(cache):
+    llm = StubLLM()
+    chunks = chunks_for("The tax rate is 15 percent.")
+
+    first, first_cached = ask(cache, llm, "bot", "What is the tax rate?", chunks)
+    second, second_cached = ask(cache, llm, "bot", "what is the TAX rate", chunks)
+
+    assert (first_cached, second_cached) == (False, True)
+    assert second == first
+    assert len(llm.calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_different_question_is_a_miss(cache):
+    llm = StubLLM()
+    chunks = chunks_for("The tax rate is 15 percent.")
+
+    ask(cache, llm, "bot", "What is the tax rate?", chunks)
+    _, cached = ask(cache, llm, "bot", "Who registers a business?", chunks)
+
+    assert not cached
+    assert len(llm.calls) == 2
+
+
+def test_same_question_with_different_chunks_or_prompt_is_a_miss(cache):
+    llm = StubLLM()
+    chunks = chunks_for("The tax rate is 15 percent.")
+
+    ask(cache, llm, "bot", "What is the tax rate?", chunks)
+    assert not ask(cache, llm, "bot", "What is the tax rate?", chunks_for("Another chunk."))[1]
+    assert not ask(cache, llm, "bot", "What is the tax rate?", chunks, language="amh")[1]
+    assert not ask(cache, llm, "bot", "What is the tax rate?", chunks, system_prompt="be brief")[1]
+    assert len(llm.calls) == 4
+
+
+def test_chunk_set_key_ignores_order_but_not_text():
+    a, b = {"doc_id": "d", "text": "one"}, {"doc_id": "d", "text": "two"}
+    assert chunk_set_key([a, b]) == chunk_set_key([b, a])
+    assert chunk_set_key([a, b]) != chunk_set_key([a, {"doc_id": "d", "text": "two!"}])
+
+
+@pytest.mark.parametrize("threshold, hit", [(0.80, True), (0.90, False)])
+def test_threshold_bounds_the_similarity_of_a_hit(threshold, hit):
+    cache = SemanticAnswerCache(threshold=threshold)
+    stored = np.array([[1.0, 0.0, 0.0]], dtype=np.float32)
+    query = np.array([[0.85, np.sqrt(1 - 0.85 ** 2), 0.0]], dtype=np.float32)  # cosine 0.85
+
+    cache.store("bot", stored, "chunks", "prompt", "cached answer")
+
+    assert (cache.lookup("bot", query, "chunks", "prompt") is not None) is hit
+
+
+def test_answers_are_isolated_per_bot(cache):
+    llm = StubLLM()
+    chunks = chunks_for("The tax rate is 15 percent.")
+
+    ask(cache, llm, "bot-a", "What is the tax rate?", chunks)
+    _, cached_b = ask(cache, llm, "bot-b", "What is the tax rate?", chunks)
+    _, cached_a = ask(cache, llm, "bot-a", "What is the tax rate?", chunks)
+
+    assert (cached_b, cached_a) == (False, True)
+    assert len(llm.calls) == 2
+    assert cache.stats()["bots"] == 2
+
+
+def test_reembedding_a_document_invalidates_its_answers(cache):
+    llm = StubLLM()
+    tax = chunks_for("The tax rate is 15 percent.", doc_id="tax-law")
+    court = chunks_for("Courts hear appeals.", doc_id="court-law")
+
+    ask(cache, llm, "bot", "What is the tax rate?", tax)
+    ask(cache, llm, "bot", "Who hears appeals?", court)
+
+    # Committing or deleting a document invalidates every answer built from it
+    assert cache.invalidate_documents(["tax-law"]) == 1
+
+    assert not ask(cache, llm, "bot", "What is the tax rate?", tax)[1]
+    assert ask(cache, llm, "bot", "Who hears appeals?", court)[1]
+    assert len(llm.calls) == 3
+
+
+def test_updated_chunk_text_misses_even_without_invalidation(cache):
+    llm = StubLLM()
+
+    ask(cache, llm, "bot", "What is the tax rate?", chunks_for("The tax rate is 15 percent."))
+    _, cached = ask(cache, llm, "bot", "What is the tax rate?", chunks_for("The tax rate is 20 percent."))
+
+    assert not cached
+
+
+def test_expired_answers_are_dropped(monkeypatch):
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=10)
+    now = [1000.0]
+    monkeypatch.setattr("utils.answer_cache.time.monotonic", lambda: now[0])
+    llm = StubLLM()
+    chunks = chunks_for("The tax rate is 15 percent.")
+
+    ask(cache, llm, "bot", "What is the tax rate?", chunks)
+    now[0] += 11
+
+    assert not ask(cache, llm, "bot", "What is the tax rate?", chunks)[1]
+    assert cache.stats()["entries"] == 1  # the expired answer was replaced
+
+
+def test_oldest_answers_are_evicted_at_capacity():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=2)
+    llm = StubLLM()
+    chunks = chunks_for("Some law.")
+
+    for query in ("first question", "second question", "third question"):
+        ask(cache, llm, "bot", query, chunks)
+
+    assert cache.stats()["entries"] == 2
+    assert not ask(cache, llm, "bot", "first question", chunks)[1]
+    assert ask(cache, llm, "bot", "third question", chunks)[1]
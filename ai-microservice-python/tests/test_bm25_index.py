@@ -0,0 +1,100 @@
+# test_bm25_index.py
+import numpy as np
+import pytest
+
+from utils.bm25_index import FrozenBM25, IncrementalBM25
+
+CORPUS = [
+    ["tax", "rate", "for", "income"],
+    ["tax", "refund", "for", "tax", "year"],
+    ["court", "appeal", "for", "the", "court"],
+    ["tax", "court", "ruling"],
+    ["land", "lease", "for", "farm"],
+]
+
+# rank_bm25.BM25Okapi(CORPUS).get_scores(query) for each query; "for" is in most
+# documents, so its idf is floored at epsilon * average idf
+REFERENCE = {
+    ("tax", "court"): [0.194308, 0.255964, 0.452943, 0.604314, 0.0],
+    ("for", "tax", "tax"): [0.582925, 0.68706, 0.175133, 0.436397, 0.194308],
+    ("appeal", "missing"): [0.0, 0.0, 1.01188, 0.0, 0.0],
+}
+
+# The same, over CORPUS without document 3, which stays a zero-scoring tombstone
+REFERENCE_WITHOUT_3 = {
+    ("tax", "court"): [0.0, 0.0, 1.168687, 0.0, 0.0],
+    ("for", "tax", "tax"): [0.137626, 0.124519, 0.124519, 0.0, 0.137626],
+    ("appeal", "missing"): [0.0, 0.0, 0.80695, 0.0, 0.0],
+}
+
+
+def built(corpus=CORPUS):
+    bm25 = IncrementalBM25()
+    bm25.add_documents(corpus)
+    return bm25
+
+
+@pytest.mark.parametrize("query", list(REFERENCE))
+def test_scores_match_bm25_okapi(query):
+    np.testing.assert_allclose(built().get_scores(list(query)), REFERENCE[query], atol=1e-5)
+
+
+def test_scores_many_rows_match_single_queries():
+    bm25 = built()
+    queries = [list(query) for query in REFERENCE]
+
+    scores = bm25.get_scores_many(queries)
+
+    assert scores.shape == (len(queries), len(CORPUS))
+    for row, query in zip(scores, queries):
+        np.testing.assert_allclose(row, bm25.get_scores(query), atol=1e-6)
+
+
+def test_candidate_scores_are_aligned_with_the_candidates():
+    bm25 = built()
+    candidates = np.array([1, 3, 4], dtype=np.int64)
+
+    for query, expected in REFERENCE.items():
+        np.testing.assert_allclose(bm25.get_scores(list(query), candidates), np.take(expected, candidates), atol=1e-5)
+    np.testing.assert_allclose(
+        bm25.get_scores_many([list(query) for query in REFERENCE], candidates),
+        [np.take(expected, candidates) for expected in REFERENCE.values()],
+        atol=1e-5
+    )
+
+
+def test_removed_document_scores_as_if_never_added():
+    bm25 = built()
+
+    assert bm25.remove_document(3)
+    assert not bm25.remove_document(3)
+
+    assert bm25.corpus_size == len(CORPUS)
+    assert bm25.num_docs == len(CORPUS) - 1
+    for query, expected in REFERENCE_WITHOUT_3.items():
+        np.testing.assert_allclose(bm25.get_scores(list(query)), expected, atol=1e-5)
+
+
+def test_tombstones_keep_positions_aligned():
+    bm25 = built([None, *CORPUS])
+
+    for query, expected in REFERENCE.items():
+        np.testing.assert_allclose(bm25.get_scores(list(query)), [0.0, *expected], atol=1e-5)
+
+
+def test_frozen_snapshot_scores_like_the_index_it_was_written_from(tmp_path):
+    bm25 = built()
+    bm25.remove_document(3)
+    bm25.write_snapshot(tmp_path / "bm25")
+
+    frozen = FrozenBM25(tmp_path / "bm25")
+    queries = [list(query) for query in REFERENCE]
+    candidates = np.array([0, 2, 3], dtype=np.int64)
+
+    assert frozen.corpus_size == bm25.corpus_size
+    for query in queries:
+        np.testing.assert_array_equal(frozen.get_scores(query), bm25.get_scores(query))
+        np.testing.assert_array_equal(frozen.get_scores(query, candidates), bm25.get_scores(query, candidates))
+    np.testing.assert_array_equal(frozen.get_scores_many(queries), bm25.get_scores_many(queries))
+    with pytest.raises(TypeError):
+        frozen.add_document(["tax"])
@@ -0,0 +1,143 @@
+# test_chunk_store.py
+import json
+
+import pytest
+
+from utils.chunk_store import MANIFEST_NAME, ChunkStore, ChunkStoreCorruptError, open_chunk_store
+
+
+def entry(doc_id, text, **fields):
+    return {"doc_id": doc_id, "text": text, "bot_ids": ["bot"], **fields}
+
+
+def test_json_migration_records_faiss_positions_before_writing(tmp_path):
+    legacy = tmp_path / "documents_store.json"
+    legacy.write_text(json.dumps([entry("a", "one"), entry("b", "two"), entry("a", "three")]), encoding="utf-8")
+
+    open_chunk_store(tmp_path / "store", legacy_json_path=legacy)
+    # A restart right after the migration, with no compaction in between
+    reopened = open_chunk_store(tmp_path / "store", legacy_json_path=legacy)
+
+    assert not reopened.migrated
+    positions = {e["text"]: e["embedding_idx"] for e in reopened.entries}
+    assert positions == {"one": 0, "two": 1, "three": 2}
+
+
+def written_store(directory, **options):
+    """Two documents and a bot association, flushed one record per segment."""
+    store = ChunkStore(directory, segment_max_bytes=1, **options)
+    store.import_entries([])
+    store.put_document("a", [entry("a", "one"), entry("a", "two")])
+    store.flush()
+    store.put_document("b", [entry("b", "three")])
+    store.flush()
+    store.add_bot(["a"], "other")
+    store.flush()
+    return store
+
+
+def reloaded(directory):
+    store = ChunkStore(directory)
+    store.load()
+    return store
+
+
+def test_reload_replays_the_log_from_the_manifest(tmp_path):
+    store = written_store(tmp_path)
+    store.put_document("c", [entry("c", "four")])
+    store.delete_document("b")
+    store.flush()
+
+    reopened = reloaded(tmp_path)
+
+    assert len(reopened._segments) > 1
+    assert [e["text"] for e in reopened.entries] == ["one", "two", "four"]
+    assert reopened.document_entries("a")[0]["bot_ids"] == ["bot", "other"]
+    assert reopened.document_entries("b") == []
+
+
+def test_torn_tail_of_the_last_segment_is_dropped(tmp_path):
+    store = written_store(tmp_path)
+    last = tmp_path / store._segments[-1]
+    intact = last.stat().st_size
+    store.segment_max_bytes = 1024 * 1024  # append to the same segment
+    store.put_document("c", [entry("c", "four")])
+    store.flush()
+    # A crash halfway through appending the last record
+    with open(last, "r+b") as f:
+        f.truncate(intact + (last.stat().st_size - intact) // 2)
+
+    reopened = reloaded(tmp_path)
+
+    assert [e["text"] for e in reopened.entries] == ["one", "two", "three"]
+    assert last.stat().st_size == intact
+    assert [e["text"] for e in reloaded(tmp_path).entries] == ["one", "two", "three"]
+
+
+def test_bad_checksum_at_the_tail_is_dropped(tmp_path):
+    store = written_store(tmp_path)
+    last = tmp_path / store._segments[-1]
+    intact = last.stat().st_size
+    store.segment_max_bytes = 1024 * 1024  # append to the same segment
+    store.put_document("c", [entry("c", "four")])
+    store.flush()
+    with open(last, "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"\x00")
+
+    assert [e["text"] for e in reloaded(tmp_path).entries] == ["one", "two", "three"]
+    assert last.stat().st_size == intact
+
+
+def test_truncated_record_before_the_last_segment_is_corruption(tmp_path):
+    store = written_store(tmp_path)
+    first = tmp_path / store._segments[0]
+    with open(first, "r+b") as f:
+        f.truncate(first.stat().st_size - 1)
+
+    with pytest.raises(ChunkStoreCorruptError):
+        reloaded(tmp_path)
+
+
+def test_corrupt_document_record_before_the_last_segment_is_corruption(tmp_path):
+    store = written_store(tmp_path)
+    first = tmp_path / store._segments[0]
+    with open(first, "r+b") as f:
+        f.seek(-2, 2)
+        f.write(b"XX")
+
+    # Document payloads are verified when first decoded rather than on load
+    reopened = reloaded(tmp_path)
+    assert reopened.document_entries("b")[0]["text"] == "three"
+    with pytest.raises(ChunkStoreCorruptError):
+        reopened.document_entries("a")
+
+
+def test_compaction_swaps_in_a_single_segment(tmp_path):
+    store = written_store(tmp_path)
+    store.put_document("a", [entry("a", "one again")])
+    store.flush()
+    obsolete = list(store._segments)
+
+    store.compact(update=lambda position, e: e.__setitem__("embedding_idx", position))
+
+    assert len(store._segments) == 1 and store._segments[0] not in obsolete
+    assert sorted(path.name for path in tmp_path.iterdir()) == [MANIFEST_NAME, store._segments[0]]
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert manifest["segments"] == store._segments
+
+    reopened = reloaded(tmp_path)
+    assert [(e["text"], e["embedding_idx"]) for e in reopened.entries] == [("three", 0), ("one again", 1)]
+    assert reopened.document_entries("b")[0]["bot_ids"] == ["bot"]
+
+
+def test_interrupted_compaction_leaves_the_previous_segments_live(tmp_path):
+    store = written_store(tmp_path)
+    segments = list(store._segments)
+    # A crash before the rewritten segment was renamed into place
+    (tmp_path / "segment-999999.log.tmp").write_bytes(b"partial")
+
+    reopened = reloaded(tmp_path)
+
+    assert reopened._segments == segments
+    assert [e["text"] for e in reopened.entries] == ["one", "two", "three"]
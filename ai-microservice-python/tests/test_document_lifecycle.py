@@ -0,0 +1,91 @@
+# test_document_lifecycle.py
+import asyncio
+
+import faiss
+import numpy as np
+
+from utils.bm25_index import IncrementalBM25
+from utils.chunk_store import ChunkStore
+from utils.index_factory import stored_ids
+
+DOCUMENTS = {
+    "tax": (
+        "Income tax is due by the end of March. Late filers pay a penalty on the amount owed. "
+        "Refunds are paid within one month of filing. Employers withhold tax from monthly wages."
+    ),
+    "court": (
+        "An appeal must be lodged within thirty days. The appellate court reviews the record only. "
+        "New evidence is admitted in exceptional cases. Judgments are published after delivery."
+    ),
+    "land": (
+        "Rural land is held under long leases. A lease may be transferred with the consent of the registry. "
+        "Boundaries are recorded on the cadastral map. Disputes go to the land tribunal first."
+    ),
+}
+
+
+def assert_aligned(state):
+    """FAISS ids, chunks metadata positions, BM25 and the documents store all agree."""
+    rag = state.rag_processor
+    metadata = rag.chunks_metadata
+    live = [position for position, chunk in enumerate(metadata) if not chunk.deleted]
+
+    assert [chunk.embedding_idx for chunk in metadata] == list(range(len(metadata)))
+    assert rag.num_live_chunks == len(live)
+
+    # FAISS holds exactly the live positions, each under its own chunk's vector
+    assert sorted(stored_ids(rag.index).tolist()) == live
+    vectors = rag._embed_texts([metadata[position].processed_text for position in live])
+    faiss.normalize_L2(vectors)
+    _, ids = rag.index.search(vectors, 1)
+    assert ids[:, 0].tolist() == live
+
+    # BM25 scores every position as an index built from scratch over the metadata would
+    rebuilt = IncrementalBM25()
+    rebuilt.add_documents([None if chunk.deleted else chunk.processed_text.split() for chunk in metadata])
+    assert rag.bm25.corpus_size == len(metadata)
+    for query in (["tax", "penalty"], ["appeal", "court"], ["lease", "land", "the"]):
+        np.testing.assert_allclose(rag.bm25.get_scores(query), rebuilt.get_scores(query), atol=1e-6)
+
+    # Each stored entry records the position of its chunk
+    assert sorted((entry["embedding_idx"], entry["text"]) for entry in state.chunk_store.entries) == [
+        (position, metadata[position].original_text) for position in live
+    ]
+
+
+def searched_docs(state, query):
+    results = asyncio.run(state.rag_processor.search(query, top_k=20))
+    return {result["doc_id"] for result in results}
+
+
+def test_delete_and_compact_keep_the_indices_aligned(service_state, embed_documents):
+    embed_documents(DOCUMENTS)
+    assert len({chunk.doc_id for chunk in service_state.rag_processor.chunks_metadata}) == 3
+    assert len(service_state.rag_processor.chunks_metadata) > 3  # several chunks per document
+    assert_aligned(service_state)
+
+    assert service_state.delete_document("court") > 0
+    service_state.refresh_state()
+
+    assert service_state.rag_processor.num_deleted > 0
+    assert_aligned(service_state)
+    assert "court" not in searched_docs(service_state, "appeal court judgments")
+
+    # Re-embedding replaces a document's chunks: the old ones become tombstones too
+    embed_documents({"tax": DOCUMENTS["tax"] + " Penalties are waived for first offences."})
+    assert_aligned(service_state)
+
+    deleted = service_state.rag_processor.num_deleted
+    total = len(service_state.rag_processor.chunks_metadata)
+    assert service_state.compact_indices() == total - deleted
+
+    assert service_state.rag_processor.num_deleted == 0
+    assert_aligned(service_state)
+    assert searched_docs(service_state, "tax penalty lease land") == {"tax", "land"}
+
+    # The renumbered positions are what a restart reads back from the chunk store
+    reloaded = ChunkStore(service_state.chunk_store.directory)
+    reloaded.load()
+    assert [
+        (chunk.embedding_idx, chunk.original_text) for chunk in service_state._chunks_from_entries(reloaded.entries)
+    ] == [(chunk.embedding_idx, chunk.original_text) for chunk in service_state.rag_processor.chunks_metadata]
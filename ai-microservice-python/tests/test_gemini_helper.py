@@ -0,0 +1,267 @@
+# test_gemini_helper.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import gemini_helper
+from gemini_helper import SERVICE_ERROR, GeminiClient, GeminiError
+
+API_URL = "http://gemini.test/v1/models/test:generateContent"
+
+
+def answer_body(text="Hello", finish_reason="STOP"):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": finish_reason}],
+        "usageMetadata": {"totalTokenCount": 7},
+    }
+
+
+def sse_body(*events):
+    return "".join(f"data: {json.dumps(event)}\r\n\r\n" for event in events).encode("utf-8")
+
+
+def make_client(handler, **kwargs):
+    client = GeminiClient(api_url=API_URL, api_key="secret", transport=httpx.MockTransport(handler), **kwargs)
+    client.backoffs = []
+
+    def backoff(attempt, retry_after=None):
+        client.backoffs.append((attempt, retry_after))
+        return 0
+
+    client._backoff = backoff
+    return client
+
+
+async def collect(client, payload):
+    events = []
+    try:
+        async for event in client.stream(payload):
+            events.append(event)
+    finally:
+        await client.aclose()
+    return events
+
+
+async def generate(client, payload):
+    try:
+        return await client.generate(payload)
+    finally:
+        await client.aclose()
+
+
+def test_generate_parses_answer_and_sends_key():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=answer_body("  An answer  "))
+
+    result, error = asyncio.run(generate(make_client(handler), {"contents": []}))
+
+    assert error is None
+    assert result == {"answer": "An answer", "geminiMetadata": {"totalTokenCount": 7}}
+    assert requests[0].url.params["key"] == "secret"
+    assert json.loads(requests[0].content) == {"contents": []}
+
+
+def test_generate_retries_retryable_status_honouring_retry_after():
+    statuses = iter([503, 429, 200])
+
+    def handler(request):
+        status = next(statuses)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "2"}, json={"error": {"message": "busy"}})
+        return httpx.Response(200, json=answer_body())
+
+    client = make_client(handler)
+    result, error = asyncio.run(generate(client, {}))
+
+    assert error is None and result["answer"] == "Hello"
+    assert client.backoffs == [(0, "2"), (1, "2")]
+
+
+def test_generate_retries_transport_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json=answer_body())
+
+    client = make_client(handler)
+    result, error = asyncio.run(generate(client, {}))
+
+    assert error is None and len(calls) == 2
+    assert client.backoffs == [(0, None)]
+
+
+def test_generate_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(502)
+
+    client = make_client(handler, max_retries=2)
+    result, error = asyncio.run(generate(client, {}))
+
+    assert (result, error) == (None, SERVICE_ERROR)
+    assert len(calls) == 3
+    assert len(client.backoffs) == 2  # no sleep after the last attempt
+
+
+def test_generate_does_not_retry_client_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+    client = make_client(handler)
+    result, error = asyncio.run(generate(client, {}))
+
+    assert (result, error) == (None, SERVICE_ERROR)
+    assert len(calls) == 1 and client.backoffs == []
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"candidates": []}, "Gemini API returned no results."),
+    (answer_body("", finish_reason="SAFETY"), "The response was blocked due to safety concerns. Please try rephrasing the input."),
+    (answer_body("   "), "No answer text found in Gemini API response."),
+])
+def test_generate_maps_unusable_responses_to_errors(body, message):
+    client = make_client(lambda request: httpx.Response(200, json=body))
+    assert asyncio.run(generate(client, {})) == (None, message)
+
+
+def test_requests_are_bounded_by_the_semaphore():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json=answer_body())
+
+    client = make_client(handler, max_concurrency=2)
+
+    async def run():
+        try:
+            return await asyncio.gather(*(client.generate({}) for _ in range(6)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+
+    assert all(error is None for _, error in results)
+    assert peak == 2
+
+
+def test_stream_parses_sse_events():
+    requests = []
+    body = sse_body(
+        {"candidates": [{"content": {"parts": [{"text": "Hel"}]}}]},
+        {"candidates": [{"content": {"parts": [{"text": "lo"}, {"text": "!"}]}}], "usageMetadata": {"totalTokenCount": 3}},
+    )
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=body, headers={"Content-Type": "text/event-stream"})
+
+    events = asyncio.run(collect(make_client(handler), {"contents": []}))
+
+    assert events == [
+        {"text": "Hel"}, {"text": "lo"}, {"text": "!"},
+        {"done": True, "geminiMetadata": {"totalTokenCount": 3}},
+    ]
+    assert requests[0].url.path.endswith(":streamGenerateContent")
+    assert requests[0].url.params["alt"] == "sse"
+
+
+def test_stream_joins_multiline_data_and_handles_missing_final_blank_line():
+    body = b'data: {"candidates": [{"content":\ndata:  {"parts": [{"text": "a"}]}}]}\n\ndata: {"candidates": []}'
+    client = make_client(lambda request: httpx.Response(200, content=body))
+
+    assert asyncio.run(collect(client, {})) == [{"text": "a"}, {"done": True, "geminiMetadata": {}}]
+
+
+def test_stream_retries_before_the_first_token():
+    statuses = iter([503, 200])
+
+    def handler(request):
+        status = next(statuses)
+        if status != 200:
+            return httpx.Response(status)
+        return httpx.Response(200, content=sse_body({"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}))
+
+    client = make_client(handler)
+    events = asyncio.run(collect(client, {}))
+
+    assert events[0] == {"text": "ok"}
+    assert client.backoffs == [(0, None)]
+
+
+def test_stream_retries_connect_timeouts():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectTimeout("timed out", request=request)
+        return httpx.Response(200, content=sse_body({"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}))
+
+    client = make_client(handler)
+
+    assert asyncio.run(collect(client, {}))[0] == {"text": "ok"}
+    assert len(calls) == 2
+
+
+def test_stream_backoff_does_not_hold_a_concurrency_slot():
+    statuses = iter([503, 200, 200])
+    client = make_client(
+        lambda request: httpx.Response(next(statuses), content=sse_body({"candidates": []})),
+        max_concurrency=1
+    )
+    free_during_backoff = []
+
+    def backoff(attempt, retry_after=None):
+        free_during_backoff.append(not client._semaphore.locked())
+        return 0
+
+    client._backoff = backoff
+    asyncio.run(collect(client, {}))
+
+    assert free_during_backoff == [True]
+
+
+def test_stream_raises_on_client_error_and_safety_block():
+    client = make_client(lambda request: httpx.Response(403, json={"error": {"message": "denied"}}))
+    with pytest.raises(GeminiError, match=SERVICE_ERROR):
+        asyncio.run(collect(client, {}))
+
+    blocked = sse_body({"candidates": [{"finishReason": "SAFETY"}]})
+    client = make_client(lambda request: httpx.Response(200, content=blocked))
+    with pytest.raises(GeminiError, match="safety"):
+        asyncio.run(collect(client, {}))
+
+
+def test_backoff_is_jittered_capped_and_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(gemini_helper, "GEMINI_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(gemini_helper, "GEMINI_BACKOFF_MAX", 4.0)
+    client = GeminiClient(api_url=API_URL)
+
+    assert all(0 <= client._backoff(attempt) <= min(4.0, 2 ** attempt) for attempt in range(6) for _ in range(20))
+    assert client._backoff(0, "3") == 3.0
+    assert client._backoff(0, "60") == 4.0
+    assert 0 <= client._backoff(0, "Wed, 21 Oct 2015 07:28:00 GMT") <= 1.0
+
+
+def test_stream_url_is_derived_from_the_generate_url():
+    assert GeminiClient(api_url=API_URL).stream_url == API_URL.replace(":generateContent", ":streamGenerateContent")
+    assert GeminiClient(api_url=API_URL, stream_url="http://other/stream").stream_url == "http://other/stream"
@@ -0,0 +1,78 @@
+# test_index_snapshot.py
+import os
+
+import faiss
+import numpy as np
+
+from utils.bm25_index import IncrementalBM25
+from utils.chunk_store import ChunkStore
+from utils.index_snapshot import CURRENT_NAME, SnapshotPublisher, current_snapshot_name, load_snapshot
+
+DIM = 8
+
+
+def entry(doc_id, position, text):
+    return {"doc_id": doc_id, "text": text, "embedding_idx": position, "bot_ids": ["bot"]}
+
+
+def saved_state(tmp_path, segment_max_bytes=64 * 1024 * 1024):
+    """A writer's saved state: a FAISS index file, a flushed chunk store and BM25."""
+    index = faiss.IndexFlatL2(DIM)
+    index.add(np.eye(DIM, dtype=np.float32)[:3])
+    index_path = tmp_path / "faiss.index"
+    faiss.write_index(index, str(index_path))
+
+    chunk_store = ChunkStore(tmp_path / "chunk_store", segment_max_bytes=segment_max_bytes)
+    chunk_store.put_document("a", [entry("a", 0, "tax rate"), entry("a", 1, "tax refund")])
+    chunk_store.flush()
+    chunk_store.put_document("b", [entry("b", 2, "court appeal")])
+    chunk_store.flush()
+
+    bm25 = IncrementalBM25()
+    bm25.add_documents([["tax", "rate"], ["tax", "refund"], ["court", "appeal"]])
+    return index_path, chunk_store, bm25
+
+
+def test_published_generation_loads_the_saved_state(tmp_path):
+    index_path, chunk_store, bm25 = saved_state(tmp_path)
+    publisher = SnapshotPublisher(tmp_path / "snapshots")
+
+    name = publisher.publish(index_path, chunk_store, bm25, generation=1)
+    snapshot = load_snapshot(tmp_path / "snapshots", name)
+
+    assert current_snapshot_name(tmp_path / "snapshots") == name
+    assert publisher.published_generation == 1
+    assert snapshot.index.ntotal == 3
+    assert [e["text"] for e in snapshot.chunk_store.entries] == ["tax rate", "tax refund", "court appeal"]
+    assert snapshot.bm25.corpus_size == 3
+
+
+def test_saved_files_are_linked_and_later_writes_do_not_leak_in(tmp_path):
+    index_path, chunk_store, bm25 = saved_state(tmp_path, segment_max_bytes=1)  # one segment per flush
+    root = tmp_path / "snapshots"
+    name = SnapshotPublisher(root).publish(index_path, chunk_store, bm25, generation=1)
+
+    sealed = chunk_store._segments[0]
+    assert os.stat(root / name / "chunks" / sealed).st_ino == os.stat(chunk_store.directory / sealed).st_ino
+    assert os.stat(root / name / "index.faiss").st_ino == os.stat(index_path).st_ino
+
+    chunk_store.put_document("c", [entry("c", 3, "new law")])
+    chunk_store.flush()
+
+    assert len(load_snapshot(root, name).chunk_store.entries) == 3
+
+
+def test_unannounced_generations_are_discarded_on_start(tmp_path):
+    index_path, chunk_store, bm25 = saved_state(tmp_path)
+    root = tmp_path / "snapshots"
+    published = SnapshotPublisher(root).publish(index_path, chunk_store, bm25, generation=1)
+
+    # A crash after renaming the next generation into place, before announcing it
+    (root / "gen-00000002").mkdir()
+    (root / "gen-00000003.tmp").mkdir()
+    (root / f"{CURRENT_NAME}.tmp").write_text("gen-00000002", encoding="utf-8")
+
+    publisher = SnapshotPublisher(root)
+
+    assert sorted(path.name for path in root.iterdir()) == [CURRENT_NAME, published]
+    assert publisher.publish(index_path, chunk_store, bm25, generation=2) == "gen-00000002"
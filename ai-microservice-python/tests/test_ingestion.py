@@ -0,0 +1,53 @@
+# test_ingestion.py
+import asyncio
+
+from utils.ingestion import IngestionCoordinator
+
+
+def prepared(value, seconds=0.0):
+    async def prepare():
+        await asyncio.sleep(seconds)
+        return value
+    return prepare
+
+
+def test_documents_finishing_together_are_committed_in_one_batch():
+    batches = []
+
+    async def commit(batch):
+        batches.append(batch)
+        return [f"committed {value}" for value in batch]
+
+    coordinator = IngestionCoordinator(commit, batch_window=0.5)
+
+    async def run():
+        # The first committer waits for the documents still being prepared
+        return await asyncio.gather(*(
+            coordinator.submit(prepared(value, 0.01 * i)) for i, value in enumerate("abc")
+        ))
+
+    assert asyncio.run(run()) == ["committed a", "committed b", "committed c"]
+    assert batches == [["a", "b", "c"]]
+
+
+def test_cancelled_committer_does_not_strand_the_rest_of_its_batch():
+    release = asyncio.Event()
+
+    async def commit(batch):
+        await release.wait()  # e.g. the executor-side commit still running
+        return batch
+
+    coordinator = IngestionCoordinator(commit, batch_window=0.5)
+
+    async def run():
+        first = asyncio.ensure_future(coordinator.submit(prepared("a")))
+        second = asyncio.ensure_future(coordinator.submit(prepared("b", 0.01)))
+        await asyncio.sleep(0.05)  # both are in the batch the first submitter is committing
+        first.cancel()
+        done, _ = await asyncio.wait({first, second}, timeout=1)
+        return done
+
+    done = asyncio.run(run())
+
+    assert len(done) == 2
+    assert all(task.cancelled() for task in done)
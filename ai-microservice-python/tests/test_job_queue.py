@@ -0,0 +1,187 @@
+# test_job_queue.py
+import asyncio
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from utils.job_queue import (
+    CANCELLED, COMPLETED, FAILED, QUEUED, RUNNING, STAGE_COMMITTING, STAGE_EXTRACTING, JobCancelError, JobQueue
+)
+
+
+async def until(condition, timeout=2.0):
+    """Poll `condition` on the event loop until it holds."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def stored(path, job_id):
+    """The job's row as written to the database, bypassing the queue."""
+    with closing(sqlite3.connect(str(path))) as db:
+        db.row_factory = sqlite3.Row
+        return dict(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def test_jobs_running_at_shutdown_are_requeued_on_start(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+
+    async def first_run():
+        queue = JobQueue(path, handler=None)
+        job_id, = queue.enqueue([{"doc_id": "doc"}])
+        queue._db.close()
+        return job_id
+
+    job_id = asyncio.run(first_run())
+    # The process died while the job was running
+    with closing(sqlite3.connect(str(path))) as db, db:
+        db.execute(
+            "UPDATE jobs SET state = ?, stage = ?, pages_done = 7, attempts = 1 WHERE id = ?",
+            (RUNNING, STAGE_EXTRACTING, job_id)
+        )
+
+    async def handler(job, progress):
+        return {"doc_id": job["doc_id"]}
+
+    async def restart():
+        queue = JobQueue(path, handler)
+        queue.start()
+        try:
+            return await asyncio.wait_for(queue.wait(job_id), 2)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(restart())
+
+    assert job["state"] == COMPLETED
+    assert job["attempts"] == 2
+    assert job["pages_done"] == 0  # progress restarts with the new attempt
+    assert job["result"] == {"doc_id": "doc"}
+
+
+def test_stop_requeues_running_jobs(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+
+    async def handler(job, progress):
+        await asyncio.Event().wait()
+
+    async def run():
+        queue = JobQueue(path, handler)
+        queue.start()
+        job_id, = queue.enqueue([{"doc_id": "doc"}])
+        await until(lambda: job_id in queue._running)
+        await queue.stop()
+        return job_id
+
+    job_id = asyncio.run(run())
+
+    assert stored(path, job_id)["state"] == QUEUED
+
+
+def test_cancel_is_refused_once_the_job_is_committing(tmp_path):
+    committing = asyncio.Event()
+    release = asyncio.Event()
+
+    async def handler(job, progress):
+        progress(stage=STAGE_COMMITTING)
+        committing.set()
+        await release.wait()
+        return {"doc_id": job["doc_id"]}
+
+    async def run():
+        queue = JobQueue(tmp_path / "jobs.sqlite", handler)
+        queue.start()
+        try:
+            job_id, = queue.enqueue([{"doc_id": "doc"}])
+            await asyncio.wait_for(committing.wait(), 2)
+            with pytest.raises(JobCancelError):
+                await queue.cancel(job_id)
+            release.set()
+            return await asyncio.wait_for(queue.wait(job_id), 2)
+        finally:
+            await queue.stop()
+
+    assert asyncio.run(run())["state"] == COMPLETED
+
+
+def test_queued_and_extracting_jobs_can_be_cancelled(tmp_path):
+    async def handler(job, progress):
+        progress(pages_done=1, pages_total=10)
+        await asyncio.Event().wait()
+
+    async def run():
+        queue = JobQueue(tmp_path / "jobs.sqlite", handler, workers=1)
+        queue.start()
+        try:
+            running, queued = queue.enqueue([{"doc_id": "a"}, {"doc_id": "b"}])
+            await until(lambda: running in queue._running)
+            cancelled = [await queue.cancel(queued), await queue.cancel(running)]
+            with pytest.raises(JobCancelError):
+                await queue.cancel(running)
+            with pytest.raises(KeyError):
+                await queue.cancel("missing")
+            return cancelled
+        finally:
+            await queue.stop()
+
+    assert [job["state"] for job in asyncio.run(run())] == [CANCELLED, CANCELLED]
+
+
+def test_wait_returns_the_final_record(tmp_path):
+    async def handler(job, progress):
+        await asyncio.sleep(0.01)
+        if job["payload"]["fail"]:
+            raise ValueError("no text extracted")
+        return {"chunks": 3}
+
+    async def run():
+        queue = JobQueue(tmp_path / "jobs.sqlite", handler)
+        queue.start()
+        try:
+            ok, failed = queue.enqueue([{"doc_id": "a", "fail": False}, {"doc_id": "b", "fail": True}])
+            jobs = await asyncio.wait_for(asyncio.gather(queue.wait(ok), queue.wait(failed), queue.wait(ok)), 2)
+            # A job that already finished is returned at once
+            return [*jobs, await asyncio.wait_for(queue.wait(ok), 0.1)]
+        finally:
+            await queue.stop()
+
+    completed, failed, again, finished = asyncio.run(run())
+
+    assert completed["state"] == COMPLETED and completed["result"] == {"chunks": 3}
+    assert failed["state"] == FAILED and failed["error"] == "no text extracted"
+    assert again == completed
+    assert finished["state"] == COMPLETED
+
+
+def test_progress_writes_are_throttled_but_reads_are_current(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    reported = asyncio.Event()
+    release = asyncio.Event()
+
+    async def handler(job, progress):
+        for page in range(1, 101):
+            progress(pages_done=page, pages_total=100)
+        reported.set()
+        await release.wait()
+        return {}
+
+    async def run():
+        queue = JobQueue(path, handler, progress_interval=60)
+        queue.start()
+        try:
+            job_id, = queue.enqueue([{"doc_id": "doc"}])
+            await asyncio.wait_for(reported.wait(), 2)
+            during = queue.get(job_id), stored(path, job_id)
+            release.set()
+            await asyncio.wait_for(queue.wait(job_id), 2)
+            return during, stored(path, job_id)
+        finally:
+            await queue.stop()
+
+    (job, row), final_row = asyncio.run(run())
+
+    assert job["pages_done"] == 100
+    assert row["pages_done"] == 1  # only the first report was written
+    assert final_row["pages_done"] == 100 and final_row["state"] == COMPLETED
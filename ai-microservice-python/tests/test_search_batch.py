@@ -0,0 +1,84 @@
+# test_search_batch.py
+import pytest
+from fastapi.testclient import TestClient
+
+import utils.rag_processor as rag_processor_module
+from utils.result_cache import QueryResultCache
+
+DOCUMENTS = {
+    "tax": "Income tax is due by the end of March. Late filers pay a penalty on the amount owed.",
+    "court": "An appeal must be lodged within thirty days. The appellate court reviews the record only.",
+    "land": "Rural land is held under long leases. Disputes over a lease go to the land tribunal first.",
+    "labour": "Employers withhold tax from monthly wages. A dismissed worker may appeal to the labour court.",
+}
+QUERIES = ["late tax penalty", "appeal to the court", "land lease disputes", "tax on wages", "late tax penalty"]
+BOTS = ["", "bot", "other", "other", "bot"]
+
+
+@pytest.fixture
+def client(main_module, service_state, embed_documents, monkeypatch):
+    embed_documents(DOCUMENTS)
+    service_state.rag_processor.add_bot(["land", "labour"], "other")
+    # Every request is searched rather than served from the result cache
+    monkeypatch.setattr(main_module, "search_result_cache", QueryResultCache(max_entries=0))
+    return TestClient(main_module.app)
+
+
+def search(client, query, bot_id):
+    response = client.post("/search", data={"query": query, "top_k": 3, "bot_id": bot_id})
+    assert response.status_code == 200
+    return response.json()
+
+
+def search_batch(client, queries, bot_ids):
+    response = client.post("/search/batch", data={"queries": queries, "bot_ids": bot_ids, "top_k": 3})
+    assert response.status_code == 200
+    return response.json()["results"]
+
+
+def test_batch_results_match_individual_searches(client):
+    batch = search_batch(client, QUERIES, BOTS)
+
+    assert [entry["query"] for entry in batch] == QUERIES
+    for entry, query, bot_id in zip(batch, QUERIES, BOTS):
+        expected = search(client, query, bot_id)
+        assert entry["query_processed"] == expected["query_processed"]
+        assert [(r["doc_id"], r["text"]) for r in entry["results"]] == [(r["doc_id"], r["text"]) for r in expected["results"]]
+        assert [r["similarity"] for r in entry["results"]] == pytest.approx(
+            [r["similarity"] for r in expected["results"]], abs=1e-5
+        )
+    # The bot filter applies per query
+    assert {r["doc_id"] for r in batch[2]["results"]} <= {"land", "labour"}
+    assert batch[0]["results"] and batch[1]["results"]
+
+
+def test_one_bot_filter_applies_to_every_query(client):
+    batch = search_batch(client, QUERIES, ["other"])
+
+    assert all({r["doc_id"] for r in entry["results"]} <= {"land", "labour"} for entry in batch)
+    assert batch == search_batch(client, QUERIES, ["other"] * len(QUERIES))
+
+
+def test_score_matrices_respect_the_batch_cell_bound(client, service_state, monkeypatch):
+    expected = search_batch(client, QUERIES, [])
+    rag = service_state.rag_processor
+    candidates = rag.num_live_chunks
+    monkeypatch.setattr(rag_processor_module, "SEARCH_BATCH_CELLS", 2 * candidates)
+
+    shapes = []
+    get_scores_many = rag.bm25.get_scores_many
+
+    def recording_get_scores_many(queries, candidates=None):
+        scores = get_scores_many(queries, candidates)
+        shapes.append(scores.shape)
+        return scores
+    monkeypatch.setattr(rag.bm25, "get_scores_many", recording_get_scores_many)
+
+    assert search_batch(client, QUERIES, []) == expected
+    assert shapes == [(2, candidates), (2, candidates), (1, candidates)]
+
+
+def test_mismatched_filters_are_rejected(client):
+    response = client.post("/search/batch", data={"queries": QUERIES, "bot_ids": ["bot", "other"]})
+
+    assert response.status_code == 400
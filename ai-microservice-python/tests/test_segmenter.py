@@ -0,0 +1,76 @@
+# test_segmenter.py
+import pytest
+
+from utils.segmenter import count_tokens, iter_sentences
+
+
+def sentences(text, language="en"):
+    return [sentence for sentence, _ in iter_sentences(text, language)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("See Art. 5 of the Proc. No. 1234/2021. It applies now.", ["See Art. 5 of the Proc. No. 1234/2021.", "It applies now."]),
+    ("Dr. Abebe arrived on Jan. 5. He left, i.e. quickly.", ["Dr. Abebe arrived on Jan. 5.", "He left, i.e. quickly."]),
+    ("Exports rose, e.g. coffee. Imports fell.", ["Exports rose, e.g. coffee.", "Imports fell."]),
+    ("Fees, stamps etc. are due. Pay now.", ["Fees, stamps etc. are due.", "Pay now."]),
+    ("Filed under Sec. 4 vs. the Co. by Mr. Alemu. Dismissed.", ["Filed under Sec. 4 vs. the Co. by Mr. Alemu.", "Dismissed."]),
+    ("The rate is 3.5 percent. It rose.", ["The rate is 3.5 percent.", "It rose."]),
+])
+def test_english_abbreviations_do_not_end_sentences(text, expected):
+    assert sentences(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("ሕጉ በ2013 ዓ.ም. ጸደቀ። ተግባራዊ ሆኗል።", ["ሕጉ በ2013 ዓ.ም. ጸደቀ።", "ተግባራዊ ሆኗል።"]),
+    ("በ19ኛው ክ.ዘ. ተጀመረ። ቀጠለ፧ አዎ።", ["በ19ኛው ክ.ዘ. ተጀመረ።", "ቀጠለ፧", "አዎ።"]),
+    ("ቁ. 5 ገጽ. 12 ይመልከቱ። ተጨማሪ።", ["ቁ. 5 ገጽ. 12 ይመልከቱ።", "ተጨማሪ።"]),
+    # English abbreviations also appear in Amharic documents
+    ("See Art. 5 now. Done.", ["See Art. 5 now.", "Done."]),
+])
+def test_amharic_abbreviations_do_not_end_sentences(text, expected):
+    assert sentences(text, "amh") == expected
+
+
+def test_amharic_abbreviations_are_only_special_cased_for_amharic():
+    assert sentences("ሕጉ በ2013 ዓ.ም. ጸደቀ።", "en") == ["ሕጉ በ2013 ዓ.ም.", "ጸደቀ።"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1. The seller delivers. 2. The buyer pays.", ["1. The seller delivers.", "2. The buyer pays."]),
+    ("3.2. Notice is given in writing.", ["3.2. Notice is given in writing."]),
+    ("The parties agree:\n(a). to deliver goods.\n(b). to pay the price.",
+     ["The parties agree:", "(a). to deliver goods.", "(b). to pay the price."]),
+    ("Duties are listed below.\niv. Keep records. v. File returns.",
+     ["Duties are listed below.", "iv. Keep records.", "v. File returns."]),
+    # A numbered line closes the sentence before it even without a full stop
+    ("The buyer shall\n1. pay the price.", ["The buyer shall", "1. pay the price."]),
+])
+def test_enumerators_open_sentences(text, expected):
+    assert sentences(text) == expected
+
+
+@pytest.mark.parametrize("text, language, expected", [
+    ("Article 3. Definitions apply here. Article 4. Scope.", "en",
+     ["Article 3. Definitions apply here.", "Article 4. Scope."]),
+    ("ARTICLE 4.2. Scope of the law.", "en", ["ARTICLE 4.2. Scope of the law."]),
+    ("This ends here. Article 5 The next article.", "en", ["This ends here.", "Article 5 The next article."]),
+    ("አንቀጽ 5. ትርጓሜ። አንቀጽ 6. ወሰን።", "amh", ["አንቀጽ 5. ትርጓሜ።", "አንቀጽ 6. ወሰን።"]),
+])
+def test_article_headers_head_the_sentence_that_follows(text, language, expected):
+    assert sentences(text, language) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("First paragraph without a stop\n\nSecond paragraph", ["First paragraph without a stop", "Second paragraph"]),
+    ('He said "stop." Then left. Really? Yes!', ['He said "stop."', "Then left.", "Really?", "Yes!"]),
+    ("No final punctuation", ["No final punctuation"]),
+    ("   ", []),
+])
+def test_other_boundaries(text, expected):
+    assert sentences(text) == expected
+
+
+def test_sentences_carry_their_token_counts():
+    for sentence, tokens in iter_sentences("Income tax is due. ሕጉ በ2013 ዓ.ም. ጸደቀ።", "amh"):
+        assert tokens == count_tokens(sentence)
+    assert count_tokens("Income tax is due.") == 5
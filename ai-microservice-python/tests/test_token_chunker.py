@@ -0,0 +1,106 @@
+# test_token_chunker.py
+import copy
+
+import pytest
+
+from utils.token_chunker import TokenBudgetChunker
+
+# Five tokens per sentence: four words and the full stop
+SENTENCES = [
+    "One two three four.",
+    "Five six seven eight.",
+    "Nine ten eleven twelve.",
+    "Thirteen fourteen fifteen sixteen.",
+]
+TEXT = " ".join(SENTENCES)
+
+
+def test_sentences_are_packed_to_the_token_budget(stub_tokenizer):
+    chunker = TokenBudgetChunker(stub_tokenizer, limit=30, max_tokens=10)
+
+    assert chunker.chunks(TEXT) == [" ".join(SENTENCES[:2]), " ".join(SENTENCES[2:])]
+
+
+def test_full_chunks_carry_trailing_sentences_as_overlap(stub_tokenizer):
+    chunker = TokenBudgetChunker(stub_tokenizer, limit=30, max_tokens=10, overlap_tokens=5)
+
+    assert chunker.chunks(TEXT) == [
+        " ".join(SENTENCES[0:2]),
+        " ".join(SENTENCES[1:3]),
+        " ".join(SENTENCES[2:4]),
+    ]
+
+
+def test_sentences_longer_than_the_overlap_are_not_carried(stub_tokenizer):
+    chunker = TokenBudgetChunker(stub_tokenizer, limit=30, max_tokens=10, overlap_tokens=4)
+
+    assert chunker.chunks(TEXT) == [" ".join(SENTENCES[:2]), " ".join(SENTENCES[2:])]
+
+
+def test_article_headers_start_a_chunk_without_overlap(stub_tokenizer):
+    chunker = TokenBudgetChunker(stub_tokenizer, limit=30, max_tokens=20, overlap_tokens=5)
+
+    chunks = chunker.chunks("One two three four. Article 2. Five six seven. Eight nine ten eleven.")
+
+    assert chunks == ["One two three four.", "Article 2. Five six seven. Eight nine ten eleven."]
+
+
+def test_sentences_over_the_budget_are_split_into_windows(stub_tokenizer):
+    chunker = TokenBudgetChunker(stub_tokenizer, limit=30, max_tokens=10)
+    words = [f"w{i}" for i in range(25)]
+
+    chunks = chunker.chunks("Short one. " + " ".join(words) + ". Tail end.")
+
+    assert chunks == [
+        "Short one.",
+        " ".join(words[0:10]),
+        " ".join(words[10:20]),
+        " ".join(words[20:25]) + ". Tail end.",
+    ]
+
+
+def test_no_chunk_exceeds_the_budget(stub_tokenizer):
+    chunker = TokenBudgetChunker(stub_tokenizer, limit=30, max_tokens=12, overlap_tokens=6)
+    text = " ".join(
+        f"Clause {i} binds the {'seller and the buyer ' * (i % 5)}parties." for i in range(40)
+    )
+
+    chunks = chunker.chunks(text)
+
+    assert max(chunker.count(chunks)) <= 12
+    # Overlap only repeats text; every word still appears, in order
+    chunk_words = iter(" ".join(chunks).split())
+    assert all(word in chunk_words for word in text.split())
+
+
+def test_count_excludes_special_tokens(stub_tokenizer):
+    chunker = TokenBudgetChunker(stub_tokenizer, limit=30)
+
+    assert chunker.count(SENTENCES[:2] + ["ሕጉ ጸደቀ።"]) == [5, 5, 3]
+    assert chunker.count([]) == []
+
+
+def test_split_needs_a_fast_tokenizer(stub_tokenizer):
+    slow = copy.copy(stub_tokenizer)
+    slow.is_fast = False
+    chunker = TokenBudgetChunker(slow, limit=30, max_tokens=2)
+
+    assert chunker.split(TEXT) == [TEXT]
+
+
+@pytest.mark.parametrize("max_tokens, overlap_tokens, expected", [
+    (None, 16, (30, 15)),  # overlap is at most half a chunk
+    (64, 4, (30, 4)),      # the budget never exceeds what the model sees
+    (12, 4, (12, 4)),
+])
+def test_budget_follows_the_model(rag_processor, max_tokens, overlap_tokens, expected):
+    model = rag_processor.embedding_model  # max_seq_length 32, two special tokens
+
+    chunker = TokenBudgetChunker.for_model(model, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+    assert chunker.limit == 30
+    assert (chunker.max_tokens, chunker.overlap_tokens) == expected
+
+
+def test_models_without_a_tokenizer_get_no_chunker():
+    assert TokenBudgetChunker.for_model(object()) is None
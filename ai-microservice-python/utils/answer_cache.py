@@ -0,0 +1,163 @@
+# answer_cache.py
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_set_key(chunks: Iterable[Dict[str, Any]]) -> str:
+    """Identity of a retrieved chunk set: changes if any chunk's document or text changes."""
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in sorted(chunks, key=lambda c: (c["doc_id"], c["text"])):
+        digest.update(chunk["doc_id"].encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(chunk["text"].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def prompt_key(*parts: Optional[str]) -> str:
+    """Hash of the prompt inputs that must match exactly (language, system prompt, context)."""
+    return hashlib.blake2b("\0".join(p or "" for p in parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    metadata: Dict[str, Any]
+    chunk_key: str
+    prompt_key: str
+    doc_ids: List[str]
+    expires_at: float
+    hits: int = 0
+
+
+@dataclass
+class _BotAnswers:
+    index: faiss.IndexIDMap2
+    entries: "OrderedDict[int, CachedAnswer]" = field(default_factory=OrderedDict)
+    next_id: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    Per-bot cache of LLM answers, looked up by query embedding similarity.
+
+    A cached answer is reused when a new query is at least `threshold` cosine
+    similar to the cached one and was answered from the same retrieved chunk
+    set with the same prompt inputs. Each bot has a small flat inner-product
+    FAISS index over normalized query embeddings (dimension taken from the first
+    stored embedding unless given); the oldest answers are dropped once
+    `max_entries` is reached.
+    """
+
+    def __init__(self, dim: Optional[int] = None, threshold: float = 0.95, max_entries: int = 512, ttl_seconds: float = 3600.0):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._bots: Dict[str, _BotAnswers] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self,
+        bot_id: str,
+        query_embedding: np.ndarray,
+        chunk_key: str,
+        prompt_key: str,
+        k: int = 4
+    ) -> Optional[CachedAnswer]:
+        """Best cached answer for a normalized (1, dim) query embedding, if any qualifies."""
+        bot = self._bots.get(bot_id)
+        if bot is None or bot.index.ntotal == 0:
+            self.misses += 1
+            return None
+
+        scores, ids = bot.index.search(query_embedding, min(k, bot.index.ntotal))
+        now = time.monotonic()
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id < 0 or score < self.threshold:
+                break
+            entry = bot.entries.get(int(entry_id))
+            if entry is None:
+                continue
+            if entry.expires_at < now:
+                self._remove(bot, [int(entry_id)])
+                continue
+            if entry.chunk_key == chunk_key and entry.prompt_key == prompt_key:
+                entry.hits += 1
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def store(
+        self,
+        bot_id: str,
+        query_embedding: np.ndarray,
+        chunk_key: str,
+        prompt_key: str,
+        answer: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        doc_ids: Optional[List[str]] = None
+    ):
+        bot = self._bots.get(bot_id)
+        if bot is None:
+            dim = self.dim or query_embedding.shape[1]
+            bot = self._bots[bot_id] = _BotAnswers(index=faiss.IndexIDMap2(faiss.IndexFlatIP(dim)))
+
+        if len(bot.entries) >= self.max_entries:
+            oldest = list(bot.entries)[:max(1, len(bot.entries) - self.max_entries + 1)]
+            self._remove(bot, oldest)
+
+        entry_id = bot.next_id
+        bot.next_id += 1
+        bot.index.add_with_ids(query_embedding, np.array([entry_id], dtype=np.int64))
+        bot.entries[entry_id] = CachedAnswer(
+            answer=answer,
+            metadata=metadata or {},
+            chunk_key=chunk_key,
+            prompt_key=prompt_key,
+            doc_ids=sorted(set(doc_ids or [])),
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+
+    def invalidate_documents(self, doc_ids: Iterable[str]) -> int:
+        """Drop answers built from any of `doc_ids` (e.g. after re-embedding or deletion)."""
+        doc_ids = set(doc_ids)
+        removed = 0
+        for bot in self._bots.values():
+            stale = [entry_id for entry_id, entry in bot.entries.items() if doc_ids.intersection(entry.doc_ids)]
+            self._remove(bot, stale)
+            removed += len(stale)
+        if removed:
+            logger.info(f"Invalidated {removed} cached answers")
+        return removed
+
+    def clear(self):
+        self._bots = {}
+
+    @staticmethod
+    def _remove(bot: _BotAnswers, entry_ids: List[int]):
+        if not entry_ids:
+            return
+        bot.index.remove_ids(np.asarray(entry_ids, dtype=np.int64))
+        for entry_id in entry_ids:
+            bot.entries.pop(entry_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bots": len(self._bots),
+            "entries": sum(len(bot.entries) for bot in self._bots.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
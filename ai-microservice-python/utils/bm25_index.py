@@ -0,0 +1,307 @@
+# bm25_index.py
+import json
+import math
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+class IncrementalBM25:
+    """
+    Okapi BM25 over an inverted index that can grow and shrink in place.
+
+    Documents are addressed by position (the same position used for the FAISS
+    index and chunks metadata). Adding or removing a document only touches the
+    postings of its own terms, and scoring only walks the postings of the query
+    terms. Scores match rank_bm25.BM25Okapi for the same corpus.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {position: term frequency}
+        self.doc_freqs: Dict[str, int] = {}
+        self._doc_terms: List[Optional[Counter]] = []  # per-position term counts, None when removed
+        self._doc_len = np.zeros(0, dtype=np.float32)
+
+        self.num_docs = 0  # live documents
+        self.total_len = 0
+        self._average_idf: Optional[float] = None
+
+    @property
+    def corpus_size(self) -> int:
+        """Number of positions, including removed ones."""
+        return len(self._doc_terms)
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_len / self.num_docs if self.num_docs else 0.0
+
+    def add_documents(self, corpus: Iterable[Optional[Sequence[str]]]) -> List[int]:
+        """Append tokenized documents (None for a removed position) and return their positions."""
+        return [
+            self.add_document(tokens) if tokens is not None else self.add_tombstone()
+            for tokens in corpus
+        ]
+
+    def add_tombstone(self) -> int:
+        """Reserve a position that holds no document."""
+        position = len(self._doc_terms)
+        self._doc_terms.append(None)
+        self._ensure_capacity(position + 1)
+        return position
+
+    def add_document(self, tokens: Sequence[str]) -> int:
+        """Append a tokenized document and return its position."""
+        position = len(self._doc_terms)
+        counts = Counter(tokens)
+
+        for term, freq in counts.items():
+            self.postings.setdefault(term, {})[position] = freq
+            self.doc_freqs[term] = self.doc_freqs.get(term, 0) + 1
+
+        self._doc_terms.append(counts)
+        self._ensure_capacity(position + 1)
+        self._doc_len[position] = len(tokens)
+
+        self.num_docs += 1
+        self.total_len += len(tokens)
+        self._average_idf = None
+        return position
+
+    def remove_document(self, position: int) -> bool:
+        """Drop a document's postings, leaving its position as a tombstone."""
+        if position < 0 or position >= len(self._doc_terms):
+            return False
+        counts = self._doc_terms[position]
+        if counts is None:
+            return False
+
+        for term in counts:
+            term_postings = self.postings.get(term)
+            if term_postings is not None:
+                term_postings.pop(position, None)
+                if not term_postings:
+                    del self.postings[term]
+            remaining = self.doc_freqs.get(term, 0) - 1
+            if remaining > 0:
+                self.doc_freqs[term] = remaining
+            else:
+                self.doc_freqs.pop(term, None)
+
+        self.total_len -= int(self._doc_len[position])
+        self._doc_len[position] = 0
+        self._doc_terms[position] = None
+        self.num_docs -= 1
+        self._average_idf = None
+        return True
+
+    def get_scores(self, query: Sequence[str], candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        BM25 score of every position for the tokenized query, or only of the
+        sorted `candidates` positions (aligned with that array) when given.
+        """
+        size = self.corpus_size if candidates is None else candidates.shape[0]
+        scores = np.zeros(size, dtype=np.float32)
+        if not self.num_docs or size == 0:
+            return scores
+
+        for term in set(query):
+            matched = self._matching_postings(term, candidates)
+            if matched is None:
+                continue
+            slots, positions, freqs = matched
+            # Repeated query terms count once per occurrence, as in BM25Okapi
+            weight = self._idf(term) * query.count(term)
+            scores[slots] += weight * self._term_scores(positions, freqs)
+        return scores
+
+    def get_scores_many(self, queries: Sequence[Sequence[str]], candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        BM25 scores of several tokenized queries as a (queries x positions) matrix,
+        rows equal to `get_scores` of each query. Each distinct term's postings are
+        intersected with the candidates and scored once, then added to every query
+        row that contains the term.
+        """
+        size = self.corpus_size if candidates is None else candidates.shape[0]
+        scores = np.zeros((len(queries), size), dtype=np.float32)
+        if not self.num_docs or size == 0:
+            return scores
+
+        # term -> (query rows, occurrences in each of those queries)
+        term_rows: Dict[str, List[int]] = {}
+        for row, query in enumerate(queries):
+            for term in query:
+                term_rows.setdefault(term, []).append(row)
+        for term, rows in term_rows.items():
+            matched = self._matching_postings(term, candidates)
+            if matched is None:
+                continue
+            slots, positions, freqs = matched
+            query_rows, occurrences = np.unique(np.asarray(rows, dtype=np.int64), return_counts=True)
+            term_scores = self._idf(term) * self._term_scores(positions, freqs)
+            scores[np.ix_(query_rows, slots)] += np.outer(occurrences.astype(np.float32), term_scores)
+        return scores
+
+    def _matching_postings(self, term: str, candidates: Optional[np.ndarray]):
+        """(slots, positions, freqs) of the term's postings among the candidates, or None if there are none."""
+        term_postings = self.postings.get(term)
+        if not term_postings:
+            return None
+        if candidates is None:
+            slots, positions, freqs = self._postings_arrays(term_postings)
+        elif len(term_postings) <= candidates.shape[0]:
+            slots, positions, freqs = self._postings_in_candidates(term_postings, candidates)
+        else:
+            slots, positions, freqs = self._candidates_in_postings(term_postings, candidates)
+        return (slots, positions, freqs) if positions.size else None
+
+    def _term_scores(self, positions: np.ndarray, freqs: np.ndarray) -> np.ndarray:
+        avgdl = self.avgdl or 1.0
+        doc_len = self._doc_len[positions]
+        denom = freqs + self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+        return freqs * (self.k1 + 1) / denom
+
+    @staticmethod
+    def _postings_arrays(term_postings: Dict[int, int]):
+        positions = np.fromiter(term_postings.keys(), dtype=np.int64, count=len(term_postings))
+        freqs = np.fromiter(term_postings.values(), dtype=np.float32, count=len(term_postings))
+        return positions, positions, freqs
+
+    def _postings_in_candidates(self, term_postings: Dict[int, int], candidates: np.ndarray):
+        """Walk a short postings list and keep positions that are candidates."""
+        _, positions, freqs = self._postings_arrays(term_postings)
+        slots = np.searchsorted(candidates, positions)
+        in_range = slots < candidates.shape[0]
+        in_range[in_range] = candidates[slots[in_range]] == positions[in_range]
+        return slots[in_range], positions[in_range], freqs[in_range]
+
+    def _candidates_in_postings(self, term_postings: Dict[int, int], candidates: np.ndarray):
+        """Probe a long postings list with a short candidate set."""
+        freqs = np.fromiter(
+            (term_postings.get(int(p), 0) for p in candidates),
+            dtype=np.float32,
+            count=candidates.shape[0]
+        )
+        slots = np.flatnonzero(freqs)
+        return slots, candidates[slots], freqs[slots]
+
+    def _idf(self, term: str) -> float:
+        df = self.doc_freqs.get(term, 0)
+        idf = math.log(self.num_docs - df + 0.5) - math.log(df + 0.5)
+        if idf < 0:
+            return self.epsilon * self._get_average_idf()
+        return idf
+
+    def _get_average_idf(self) -> float:
+        """Mean raw idf over the vocabulary, cached until the corpus changes."""
+        if self._average_idf is None:
+            if not self.doc_freqs:
+                self._average_idf = 0.0
+            else:
+                df = np.fromiter(self.doc_freqs.values(), dtype=np.float64, count=len(self.doc_freqs))
+                self._average_idf = float(np.mean(np.log(self.num_docs - df + 0.5) - np.log(df + 0.5)))
+        return self._average_idf
+
+    def write_snapshot(self, directory: Path):
+        """
+        Write the postings as CSR arrays (one .npy per array, vocabulary in JSON)
+        that `FrozenBM25.load` memory-maps read-only.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(self.postings[term])
+        positions = np.empty(int(offsets[-1]), dtype=np.int64)
+        freqs = np.empty(int(offsets[-1]), dtype=np.float32)
+        for i, term in enumerate(terms):
+            term_positions, term_freqs = zip(*sorted(self.postings[term].items()))
+            positions[offsets[i]:offsets[i + 1]] = term_positions
+            freqs[offsets[i]:offsets[i + 1]] = term_freqs
+
+        np.save(directory / "offsets.npy", offsets)
+        np.save(directory / "positions.npy", positions)
+        np.save(directory / "freqs.npy", freqs)
+        np.save(directory / "doc_len.npy", self._doc_len[:self.corpus_size])
+        meta = {
+            "k1": self.k1, "b": self.b, "epsilon": self.epsilon,
+            "num_docs": self.num_docs, "total_len": self.total_len, "terms": terms,
+        }
+        (directory / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+    def _ensure_capacity(self, size: int):
+        if size <= self._doc_len.shape[0]:
+            return
+        grown = np.zeros(max(size, 2 * self._doc_len.shape[0], 64), dtype=np.float32)
+        grown[:self._doc_len.shape[0]] = self._doc_len
+        self._doc_len = grown
+
+
+class FrozenBM25(IncrementalBM25):
+    """
+    Read-only BM25 over postings written by `IncrementalBM25.write_snapshot`.
+
+    The postings arrays are memory-mapped, so worker processes serving the same
+    snapshot share their pages; only the vocabulary lookup lives per process.
+    Scores are identical to the index the snapshot was written from.
+    """
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        super().__init__(k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"])
+        self.num_docs = meta["num_docs"]
+        self.total_len = meta["total_len"]
+        self._term_ids = {term: i for i, term in enumerate(meta["terms"])}
+        self._offsets = np.load(directory / "offsets.npy", mmap_mode="r")
+        self._positions = np.load(directory / "positions.npy", mmap_mode="r")
+        self._freqs = np.load(directory / "freqs.npy", mmap_mode="r")
+        self._doc_len = np.load(directory / "doc_len.npy", mmap_mode="r")
+        self._doc_freqs = np.diff(self._offsets)
+
+    @property
+    def corpus_size(self) -> int:
+        return self._doc_len.shape[0]
+
+    def add_documents(self, corpus):
+        raise TypeError("FrozenBM25 is read-only")
+
+    add_tombstone = add_document = remove_document = add_documents
+
+    def _matching_postings(self, term: str, candidates: Optional[np.ndarray]):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            return None
+        start, end = self._offsets[term_id], self._offsets[term_id + 1]
+        positions, freqs = self._positions[start:end], self._freqs[start:end]
+        if candidates is None:
+            slots = positions
+        else:
+            # Both arrays are sorted: keep the postings whose position is a candidate
+            slots = np.searchsorted(candidates, positions)
+            in_range = slots < candidates.shape[0]
+            in_range[in_range] = candidates[slots[in_range]] == positions[in_range]
+            slots, positions, freqs = slots[in_range], positions[in_range], freqs[in_range]
+        return (slots, positions, freqs) if positions.size else None
+
+    def _idf(self, term: str) -> float:
+        df = int(self._doc_freqs[self._term_ids[term]])
+        idf = math.log(self.num_docs - df + 0.5) - math.log(df + 0.5)
+        if idf < 0:
+            return self.epsilon * self._get_average_idf()
+        return idf
+
+    def _get_average_idf(self) -> float:
+        if self._average_idf is None:
+            if not self._doc_freqs.size:
+                self._average_idf = 0.0
+            else:
+                df = self._doc_freqs.astype(np.float64)
+                self._average_idf = float(np.mean(np.log(self.num_docs - df + 0.5) - np.log(df + 0.5)))
+        return self._average_idf
@@ -0,0 +1,58 @@
+# bot_index.py
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+class BotFilterIndex:
+    """
+    Inverted index from bot_id to the chunk positions that bot may retrieve.
+
+    Positions are collected in Python lists as chunks are added or associated
+    and materialized lazily into sorted, unique int64 arrays, which is the form
+    the BM25 and FAISS pre-filters consume.
+    """
+
+    def __init__(self):
+        self._positions: Dict[str, List[int]] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self.indexed_count = 0  # number of chunk positions registered via add_chunk
+
+    def rebuild(self, chunks_metadata: Iterable) -> None:
+        """Index every chunk from scratch (used when metadata is reloaded)."""
+        self._positions = {}
+        self._arrays = {}
+        self.indexed_count = 0
+        for position, chunk in enumerate(chunks_metadata):
+            self.add_chunk(position, [] if chunk.deleted else chunk.bot_ids)
+
+    def add_chunk(self, position: int, bot_ids: Iterable[str]) -> None:
+        for bot_id in bot_ids:
+            self._positions.setdefault(bot_id, []).append(position)
+            self._arrays.pop(bot_id, None)
+        self.indexed_count = max(self.indexed_count, position + 1)
+
+    def add_bot(self, bot_id: str, positions: Iterable[int]) -> None:
+        """Grant a bot access to additional positions."""
+        self._positions.setdefault(bot_id, []).extend(positions)
+        self._arrays.pop(bot_id, None)
+
+    def remove_positions(self, positions: Iterable[int]) -> None:
+        """Drop positions from every bot (e.g. when chunks are deleted)."""
+        removed = np.fromiter(positions, dtype=np.int64)
+        if removed.size == 0:
+            return
+        for bot_id in list(self._positions):
+            kept = self.positions(bot_id)
+            kept = kept[~np.isin(kept, removed)]
+            self._positions[bot_id] = kept.tolist()
+            self._arrays[bot_id] = kept
+
+    def positions(self, bot_id: str) -> np.ndarray:
+        """Sorted unique positions visible to `bot_id` (empty if unknown)."""
+        array = self._arrays.get(bot_id)
+        if array is None:
+            array = np.unique(np.asarray(self._positions.get(bot_id, []), dtype=np.int64))
+            self._arrays[bot_id] = array
+            self._positions[bot_id] = array.tolist()
+        return array
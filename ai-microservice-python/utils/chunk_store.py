@@ -0,0 +1,542 @@
+# chunk_store.py
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Record layout: <payload length:u32><crc32 of key+payload:u32><op:u8><key length:u16><entry count:u32><key><payload>
+# The key is the record's doc_id, uncompressed, so a document can be located without decoding its payload.
+RECORD_HEADER = struct.Struct("<IIBHI")
+COMPRESSED_FLAG = 0x80
+FORMAT_VERSION = 2
+
+OP_PUT_DOC = 2     # {"doc_id": ..., "entries": [...]}: replace a document's entries
+OP_DELETE_DOC = 3  # {"doc_id": ...}
+OP_ADD_BOT = 4     # {"doc_ids": [...], "bot_id": ...}
+OP_CLEAR = 5       # {}
+
+MANIFEST_NAME = "MANIFEST.json"
+
+
+def link_or_copy(source: Path, target: Path):
+    """Hard-link an immutable file into place, copying it when linking is not possible (e.g. across devices)."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class ChunkStoreCorruptError(Exception):
+    """A record failed its checksum somewhere other than the torn tail of the last segment."""
+
+
+class _Record(NamedTuple):
+    op: int
+    count: int
+    crc: int
+    start: int    # first byte of the key
+    key_end: int  # first byte of the payload
+    end: int
+
+
+class _Document:
+    """A document's entries, or where to decode them from when they are not in memory."""
+
+    __slots__ = ("count", "entries", "location", "bot_ids")
+
+    def __init__(
+        self,
+        count: int,
+        entries: Optional[List[Dict[str, Any]]] = None,
+        location: Optional[Tuple[str, int]] = None
+    ):
+        self.count = count
+        self.entries = entries    # None until decoded
+        self.location = location  # (segment name, offset) of the record holding the entries
+        self.bot_ids: List[str] = []  # bots associated after that record was written
+
+
+class EntriesView:
+    """Live, read-only view of every entry in document order, decoding documents as it goes."""
+
+    def __init__(self, store: "ChunkStore"):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store._count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for doc_id, doc in list(self._store._docs.items()):
+            yield from self._store._entries_of(doc_id, doc, cache=False)
+
+
+def _add_bot_to_entries(entries: List[Dict[str, Any]], bot_id: str):
+    for entry in entries:
+        if "bot_ids" not in entry:
+            entry["bot_ids"] = [entry.get("bot_id")] if entry.get("bot_id") else []
+        if bot_id not in entry["bot_ids"]:
+            entry["bot_ids"].append(bot_id)
+
+
+class ChunkStore:
+    """
+    Append-only, crash-safe store for the documents store entries.
+
+    Every mutation is recorded as a small binary log record; `flush()` appends
+    only the records produced since the last flush. A JSON manifest lists the
+    live segment files and is replaced atomically, and `compact()` rewrites the
+    live entries into a fresh segment once dead records dominate the log.
+
+    Loading only scans record headers of the memory-mapped segments and keeps
+    an index of where each document's record lives; a document's entries are
+    decoded on first access and kept in a bounded LRU, so opening the store
+    costs O(documents) rather than O(corpus). A torn record at the tail of the
+    last segment (e.g. after a crash) is dropped on load; a checksum failure
+    anywhere else raises `ChunkStoreCorruptError` instead of losing data.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        compact_ratio: float = 2.0,
+        compress_min_bytes: int = 512,
+        cache_documents: int = 256
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_ratio = compact_ratio
+        self.compress_min_bytes = compress_min_bytes
+        self.cache_documents = cache_documents
+        self.migrated = False  # imported from the legacy JSON store in this process
+
+        self._docs: Dict[str, _Document] = {}  # doc_id -> document, in insertion order
+        self._count = 0
+        self._decoded: "OrderedDict[str, None]" = OrderedDict()  # evictable decoded documents, LRU first
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._lock = threading.RLock()  # guards decoding, the LRU and record locations
+        self._pending: List[Tuple[int, str, Dict[str, Any], Optional[_Document]]] = []
+        self._segments: List[str] = []
+        self._next_segment = 1
+        self._log_records = 0
+        self._log_bytes = 0
+        self._snapshot_bytes = 0
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / MANIFEST_NAME
+
+    @property
+    def entries(self) -> EntriesView:
+        return EntriesView(self)
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    def get_entry(self, doc_id: str, chunk_id: int) -> Optional[Dict[str, Any]]:
+        """Lookup of the entry for a document's chunk_id-th chunk, decoding only that document."""
+        doc_entries = self.document_entries(doc_id)
+        if not 0 <= chunk_id < len(doc_entries):
+            return None
+        return doc_entries[chunk_id]
+
+    def document_entries(self, doc_id: str) -> List[Dict[str, Any]]:
+        """All entries of a document in chunk order."""
+        doc = self._docs.get(doc_id)
+        return self._entries_of(doc_id, doc) if doc is not None else []
+
+    def _entries_of(self, doc_id: str, doc: _Document, cache: bool = True) -> List[Dict[str, Any]]:
+        with self._lock:
+            if doc.entries is not None:
+                if doc_id in self._decoded:
+                    self._decoded.move_to_end(doc_id)
+                return doc.entries
+            entries = self._decode_document(doc_id, doc)
+            if cache:
+                doc.entries = entries
+                self._track_decoded(doc_id)
+            return entries
+
+    def _track_decoded(self, doc_id: str):
+        self._decoded[doc_id] = None
+        self._decoded.move_to_end(doc_id)
+        while len(self._decoded) > self.cache_documents:
+            evicted, _ = self._decoded.popitem(last=False)
+            self._docs[evicted].entries = None
+
+    # ------------------------------------------------------------------
+    # Mutations (applied in memory immediately, persisted on flush)
+    # ------------------------------------------------------------------
+    def put_document(self, doc_id: str, entries: List[Dict[str, Any]]):
+        """Replace all entries of `doc_id` with `entries`, appended at the end."""
+        doc = _Document(len(entries), entries=entries)
+        self._set_document(doc_id, doc)
+        self._pending.append((OP_PUT_DOC, doc_id, {"doc_id": doc_id, "entries": entries}, doc))
+
+    def delete_document(self, doc_id: str):
+        self._drop_document(doc_id)
+        self._pending.append((OP_DELETE_DOC, doc_id, {"doc_id": doc_id}, None))
+
+    def add_bot(self, doc_ids: List[str], bot_id: str):
+        self._add_bot(doc_ids, bot_id)
+        self._pending.append((OP_ADD_BOT, "", {"doc_ids": list(doc_ids), "bot_id": bot_id}, None))
+
+    def clear(self):
+        self._reset()
+        self._pending.append((OP_CLEAR, "", {}, None))
+
+    def _set_document(self, doc_id: str, doc: _Document):
+        with self._lock:
+            self._drop_document(doc_id)
+            self._docs[doc_id] = doc
+            self._count += doc.count
+
+    def _drop_document(self, doc_id: str):
+        with self._lock:
+            doc = self._docs.pop(doc_id, None)
+            if doc is not None:
+                self._count -= doc.count
+                self._decoded.pop(doc_id, None)
+
+    def _add_bot(self, doc_ids: Iterable[str], bot_id: str):
+        with self._lock:
+            for doc_id in set(doc_ids):
+                doc = self._docs.get(doc_id)
+                if doc is None:
+                    continue
+                if doc.location is not None and bot_id not in doc.bot_ids:
+                    doc.bot_ids.append(bot_id)  # re-applied whenever the record is decoded again
+                if doc.entries is not None:
+                    _add_bot_to_entries(doc.entries, bot_id)
+
+    def _reset(self):
+        with self._lock:
+            self._docs = {}
+            self._count = 0
+            self._decoded.clear()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def load(self) -> EntriesView:
+        """Index the manifest's segments by document without decoding any entries."""
+        self._reset()
+        self._pending = []
+        self._log_records = 0
+
+        manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        self._segments = manifest["segments"]
+        self._next_segment = manifest["next_segment"]
+        self._snapshot_bytes = manifest.get("snapshot_bytes", 0)
+
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store version {manifest.get('version')} in {self.manifest_path}")
+
+        for position, name in enumerate(self._segments):
+            self._scan_segment(name, last=position == len(self._segments) - 1)
+        self._log_bytes = sum(
+            (self.directory / name).stat().st_size
+            for name in self._segments
+            if (self.directory / name).exists()
+        )
+
+        logger.info(
+            f"Loaded chunk store with {self._count} entries of {len(self._docs)} documents "
+            f"from {len(self._segments)} segment(s), {self._log_records} records"
+        )
+        return self.entries
+
+    def _scan_segment(self, name: str, last: bool):
+        path = self.directory / name
+        size = path.stat().st_size if path.exists() else 0
+        if size == 0:
+            return
+
+        mm = self._map(name)
+        offset = 0
+        while offset < size:
+            record = self._record_at(mm, offset, size)
+            if record is None:
+                if not last:
+                    raise ChunkStoreCorruptError(f"Truncated record at offset {offset} of segment {name}")
+                break  # torn final write
+            # Document payloads are verified when decoded; the last segment is verified now to find torn writes
+            if (last or record.op & ~COMPRESSED_FLAG != OP_PUT_DOC) and not self._verified(mm, record):
+                if last and record.end == size:
+                    break
+                raise ChunkStoreCorruptError(f"Checksum mismatch at offset {offset} of segment {name}")
+            self._replay(mm, record, name, offset)
+            self._log_records += 1
+            offset = record.end
+
+        if offset < size:
+            logger.warning(f"Discarding {size - offset} trailing bytes of torn record in {name}")
+            self._maps.pop(name).close()
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+
+    def _replay(self, mm: mmap.mmap, record: _Record, name: str, offset: int):
+        op = record.op & ~COMPRESSED_FLAG
+        key = bytes(mm[record.start:record.key_end]).decode("utf-8")
+        if op == OP_PUT_DOC:
+            self._set_document(key, _Document(record.count, location=(name, offset)))
+        elif op == OP_DELETE_DOC:
+            self._drop_document(key)
+        elif op == OP_ADD_BOT:
+            payload = self._payload(mm, record)
+            self._add_bot(payload["doc_ids"], payload["bot_id"])
+        elif op == OP_CLEAR:
+            self._reset()
+        else:
+            raise ValueError(f"Unknown chunk store op {op}")
+
+    def _decode_document(self, doc_id: str, doc: _Document) -> List[Dict[str, Any]]:
+        name, offset = doc.location
+        mm = self._map(name)
+        record = self._record_at(mm, offset, len(mm))
+        if record is None or not self._verified(mm, record):
+            raise ChunkStoreCorruptError(f"Corrupt record for document {doc_id} at offset {offset} of segment {name}")
+        entries = self._payload(mm, record)["entries"]
+        for bot_id in doc.bot_ids:
+            _add_bot_to_entries(entries, bot_id)
+        return entries
+
+    def _map(self, name: str) -> mmap.mmap:
+        with self._lock:
+            path = self.directory / name
+            mm = self._maps.get(name)
+            if mm is None or len(mm) < path.stat().st_size:
+                with open(path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[name] = mm  # a replaced map is released once nothing reads from it
+            return mm
+
+    @staticmethod
+    def _record_at(mm: mmap.mmap, offset: int, size: int) -> Optional[_Record]:
+        if offset + RECORD_HEADER.size > size:
+            return None
+        length, crc, op, key_length, count = RECORD_HEADER.unpack_from(mm, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + key_length + length
+        if end > size:
+            return None
+        return _Record(op, count, crc, start, start + key_length, end)
+
+    @staticmethod
+    def _verified(mm: mmap.mmap, record: _Record) -> bool:
+        return zlib.crc32(mm[record.start:record.end]) == record.crc
+
+    @staticmethod
+    def _payload(mm: mmap.mmap, record: _Record) -> Dict[str, Any]:
+        data = mm[record.key_end:record.end]
+        if record.op & COMPRESSED_FLAG:
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+    def import_entries(self, entries: Iterable[Dict[str, Any]]):
+        """Seed an empty store (e.g. from the legacy documents_store.json) and persist it."""
+        self._reset()
+        self._pending = []
+        self._segments = []
+        self._log_records = 0
+        by_doc: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            by_doc.setdefault(entry["doc_id"], []).append(entry)
+        for doc_id, doc_entries in by_doc.items():
+            self._set_document(doc_id, _Document(len(doc_entries), entries=doc_entries))
+        self._write_snapshot()
+
+    def flush(self) -> int:
+        """Append pending records to the active segment. Returns the number written."""
+        with self._lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, []
+            if any(op == OP_CLEAR for op, _, _, _ in pending):
+                # A clear makes earlier history irrelevant; start over from the live entries
+                self._write_snapshot()
+                return len(pending)
+
+            segment = self._active_segment()
+            offset = segment.stat().st_size
+            written = []
+            with open(segment, "ab") as f:
+                for op, key, payload, doc in pending:
+                    record = self._encode(op, key, payload)
+                    f.write(record)
+                    if doc is not None and self._docs.get(key) is doc:
+                        written.append((key, doc, offset))
+                    offset += len(record)
+                    self._log_bytes += len(record)
+                f.flush()
+                os.fsync(f.fileno())
+            self._log_records += len(pending)
+
+            # Persisted documents may now be evicted from memory and decoded again on demand
+            for doc_id, doc, record_offset in written:
+                doc.location = (segment.name, record_offset)
+                self._track_decoded(doc_id)
+
+            if self._needs_compaction():
+                self.compact()
+            return len(pending)
+
+    def compact(self, update: Optional[Callable[[int, Dict[str, Any]], None]] = None):
+        """
+        Rewrite the live entries into a single fresh segment. `update(position, entry)`,
+        if given, is applied to every entry in order on the way, e.g. to renumber them.
+        """
+        logger.info(
+            f"Compacting chunk store: {self._log_records} records for {self._count} entries"
+        )
+        with self._lock:
+            # The snapshot already reflects any unflushed mutations
+            self._pending = []
+            self._write_snapshot(update)
+
+    def export(self, directory: Path):
+        """
+        Write a loadable copy of the store to an empty directory without re-encoding it.
+        Pending records are flushed first; sealed segments are never appended to again,
+        so they are hard-linked, and only the active segment is copied.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self.flush()
+            for position, name in enumerate(self._segments):
+                source = self.directory / name
+                if position < len(self._segments) - 1:
+                    link_or_copy(source, directory / name)
+                else:
+                    shutil.copyfile(source, directory / name)
+            self._write_manifest(directory)
+
+    def close(self):
+        """Release the segment maps of a store that is being replaced; unflushed records are discarded."""
+        with self._lock:
+            maps, self._maps = self._maps, {}
+            self._pending = []
+        for mm in maps.values():
+            try:
+                mm.close()
+            except BufferError:
+                pass  # still exported to a reader; released with its last reference
+
+    def _needs_compaction(self) -> bool:
+        # Replaced documents leave dead bytes behind; rewrite once they dominate the log
+        return self._log_bytes > self.compact_ratio * self._snapshot_bytes + 1024 * 1024
+
+    def _write_snapshot(self, update: Optional[Callable[[int, Dict[str, Any]], None]] = None):
+        """Write one record per document into a new segment and atomically swap the manifest to it."""
+        with self._lock:
+            name = self._new_segment_name()
+            tmp_path = self.directory / f"{name}.tmp"
+            locations = []
+            written = 0
+            position = 0
+            with open(tmp_path, "wb") as f:
+                for doc_id, doc in self._docs.items():
+                    entries = self._entries_of(doc_id, doc, cache=False)
+                    if update is not None:
+                        for entry in entries:
+                            update(position, entry)
+                            position += 1
+                    record = self._encode(OP_PUT_DOC, doc_id, {"doc_id": doc_id, "entries": entries})
+                    f.write(record)
+                    locations.append((doc, written))
+                    written += len(record)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.directory / name)
+
+            for doc, offset in locations:
+                doc.location = (name, offset)
+                doc.bot_ids = []  # now part of the record
+            for doc_id, doc in self._docs.items():
+                if doc.entries is not None and doc_id not in self._decoded:
+                    self._track_decoded(doc_id)
+
+            obsolete = self._segments
+            self._segments = [name]
+            self._log_records = len(locations)
+            self._log_bytes = self._snapshot_bytes = written
+            self._write_manifest()
+
+            for old in obsolete:
+                self._maps.pop(old, None)
+                try:
+                    (self.directory / old).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _active_segment(self) -> Path:
+        if self._segments:
+            current = self.directory / self._segments[-1]
+            if current.exists() and current.stat().st_size < self.segment_max_bytes:
+                return current
+        name = self._new_segment_name()
+        (self.directory / name).touch()
+        self._segments.append(name)
+        self._write_manifest()
+        return self.directory / name
+
+    def _new_segment_name(self) -> str:
+        name = f"segment-{self._next_segment:06d}.log"
+        self._next_segment += 1
+        return name
+
+    def _write_manifest(self, directory: Optional[Path] = None):
+        manifest = {
+            "version": FORMAT_VERSION,
+            "segments": self._segments,
+            "next_segment": self._next_segment,
+            "snapshot_bytes": self._snapshot_bytes,
+        }
+        manifest_path = self.manifest_path if directory is None else Path(directory) / MANIFEST_NAME
+        tmp_path = manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
+
+    def _encode(self, op: int, key: str, payload: Dict[str, Any]) -> bytes:
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(data) >= self.compress_min_bytes:
+            data = zlib.compress(data, 1)
+            op |= COMPRESSED_FLAG
+        key_bytes = key.encode("utf-8")
+        count = len(payload["entries"]) if op & ~COMPRESSED_FLAG == OP_PUT_DOC else 0
+        return RECORD_HEADER.pack(len(data), zlib.crc32(key_bytes + data), op, len(key_bytes), count) + key_bytes + data
+
+
+def open_chunk_store(directory: Path, legacy_json_path: Optional[Path] = None) -> ChunkStore:
+    """Open (or create) a chunk store, migrating the legacy JSON store on first use."""
+    store = ChunkStore(directory)
+    if store.exists():
+        store.load()
+    elif legacy_json_path is not None and legacy_json_path.exists():
+        with open(legacy_json_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        # Legacy entries were positionally aligned with FAISS; record that position
+        # before the first segment is written, so an interrupted migration cannot lose it
+        for position, entry in enumerate(entries):
+            entry.setdefault("embedding_idx", position)
+        store.import_entries(entries)
+        store.migrated = True
+        logger.info(f"Migrated {len(entries)} entries from {legacy_json_path.name} to the chunk store")
+    else:
+        store.import_entries([])
+    return store
@@ -0,0 +1,122 @@
+# concurrency.py
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+import numpy as np
+
+LATENCY_WINDOW = 1000  # recent tasks kept for wait/run time percentiles
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer, preferring waiting writers so a
+    steady stream of searches cannot starve index updates. The writer side is
+    reentrant for the thread holding it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+            else:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+                self._writer_depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class MeteredExecutor:
+    """
+    Thread pool for CPU-bound request work (NumPy, FAISS and torch release the
+    GIL), awaited from coroutines and instrumented with queue depth and
+    per-task wait and run times.
+    """
+
+    def __init__(self, max_workers: int, name: str):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self._waits: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._runs: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self._waits.append(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self._runs.append(time.perf_counter() - started)
+
+        return await asyncio.wrap_future(self._pool.submit(task))
+
+    @staticmethod
+    def _summary(samples) -> Dict[str, float]:
+        if not samples:
+            return {"avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        values = np.fromiter(samples, dtype=np.float64) * 1000
+        return {
+            "avg_ms": round(float(values.mean()), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "max_ms": round(float(values.max()), 2),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits, runs = list(self._waits), list(self._runs)
+            counts = {"workers": self.max_workers, "queued": self.queued, "running": self.running, "completed": self.completed}
+        return {**counts, "wait": self._summary(waits), "run": self._summary(runs)}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
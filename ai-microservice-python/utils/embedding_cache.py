@@ -0,0 +1,197 @@
+# embedding_cache.py
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 16
+FORMAT_VERSION = 2
+# One 32-byte row per slot next to the vector: the text key, a CRC32 of the slot's
+# vector (the two files are written back independently) and its LRU tick
+SLOT_DTYPE = np.dtype([("key", np.uint8, (KEY_BYTES,)), ("checksum", "<u4"), ("pad", np.uint8, (4,)), ("tick", "<i8")])
+INITIAL_CAPACITY = 4096
+EVICT_FRACTION = 0.1  # share of entries dropped when the cache is full
+
+
+def _model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def text_digest(text: str) -> bytes:
+    """Hash of the whitespace-normalized text (the tokenizer ignores whitespace differences)."""
+    normalized = " ".join(text.split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache for one model, keyed by normalized text hash.
+
+    Vectors live in a memory-mapped float32 matrix and their keys in a parallel
+    memory-mapped slot table, so the cache survives restarts and the hash index
+    is rebuilt from the slot table on open. The OS writes the two maps back in
+    any order, so after a crash a persisted key may point at a vector that never
+    reached the disk; each slot stores a checksum of its vector and slots that
+    fail it are dropped when read. Recency is tracked per slot in the table,
+    so eviction order survives restarts; when `max_entries` is reached the
+    least recently used tenth is evicted.
+    """
+
+    def __init__(self, directory: Path, model_name: str, dim: int, max_entries: int = 200000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+
+        slug = _model_slug(model_name)
+        self._vectors_path = self.directory / f"{slug}.vectors.f32"
+        self._slots_path = self.directory / f"{slug}.slots.bin"
+        self._meta_path = self.directory / f"{slug}.meta.json"
+
+        self._lock = threading.Lock()
+        self._slots: Dict[bytes, int] = {}
+        self._free: List[int] = []
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+        self._open()
+
+    # ------------------------------------------------------------------
+    # Lookup and insertion
+    # ------------------------------------------------------------------
+    def get_many(self, texts: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Returns (embeddings, missing): a (len(texts), dim) matrix filled for cached
+        texts, and the indices of texts that still need to be embedded.
+        """
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        corrupt = 0
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = text_digest(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.append(i)
+                    continue
+                vector = self._vectors[slot]
+                if zlib.crc32(vector.tobytes()) != self._table["checksum"][slot]:
+                    self._release(key, slot)
+                    missing.append(i)
+                    corrupt += 1
+                    continue
+                embeddings[i] = vector
+                self._touch(slot)
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if corrupt:
+            logger.warning(f"Dropped {corrupt} {self.model_name} embedding cache entries that failed their checksum")
+        return embeddings, missing
+
+    def put_many(self, texts: Sequence[str], embeddings: np.ndarray):
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = text_digest(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._allocate()
+                    self._vectors[slot] = embedding
+                    self._table["checksum"][slot] = zlib.crc32(self._vectors[slot].tobytes())
+                    self._table["key"][slot] = np.frombuffer(key, dtype=np.uint8)
+                    self._slots[key] = slot
+                self._touch(slot)
+
+    def _touch(self, slot: int):
+        self._clock += 1
+        self._table["tick"][slot] = self._clock
+
+    def _release(self, key: bytes, slot: int):
+        self._slots.pop(key, None)
+        self._table[slot] = np.zeros((), dtype=SLOT_DTYPE)
+        self._free.append(slot)
+
+    def _allocate(self) -> int:
+        if not self._free:
+            if self._capacity < self.max_entries:
+                self._grow(min(self._capacity * 2, self.max_entries))
+            else:
+                self._evict()
+        return self._free.pop()
+
+    def _evict(self):
+        """Free the least recently used slots."""
+        count = max(1, int(self._capacity * EVICT_FRACTION))
+        victims = np.argpartition(self._table["tick"], count - 1)[:count]
+        for slot in victims.tolist():
+            self._release(self._table["key"][slot].tobytes(), slot)
+        logger.info(f"Evicted {count} entries from the {self.model_name} embedding cache")
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _open(self):
+        capacity = 0
+        if self._meta_path.exists() and self._vectors_path.exists() and self._slots_path.exists():
+            meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+            if meta.get("format") != FORMAT_VERSION:
+                logger.warning(f"Embedding cache format changed ({meta.get('format')} -> {FORMAT_VERSION}), starting empty")
+            elif meta.get("dim") == self.dim:
+                capacity = meta["capacity"]
+            else:
+                logger.warning(f"Embedding cache dimension changed ({meta.get('dim')} -> {self.dim}), starting empty")
+
+        if capacity:
+            self._capacity = capacity
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            self._table = np.memmap(self._slots_path, dtype=SLOT_DTYPE, mode="r+", shape=(capacity,))
+        else:
+            self._capacity = min(INITIAL_CAPACITY, self.max_entries)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="w+", shape=(self._capacity, self.dim))
+            self._table = np.memmap(self._slots_path, dtype=SLOT_DTYPE, mode="w+", shape=(self._capacity,))
+            self._write_meta()
+
+        occupied = np.flatnonzero(self._table["key"].any(axis=1))
+        self._slots = {self._table["key"][slot].tobytes(): int(slot) for slot in occupied}
+        self._free = sorted(set(range(self._capacity)) - set(occupied.tolist()), reverse=True)
+        self._clock = int(self._table["tick"].max(initial=0))
+        logger.info(f"Opened {self.model_name} embedding cache with {len(self._slots)} entries")
+
+    def _grow(self, capacity: int):
+        """Enlarge both memory maps, keeping slots in place."""
+        self._vectors.flush()
+        self._table.flush()
+        old_capacity = self._capacity
+        del self._vectors, self._table
+        for path, row_bytes in ((self._vectors_path, self.dim * 4), (self._slots_path, SLOT_DTYPE.itemsize)):
+            with open(path, "r+b") as f:
+                f.truncate(capacity * row_bytes)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._table = np.memmap(self._slots_path, dtype=SLOT_DTYPE, mode="r+", shape=(capacity,))
+        self._free.extend(range(capacity - 1, old_capacity - 1, -1))
+        self._capacity = capacity
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {"model": self.model_name, "dim": self.dim, "capacity": self._capacity, "format": FORMAT_VERSION}
+        tmp_path = self._meta_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_path, self._meta_path)
+
+    def flush(self):
+        """Write dirty pages of both memory maps to disk."""
+        with self._lock:
+            self._vectors.flush()
+            self._table.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._slots), "capacity": self._capacity, "hits": self.hits, "misses": self.misses}
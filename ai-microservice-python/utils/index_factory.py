@@ -0,0 +1,252 @@
+# index_factory.py
+import logging
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# "auto" keeps a flat index until FAISS_APPROX_THRESHOLD vectors, then switches to FAISS_APPROX_TYPE
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+FAISS_APPROX_TYPE = os.getenv("FAISS_APPROX_TYPE", "ivf_flat")
+FAISS_APPROX_THRESHOLD = int(os.getenv("FAISS_APPROX_THRESHOLD", "50000"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "128"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "64"))  # sub-quantizers, must divide the dimension
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+# Approximate indexes return this many neighbours per requested result before fusion
+FAISS_CANDIDATE_FACTOR = int(os.getenv("FAISS_CANDIDATE_FACTOR", "20"))
+FAISS_MIN_CANDIDATES = int(os.getenv("FAISS_MIN_CANDIDATES", "200"))
+
+MIN_TRAINING_POINTS_PER_LIST = 39  # FAISS warns below this many points per centroid
+# IVF types stay flat until there are enough vectors to train the coarse quantizer
+FAISS_MIN_TRAINING_POINTS = int(os.getenv("FAISS_MIN_TRAINING_POINTS", "1000"))
+
+
+def choose_index_type(ntotal: int, configured: str = FAISS_INDEX_TYPE) -> str:
+    """Resolve the configured index type for a corpus of `ntotal` vectors."""
+    if configured == "auto":
+        configured = FAISS_APPROX_TYPE if ntotal >= FAISS_APPROX_THRESHOLD else "flat"
+    if configured not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{configured}', expected one of {INDEX_TYPES} or 'auto'")
+    if configured.startswith("ivf") and ntotal < FAISS_MIN_TRAINING_POINTS:
+        return "flat"
+    return configured
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name of the factory type a (possibly wrapped) index was built as."""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def is_approximate(index: faiss.Index) -> bool:
+    return index_type_of(index) != "flat"
+
+
+def semantic_k(index: faiss.Index, num_candidates: int, top_k: int) -> int:
+    """How many neighbours to request: every candidate for flat, a bounded pool otherwise."""
+    k = min(num_candidates, index.ntotal)
+    if is_approximate(index):
+        k = min(k, max(top_k * FAISS_CANDIDATE_FACTOR, FAISS_MIN_CANDIDATES))
+    return max(int(k), 1)
+
+
+def _nlist_for(ntotal: int) -> int:
+    """About 4*sqrt(n) lists, capped so each list still gets enough training points."""
+    return max(1, min(int(4 * math.sqrt(max(ntotal, 1))), ntotal // MIN_TRAINING_POINTS_PER_LIST))
+
+
+def build_index(
+    index_type: str,
+    dim: int,
+    vectors: Optional[np.ndarray] = None,
+    ids: Optional[np.ndarray] = None
+) -> faiss.Index:
+    """
+    Create an id-addressed inner-product index of `index_type`, training it on
+    `vectors` when the type needs training, and add `vectors` under `ids`
+    (0..n-1 by default).
+
+    IVF types store the ids in their inverted lists and support `remove_ids`
+    natively; flat and HNSW indexes are wrapped in an IndexIDMap2.
+    """
+    ntotal = 0 if vectors is None else vectors.shape[0]
+    metric = faiss.METRIC_INNER_PRODUCT
+    if ntotal and ids is None:
+        ids = np.arange(ntotal, dtype=np.int64)
+
+    if index_type == "flat":
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, metric)
+        base.hnsw.efSearch = FAISS_EF_SEARCH
+        index = faiss.IndexIDMap2(base)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        if ntotal == 0:
+            raise ValueError(f"{index_type} index needs training vectors")
+        nlist = _nlist_for(ntotal)
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            if dim % FAISS_PQ_M:
+                raise ValueError(f"FAISS_PQ_M={FAISS_PQ_M} must divide the embedding dimension {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, FAISS_PQ_M, FAISS_PQ_NBITS, metric)
+        index.train(vectors)
+        index.nprobe = min(FAISS_NPROBE, nlist)
+        # Keep vectors reconstructible by id so the index can be retrained or migrated later
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        raise ValueError(f"Unknown FAISS index type '{index_type}'")
+
+    if ntotal:
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+    logger.info(f"Built {index_type} FAISS index with {index.ntotal} vectors")
+    return index
+
+
+def new_index(dim: int) -> faiss.Index:
+    """An empty id-addressed flat index."""
+    return build_index("flat", dim)
+
+
+def stored_ids(index: faiss.Index) -> np.ndarray:
+    """Ids of all stored vectors (legacy position-addressed indexes use their positions)."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        invlists = ivf.invlists
+        ids = [
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(ivf.nlist)
+            if invlists.list_size(list_no)
+        ]
+        return np.sort(np.concatenate(ids).astype(np.int64)) if ids else np.zeros(0, dtype=np.int64)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def extract_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """(ids, vectors) of every stored vector."""
+    ids = stored_ids(index)
+    if index.ntotal == 0:
+        return ids, np.zeros((0, index.d), dtype=np.float32)
+    if isinstance(index, faiss.IndexIDMap):
+        # The wrapped index stores vectors in id_map order
+        return ids, _base_index(index).reconstruct_n(0, index.ntotal)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return ids, index.reconstruct_batch(ids)
+    return ids, index.reconstruct_n(0, index.ntotal)
+
+
+def ensure_id_addressable(index: faiss.Index) -> faiss.Index:
+    """
+    Migrate an index written before chunks had stable ids. Legacy flat/HNSW
+    indexes are rebuilt with id == position; IVF indexes get a hashtable direct map.
+    """
+    if isinstance(index, faiss.IndexIDMap):
+        return index
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+    ids, vectors = extract_vectors(index)
+    logger.info(f"Wrapping legacy {index_type_of(index)} FAISS index with {index.ntotal} vectors in an id map")
+    return build_index(index_type_of(index), index.d, vectors, ids)
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray) -> int:
+    """
+    Remove vectors by id. Returns how many were removed; HNSW cannot remove,
+    so its vectors stay in place (filtered out at query time) until compaction.
+    """
+    if ids.size == 0:
+        return 0
+    try:
+        return int(index.remove_ids(np.ascontiguousarray(ids, dtype=np.int64)))
+    except RuntimeError:
+        logger.info(f"{index_type_of(index)} index cannot remove vectors; {ids.size} left for compaction")
+        return 0
+
+
+def needs_rebuild(index: faiss.Index, configured: str = FAISS_INDEX_TYPE) -> Optional[str]:
+    """
+    Target type if the index should be rebuilt: a different type is configured
+    for its size, or an IVF index has grown well past the size it was trained for.
+    """
+    target = choose_index_type(index.ntotal, configured)
+    current = index_type_of(index)
+    if target != current:
+        return target
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and _nlist_for(index.ntotal) >= 2 * ivf.nlist:
+        return target
+    return None
+
+
+def rebuild_index(
+    index: faiss.Index,
+    index_type: str,
+    id_mapping: Optional[Dict[int, int]] = None
+) -> faiss.Index:
+    """
+    Rebuild an index as `index_type`, retraining on its own vectors. Ids are kept,
+    or renumbered through `id_mapping` (old id -> new id; ids missing from it are dropped).
+    """
+    ids, vectors = extract_vectors(index)
+    if id_mapping is not None:
+        keep = np.fromiter((int(i) in id_mapping for i in ids), dtype=bool, count=ids.size)
+        ids = np.fromiter((id_mapping[int(i)] for i in ids[keep]), dtype=np.int64, count=int(keep.sum()))
+        vectors = vectors[keep]
+    logger.info(f"Rebuilding FAISS index from {index_type_of(index)} to {index_type} ({vectors.shape[0]} vectors)")
+    if index_type.startswith("ivf") and vectors.shape[0] == 0:
+        index_type = "flat"
+    return build_index(index_type, index.d, vectors, ids)
+
+
+def search_parameters(
+    index: faiss.Index,
+    k: int,
+    selector: Optional[faiss.IDSelector] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
+) -> Optional[faiss.SearchParameters]:
+    """Per-request search parameters matching the index type."""
+    index_type = index_type_of(index)
+    kwargs = {}
+    if index_type in ("ivf_flat", "ivf_pq"):
+        params_class = faiss.SearchParametersIVF
+        kwargs["nprobe"] = nprobe or faiss.try_extract_index_ivf(index).nprobe
+    elif index_type == "hnsw":
+        params_class = faiss.SearchParametersHNSW
+        # efSearch below k cannot return k results
+        kwargs["efSearch"] = max(ef_search or FAISS_EF_SEARCH, k)
+    elif selector is not None:
+        params_class = faiss.SearchParameters
+    else:
+        return None
+    if selector is not None:
+        kwargs["sel"] = selector
+    # Keyword construction keeps the selector referenced for the lifetime of the params
+    return params_class(**kwargs)
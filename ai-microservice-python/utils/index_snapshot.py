@@ -0,0 +1,126 @@
+# index_snapshot.py
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, List, Optional
+
+import faiss
+
+from utils.bm25_index import FrozenBM25, IncrementalBM25
+from utils.chunk_store import ChunkStore, link_or_copy
+
+logger = logging.getLogger(__name__)
+
+CURRENT_NAME = "CURRENT"
+SNAPSHOT_PREFIX = "gen-"
+
+
+@dataclass
+class IndexSnapshot:
+    name: str
+    index: Any
+    chunk_store: ChunkStore
+    bm25: Optional[FrozenBM25]
+
+
+def current_snapshot_name(root: Path) -> Optional[str]:
+    """Name of the most recently published snapshot, if any."""
+    try:
+        return (Path(root) / CURRENT_NAME).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class SnapshotPublisher:
+    """
+    Writes immutable generations of the search state for read-only workers.
+
+    Each generation is a directory holding the FAISS index, a copy of the chunk
+    store and the BM25 postings as arrays. The index file and the sealed chunk
+    store segments are hard-linked from the writer's saved state, so only the
+    active segment and the postings are written per generation. It is assembled
+    under a temporary name, renamed into place and only then announced by
+    atomically replacing the CURRENT file, so readers never see a partial
+    generation. Readers keep serving from their mapped files if an old
+    generation is pruned.
+    """
+
+    def __init__(self, root: Path, keep: int = 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.keep = max(keep, 2)
+        self.published_generation: Optional[int] = None
+        self._discard_unannounced()
+
+    def publish(
+        self,
+        index_path: Path,
+        chunk_store: ChunkStore,
+        bm25: Optional[IncrementalBM25],
+        generation: int
+    ) -> str:
+        """Publish the saved FAISS index file and the chunk store, which must reflect `generation`."""
+        name = f"{SNAPSHOT_PREFIX}{self._next_number():08d}"
+        tmp_dir = self.root / f"{name}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+
+        # The writer replaces its index file rather than rewriting it, so the link stays immutable
+        link_or_copy(Path(index_path), tmp_dir / "index.faiss")
+        chunk_store.export(tmp_dir / "chunks")
+        if bm25 is not None:
+            bm25.write_snapshot(tmp_dir / "bm25")
+        os.replace(tmp_dir, self.root / name)
+
+        tmp_current = self.root / f"{CURRENT_NAME}.tmp"
+        tmp_current.write_text(name, encoding="utf-8")
+        os.replace(tmp_current, self.root / CURRENT_NAME)
+        self.published_generation = generation
+        logger.info(f"Published index snapshot {name} ({len(chunk_store.entries)} entries)")
+
+        self._prune()
+        return name
+
+    def _discard_unannounced(self):
+        """
+        Remove what an interrupted publish left behind: temporary files and generations
+        renamed into place but never announced in CURRENT, which no reader has opened.
+        """
+        current = current_snapshot_name(self.root)
+        for path in self.root.iterdir():
+            unannounced = (
+                path.is_dir() and path.name.startswith(SNAPSHOT_PREFIX)
+                and (current is None or path.name > current)
+            )
+            if path.name.endswith(".tmp") or unannounced:
+                logger.warning(f"Removing unannounced index snapshot {path.name}")
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+
+    def _generations(self) -> List[str]:
+        return sorted(
+            path.name for path in self.root.iterdir()
+            if path.is_dir() and path.name.startswith(SNAPSHOT_PREFIX) and not path.name.endswith(".tmp")
+        )
+
+    def _next_number(self) -> int:
+        generations = self._generations()
+        return int(generations[-1][len(SNAPSHOT_PREFIX):]) + 1 if generations else 1
+
+    def _prune(self):
+        for name in self._generations()[:-self.keep]:
+            shutil.rmtree(self.root / name, ignore_errors=True)
+
+
+def load_snapshot(root: Path, name: str) -> IndexSnapshot:
+    """Open a published generation read-only, memory-mapping the FAISS index and BM25 postings."""
+    directory = Path(root) / name
+    index = faiss.read_index(str(directory / "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    chunk_store = ChunkStore(directory / "chunks")
+    chunk_store.load()
+    bm25 = FrozenBM25(directory / "bm25") if (directory / "bm25" / "meta.json").exists() else None
+    return IndexSnapshot(name=name, index=index, chunk_store=chunk_store, bm25=bm25)
@@ -0,0 +1,98 @@
+# ingestion.py
+import asyncio
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionCoordinator:
+    """
+    Prepares documents concurrently and commits them in serialized batches.
+
+    `submit` runs a document's prepare step (extraction, chunking, embedding)
+    with at most `max_concurrency` documents in flight across all callers.
+    Prepared documents are queued, and whichever caller holds the commit lock
+    drains the whole queue into a single `commit` call, in submission order.
+    While other documents are still being prepared, the committer first waits
+    up to `batch_window` seconds for them to join. A burst of uploads therefore
+    costs one index update and one flush per batch rather than per document.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_concurrency: int = 4,
+        max_batch: int = 64,
+        batch_window: float = 0.5
+    ):
+        self._commit = commit
+        self.max_concurrency = max_concurrency
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._sequence = itertools.count()
+        self._pending: List[Tuple[int, Any, asyncio.Future]] = []
+        self._prepare_slots: Optional[asyncio.Semaphore] = None
+        self._commit_lock: Optional[asyncio.Lock] = None
+        self.preparing = 0
+        self.batches = 0
+        self.committed = 0
+
+    async def submit(self, prepare: Callable[[], Awaitable[Any]]) -> Any:
+        """Prepare one document, wait for the batch that commits it and return its commit result."""
+        if self._prepare_slots is None:
+            self._prepare_slots = asyncio.Semaphore(self.max_concurrency)
+            self._commit_lock = asyncio.Lock()
+        sequence = next(self._sequence)  # batch order follows submission order
+
+        async with self._prepare_slots:
+            self.preparing += 1
+            try:
+                prepared = await prepare()
+            finally:
+                self.preparing -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((sequence, prepared, future))
+        await self._commit_pending()
+        return await future
+
+    async def _commit_pending(self):
+        async with self._commit_lock:
+            deadline = asyncio.get_running_loop().time() + self.batch_window
+            while self._pending and self.preparing and len(self._pending) < self.max_batch \
+                    and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.01)
+            while self._pending:
+                self._pending.sort(key=lambda item: item[0])
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                try:
+                    results = await self._commit([prepared for _, prepared, _ in batch])
+                except Exception as e:
+                    logger.error(f"Failed to commit a batch of {len(batch)} documents: {e}")
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                except BaseException:
+                    # This committer was cancelled (e.g. on shutdown) and the commit's outcome is
+                    # unknown; the other documents of the batch must not wait for it forever
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.cancel()
+                    raise
+                for (_, _, future), result in zip(batch, results):
+                    if not future.done():  # the caller may have been cancelled meanwhile
+                        future.set_result(result)
+                self.batches += 1
+                self.committed += len(batch)
+                logger.info(f"Committed a batch of {len(batch)} documents")
+
+    def stats(self):
+        return {
+            "preparing": self.preparing,
+            "pending_commit": len(self._pending),
+            "batches": self.batches,
+            "committed": self.committed,
+        }
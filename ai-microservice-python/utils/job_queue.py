@@ -0,0 +1,276 @@
+# job_queue.py
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job states; stages describe where a running job is
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+STAGE_EXTRACTING, STAGE_COMMITTING, STAGE_DONE = "extracting", "committing", "done"
+PROGRESS_FIELDS = ("stage", "pages_done", "pages_total", "ocr_pages", "chunks_embedded")
+
+JobHandler = Callable[[Dict[str, Any], Callable[..., None]], Awaitable[Dict[str, Any]]]
+
+
+class JobCancelError(Exception):
+    """The job cannot be cancelled in its current state."""
+
+
+class JobQueue:
+    """
+    Persistent ingestion job queue backed by SQLite, drained by a bounded pool
+    of asyncio workers.
+
+    Each job carries a JSON payload and is handed to `handler(job, progress)`,
+    which reports per-stage progress through `progress(**fields)`. Jobs that
+    were running when the process stopped are queued again on start. Their
+    documents are re-processed from scratch, and the embedding cache makes
+    that cheap. Queued jobs can be cancelled. Running jobs can be cancelled
+    until they reach the commit stage.
+
+    Progress counters are reported per page, so they are kept in memory and
+    written at most every `progress_interval` seconds; stage changes are
+    written at once, since cancellation is decided on the stored stage.
+    """
+
+    def __init__(self, path: Path, handler: JobHandler, workers: int = 4, progress_interval: float = 1.0):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._handler = handler
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    pages_done INTEGER NOT NULL DEFAULT 0,
+                    pages_total INTEGER,
+                    ocr_pages INTEGER NOT NULL DEFAULT 0,
+                    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, created_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_doc ON jobs (doc_id, created_at)")
+            self._db.commit()
+
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._progress: Dict[str, Dict[str, Any]] = {}  # job_id -> progress fields not written yet
+        self._progress_written: Dict[str, float] = {}  # job_id -> monotonic time of the last write
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._with_progress(self._to_dict(row))
+
+    def latest_for_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE doc_id = ? ORDER BY created_at DESC, rowid DESC LIMIT 1", (doc_id,)
+            ).fetchone()
+            return self._with_progress(self._to_dict(row))
+
+    def _with_progress(self, job: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Overlay progress reported since the last write; the caller holds the lock."""
+        if job is not None and job["id"] in self._progress:
+            job.update(self._progress[job["id"]])
+        return job
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {"workers": self.workers, "running": len(self._running), **{state: counts.get(state, 0) for state in
+                (QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED)}}
+
+    # ------------------------------------------------------------------
+    # Mutations
+    # ------------------------------------------------------------------
+    def enqueue(self, payloads: List[Dict[str, Any]]) -> List[str]:
+        """Persist one job per payload (each needs a "doc_id") and wake the workers."""
+        now = time.time()
+        job_ids = [uuid.uuid4().hex for _ in payloads]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO jobs (id, doc_id, payload, state, stage, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, payload["doc_id"], json.dumps(payload), QUEUED, QUEUED, now, now)
+                    for job_id, payload in zip(job_ids, payloads)
+                ]
+            )
+            self._db.commit()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_ids
+
+    def update_progress(self, job_id: str, **fields):
+        fields = {name: value for name, value in fields.items() if name in PROGRESS_FIELDS}
+        if not fields:
+            return
+        with self._lock:
+            self._progress.setdefault(job_id, {}).update(fields)
+            last_written = self._progress_written.get(job_id)
+            if "stage" in fields or last_written is None or \
+                    time.monotonic() - last_written >= self.progress_interval:
+                self._write_progress(job_id)
+
+    def _write_progress(self, job_id: str):
+        """Write a job's buffered progress; the caller holds the lock."""
+        fields = self._progress.pop(job_id, None)
+        if not fields:
+            return
+        self._progress_written[job_id] = time.monotonic()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(
+            f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+            (*fields.values(), time.time(), job_id)
+        )
+        self._db.commit()
+
+    def _set_state(self, job_id: str, state: str, stage: str, error: Optional[str] = None, result: Any = None):
+        with self._lock:
+            # Progress of a finished or requeued run is final, so it is written with its state
+            self._write_progress(job_id)
+            self._progress_written.pop(job_id, None)
+            self._db.execute(
+                "UPDATE jobs SET state = ?, stage = ?, error = ?, result = ?, updated_at = ? WHERE id = ?",
+                (state, stage, error, json.dumps(result) if result is not None else None, time.time(), job_id)
+            )
+            self._db.commit()
+        if state in FINISHED_STATES:
+            job = self.get(job_id)
+            for waiter in self._waiters.pop(job_id, []):
+                if not waiter.done():
+                    waiter.set_result(job)
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Cancel a queued job, or a running one that has not started committing."""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job["state"] in FINISHED_STATES:
+            raise JobCancelError(f"Job already {job['state']}")
+        if job["stage"] == STAGE_COMMITTING:
+            raise JobCancelError("Job is already committing its document to the index")
+
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.wait([task])  # the worker records the cancellation
+        else:
+            self._set_state(job_id, CANCELLED, CANCELLED)
+        return self.get(job_id)
+
+    async def wait(self, job_id: str) -> Dict[str, Any]:
+        """Wait for a job to finish and return its final record."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(waiter)
+        job = self.get(job_id)
+        if job is not None and job["state"] in FINISHED_STATES:
+            self._waiters[job_id].remove(waiter)
+            return job
+        return await waiter
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+    def start(self):
+        """Requeue jobs interrupted by a restart and start the workers."""
+        with self._lock:
+            requeued = self._db.execute(
+                "UPDATE jobs SET state = ?, stage = ?, updated_at = ? WHERE state = ?",
+                (QUEUED, QUEUED, time.time(), RUNNING)
+            ).rowcount
+            self._db.commit()
+        if requeued:
+            logger.info(f"Requeued {requeued} ingestion jobs interrupted by a restart")
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; jobs still running are queued again for the next start."""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        with self._lock:
+            self._db.close()
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE state = ? ORDER BY created_at, rowid LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            # Progress restarts from zero when an interrupted job is picked up again
+            self._db.execute(
+                "UPDATE jobs SET state = ?, stage = ?, pages_done = 0, pages_total = NULL, ocr_pages = 0, "
+                "chunks_embedded = 0, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, STAGE_EXTRACTING, time.time(), row["id"])
+            )
+            self._db.commit()
+        return self._to_dict(row)
+
+    async def _worker(self):
+        while True:
+            job = self._claim_next()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            job_id = job["id"]
+            task = asyncio.create_task(self._handler(job, functools.partial(self.update_progress, job_id)))
+            self._running[job_id] = task
+            try:
+                result = await task
+            except asyncio.CancelledError:
+                if self._stopping:
+                    self._set_state(job_id, QUEUED, QUEUED)
+                    raise
+                logger.info(f"Ingestion job {job_id} for document {job['doc_id']} cancelled")
+                self._set_state(job_id, CANCELLED, CANCELLED)
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} for document {job['doc_id']} failed: {e}")
+                self._set_state(job_id, FAILED, STAGE_DONE, error=str(e))
+            else:
+                self._set_state(job_id, COMPLETED, STAGE_DONE, result=result)
+            finally:
+                self._running.pop(job_id, None)
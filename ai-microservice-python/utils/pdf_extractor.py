@@ -1,98 +1,243 @@
-import fitz  # PyMuPDF
-from pdf2image import convert_from_path
-import pytesseract
-from PIL import Image
-import io
+import asyncio
 import logging
-from typing import Dict, Optional
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Callable, List, Optional, Tuple
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages handed to a worker at once; the PDF is parsed once per range rather than once per page
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# Tesseract language packs; missing packs are dropped with a warning
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "amh+eng")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class PageResult:
+    page_number: int
+    text: str
+    ocr: bool = False  # text came from OCR rather than the text layer
+
+
+# Called with (pages_done, total_pages, page_result) after each page is yielded
+ProgressCallback = Callable[[int, int, PageResult], None]
+
+
+def _init_worker():
+    # One Tesseract thread per worker process; the pool provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for page extraction and OCR, started on first use.
+    Workers are spawned rather than forked: by then the parent runs torch and
+    FAISS threads, and a forked child can inherit their locks mid-acquire.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+@lru_cache(maxsize=None)
+def available_ocr_language(requested: str) -> str:
+    """Restrict a Tesseract language spec like 'amh+eng' to the installed packs."""
+    import pytesseract
+
+    try:
+        installed = set(pytesseract.get_languages(config=""))
+    except Exception as e:
+        logger.warning(f"Could not list Tesseract languages, using '{requested}' as is: {e}")
+        return requested
+    languages = [lang for lang in requested.split("+") if lang in installed]
+    missing = [lang for lang in requested.split("+") if lang not in installed]
+    if missing:
+        logger.warning(f"Tesseract language pack(s) not installed: {', '.join(missing)}")
+    return "+".join(languages) or "eng"
+
+
+def _page_text_pymupdf(page) -> str:
+    blocks = page.get_text("blocks")
+    blocks.sort(key=lambda b: (b[1], b[0]))  # Sort by y, then x
+    return "\n".join(block[4].strip() for block in blocks if block[4].strip())
+
+
+def _ocr_page(page, ocr_language: str, dpi: int = OCR_DPI) -> str:
+    """Rasterize a single page to grayscale and hand the image straight to Tesseract."""
+    import fitz  # PyMuPDF
+    import pytesseract
+    from PIL import Image
+
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    image = Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+    del pixmap
+    return pytesseract.image_to_string(image, lang=available_ocr_language(ocr_language)).strip()
+
+
+def _extract_from(page, page_number: int, pdf_path: str, ocr_language: str) -> PageResult:
+    text = _page_text_pymupdf(page)
+    if text.strip():
+        return PageResult(page_number, text)
+    logger.info(f"No text layer on page {page_number + 1} of {pdf_path}, falling back to OCR")
+    return PageResult(page_number, _ocr_page(page, ocr_language), ocr=True)
+
+
+def extract_pages(
+    pdf_path: str,
+    first: int,
+    last: int,
+    ocr_language: str = OCR_LANGUAGE,
+    max_retries: int = 3
+) -> List[PageResult]:
+    """
+    Extract pages [first, last) (runs in a worker process), opening the file once
+    for the whole range: PyMuPDF text, retried on errors, with OCR only when a
+    page has no text layer. Only one page is rasterized at a time.
+    """
+    import fitz  # PyMuPDF
+
+    results = []
+    doc = None
+    try:
+        for page_number in range(first, last):
+            errors = []
+            for attempt in range(max_retries):
+                try:
+                    if doc is None:
+                        doc = fitz.open(pdf_path)
+                    results.append(_extract_from(doc[page_number], page_number, pdf_path, ocr_language))
+                    break
+                except Exception as e:
+                    errors.append(f"attempt {attempt + 1}: {e}")
+                    # Retry from a freshly opened document
+                    if doc is not None:
+                        doc.close()
+                        doc = None
+            else:
+                logger.error(f"Skipping page {page_number + 1} of {pdf_path}: {', '.join(errors)}")
+                results.append(PageResult(page_number, ""))
+    finally:
+        if doc is not None:
+            doc.close()
+    return results
+
+
+def page_ranges(num_pages: int, workers: int = PDF_EXTRACT_WORKERS) -> List[Tuple[int, int]]:
+    """Split pages into [first, last) ranges of at most PDF_PAGES_PER_TASK, spread across the workers."""
+    size = max(1, min(PDF_PAGES_PER_TASK, -(-num_pages // max(workers, 1))))
+    return [(first, min(first + size, num_pages)) for first in range(0, num_pages, size)]
+
+
 class PDFExtractor:
     """
     Enhanced PDF extractor with a single entry point for text extraction.
+
+    Page ranges are extracted in parallel on a process pool and pages are
+    yielded in page order as they complete, so callers can start chunking
+    before the whole file is done. A page that fails is retried on its own;
+    it never restarts the document.
     """
 
-    def __init__(self, ocr_language: str = 'eng', max_retries: int = 3):
+    def __init__(
+        self,
+        ocr_language: str = OCR_LANGUAGE,
+        max_retries: int = 3,
+        progress_callback: Optional[ProgressCallback] = None
+    ):
         """
         Initialize the PDFExtractor.
-        :param ocr_language: Language for OCR (default is English).
-        :param max_retries: Number of retries for processing.
+        :param ocr_language: Tesseract language spec for OCR (default "amh+eng").
+        :param max_retries: Number of retries for processing each page.
+        :param progress_callback: Called after each page with (pages_done, total_pages, page).
         """
         self.ocr_language = ocr_language
         self.max_retries = max_retries
+        self.progress_callback = progress_callback
 
-    def _extract_text_pymupdf(self, pdf_path: str) -> str:
-        """
-        Extract text using PyMuPDF.
-        :param pdf_path: Path to the PDF file.
-        :return: Extracted text.
-        """
-        doc = fitz.open(pdf_path)
-        text_blocks = []
+    @staticmethod
+    def page_count(pdf_path: str) -> int:
+        import fitz  # PyMuPDF
 
-        for page in doc:
-            blocks = page.get_text("blocks")
-            blocks.sort(key=lambda b: (b[1], b[0]))  # Sort by y, then x
-            for block in blocks:
-                text = block[4].strip()
-                if text:
-                    text_blocks.append(text)
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
 
-        doc.close()
-        return "\n".join(text_blocks)
+    def _report(self, pdf_path: str, done: int, total: int, page: PageResult, ocr_pages: int):
+        if self.progress_callback is not None:
+            self.progress_callback(done, total, page)
+        if done == total or done % 25 == 0:
+            logger.info(f"Extracted {done}/{total} pages of {pdf_path} ({ocr_pages} via OCR)")
 
-    def _perform_ocr(self, pdf_path: str) -> str:
+    async def aiter_pages(self, pdf_path: str, executor: Optional[Executor] = None) -> AsyncIterator[str]:
         """
-        Perform OCR on a PDF by converting pages to images.
-        :param pdf_path: Path to the PDF file.
-        :return: Extracted text via OCR.
+        Yield page texts in page order without blocking the event loop. At most
+        twice the worker count page ranges are in flight (and at most one rasterized
+        image per worker), so memory stays bounded for large scanned documents.
         """
-        images = convert_from_path(pdf_path)
-        text_parts = []
-
-        for img in images:
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
-            text = pytesseract.image_to_string(Image.open(io.BytesIO(img_byte_arr)), lang=self.ocr_language)
-            if text.strip():
-                text_parts.append(text.strip())
-
-        return "\n".join(text_parts)
+        loop = asyncio.get_running_loop()
+        executor = executor or get_process_pool()
+        num_pages = await loop.run_in_executor(None, self.page_count, pdf_path)
+        ranges = deque(page_ranges(num_pages))
+        window = max(2 * PDF_EXTRACT_WORKERS, 1)
+        in_flight: "deque[asyncio.Future]" = deque()
+        done = ocr_pages = 0
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < window:
+                    first, last = ranges.popleft()
+                    in_flight.append(loop.run_in_executor(
+                        executor, extract_pages, pdf_path, first, last, self.ocr_language, self.max_retries
+                    ))
+                for page in await in_flight.popleft():
+                    done += 1
+                    ocr_pages += page.ocr
+                    self._report(pdf_path, done, num_pages, page, ocr_pages)
+                    yield page.text
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    async def _collect_pages(self, pdf_path: str) -> List[str]:
+        return [page async for page in self.aiter_pages(pdf_path)]
 
     @classmethod
     def extract_content(cls, pdf_path: str) -> str:
         """
-        Extract text from a PDF using PyMuPDF, with OCR fallback.
+        Extract text from a PDF using PyMuPDF, with per-page OCR fallback.
         :param pdf_path: Path to the PDF file.
         :return: Extracted text.
         """
         extractor = cls()
-        errors = []
-
-        for attempt in range(extractor.max_retries):
-            try:
-                logger.info(f"Attempting text extraction for {pdf_path} (Attempt {attempt + 1})")
-
-                # Extract text using PyMuPDF
-                text = extractor._extract_text_pymupdf(pdf_path)
-
-                # If PyMuPDF fails, try OCR
-                if not text.strip():
-                    logger.warning(f"No text found with PyMuPDF, falling back to OCR for {pdf_path}")
-                    text = extractor._perform_ocr(pdf_path)
-
-                if text.strip():
-                    return text
-
-            except Exception as e:
-                error_msg = f"Attempt {attempt + 1} failed: {e}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-
-        raise HTTPException(status_code=400, detail=f"Failed to extract text after {extractor.max_retries} attempts: {', '.join(errors)}")
+        try:
+            logger.info(f"Attempting text extraction for {pdf_path}")
+            text = "\n".join(page for page in asyncio.run(extractor._collect_pages(pdf_path)) if page)
+        except Exception as e:
+            logger.error(f"Text extraction failed for {pdf_path}: {e}")
+            raise HTTPException(status_code=400, detail=f"Failed to extract text: {e}")
+
+        if not text.strip():
+            raise HTTPException(status_code=400, detail=f"No text extracted from PDF {pdf_path}")
+        return text
 
 if __name__ == "__main__":
     import sys
@@ -1,74 +1,144 @@
 # query_preprocessor.py
+import logging
 import re
 import string
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
+import threading
+from functools import lru_cache
+from typing import Callable, List, Optional
 
-# Download required NLTK data (do once somewhere in your app initialization)
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-nltk.download('wordnet', quiet=True)
+logger = logging.getLogger(__name__)
+
+# NLTK resources used here; fetched by `ensure_nltk_data()` at startup, never on import
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "wordnet": "corpora/wordnet",
+}
+
+REFERENCE_PATTERN = re.compile(r'(?:article|section)\s+\d+(?:\.\d+)*')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+NEXT_WORD_PATTERN = re.compile(r'\s*\S+')
+# Used when the punkt models are unavailable
+FALLBACK_TOKEN_PATTERN = re.compile(r"\w+(?:[-'.]\w+)*|[^\w\s]")
+CONTEXT_WORDS = 3  # words kept on each side of an article/section reference
+LEMMA_CACHE_SIZE = 50000
+
+
+def ensure_nltk_data(download: bool = True) -> List[str]:
+    """Check for the NLTK resources (downloading missing ones if allowed) and return those available."""
+    import nltk
+
+    available = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+            available.append(name)
+        except LookupError:
+            if download and nltk.download(name, quiet=True):
+                available.append(name)
+            else:
+                logger.warning(f"NLTK resource '{name}' is not available")
+    return available
 
 
 class QueryPreprocessor:
+    """
+    Normalizes English queries for BM25: keeps article/section references with
+    their surrounding words, drops a small stop word set and punctuation, and
+    lemmatizes verbs.
+
+    Stateless after `warm_up()`, so a single instance is shared across requests
+    (see `get_query_preprocessor`). Lemmas are memoized per token. Until
+    startup warm-up has loaded NLTK, queries are tokenized with the regex
+    fallback and not lemmatized; the request path never loads or downloads
+    NLTK data itself.
+    """
+
     def __init__(self):
-        self.lemmatizer = WordNetLemmatizer()
         # Reduce the stop words set to keep more meaningful terms
-        self.stop_words = {
+        self.stop_words = frozenset({
             'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at',
             'to', 'for', 'of', 'with', 'by','okay', 'ok', 'yes'
-        }
-        
+        })
+        self._tokenize: Callable[[str], List[str]] = FALLBACK_TOKEN_PATTERN.findall
+        self._lemmatize: Callable[[str], str] = lambda token: token
+        self._warm_lock = threading.Lock()
+        self._warmed = False
+
+    def warm_up(self, download: bool = True):
+        """Load the tokenizer and lemmatizer once (WordNet loads lazily on first use otherwise)."""
+        with self._warm_lock:
+            if self._warmed:
+                return
+            available = ensure_nltk_data(download)
+
+            if "punkt" in available or "punkt_tab" in available:
+                from nltk.tokenize import word_tokenize
+                self._tokenize = word_tokenize
+
+            if "wordnet" in available:
+                from nltk.stem import WordNetLemmatizer
+                lemmatizer = WordNetLemmatizer()
+                # Lighter lemmatization - only for verbs
+                self._lemmatize = lru_cache(maxsize=LEMMA_CACHE_SIZE)(
+                    lambda token: lemmatizer.lemmatize(token, pos='v')
+                )
+
+            self._warmed = True
+            # Touch every stage so the first real query pays no loading cost
+            self.preprocess_query("warm up the requirements in article 1")
+            logger.info(f"Query preprocessor ready (NLTK resources: {', '.join(available) or 'none'})")
+
     def preprocess_query(self, query: str) -> str:
         query = query.lower().strip()
-        
-        # First preserve article and section references with their context
-        # This will keep phrases like "requirements in article 10" intact
-        preserved_contexts = {}
-        context_counter = 0
-        
-        # Find article/section references with surrounding context (3 words before and after)
-        for pattern in [r'article\s+\d+(\.\d+)*', r'section\s+\d+(\.\d+)*']:
-            for match in re.finditer(pattern, query):
-                start, end = match.span()
-                
-                # Get surrounding words
-                before = query[:start].split()[-3:]
-                after = query[end:].split()[:3]
-                
-                # Create context phrase
-                context = ' '.join(before + [match.group()] + after).strip()
-                token = f"PRESERVED_CONTEXT_{context_counter}"
-                preserved_contexts[token] = context
-                
-                # Replace in query
-                query = query[:max(0, start - len(' '.join(before)) - 1)] + \
-                       f" {token} " + \
-                       query[min(len(query), end + len(' '.join(after)) + 1):]
-                context_counter += 1
-        
-        # Basic cleaning
-        tokens = word_tokenize(query)
-        processed_tokens = []
-        
-        for token in tokens:
-            if token in preserved_contexts:
-                processed_tokens.append(preserved_contexts[token])
-                continue
-                
+
+        # Preserve article and section references with their context, so phrases
+        # like "requirements in article 10" stay intact
+        parts: List[str] = []
+        position = 0
+        for match in REFERENCE_PATTERN.finditer(query):
+            if match.start() < position:
+                continue  # already inside a previous reference's context
+            before = query[position:match.start()].split()
+            after = query[match.end():].split()[:CONTEXT_WORDS]
+            kept_before = before[:-CONTEXT_WORDS] if len(before) > CONTEXT_WORDS else []
+            self._append_tokens(parts, " ".join(kept_before))
+            parts.append(" ".join(before[len(kept_before):] + [match.group()] + after))
+            position = self._end_of_words(query, match.end(), len(after))
+        self._append_tokens(parts, query[position:])
+
+        result = WHITESPACE_PATTERN.sub(" ", " ".join(parts)).strip()
+        logger.debug(f"Preprocessed query: {result}")
+        return result
+
+    def _append_tokens(self, parts: List[str], text: str):
+        for token in self._tokenize(text):
             # Keep more words by reducing stop word removal
             if token in self.stop_words or all(ch in string.punctuation for ch in token):
                 continue
-                
-            # Lighter lemmatization - only for verbs
-            lemmatized = self.lemmatizer.lemmatize(token, pos='v')
-            processed_tokens.append(lemmatized)
-            
-        result = " ".join(processed_tokens)
-        
-        # Clean up extra spaces
-        result = re.sub(r'\s+', ' ', result).strip()
-        print(f"Preprocessed query: {result}")
-        return result
\ No newline at end of file
+            parts.append(self._lemmatize(token))
+
+    @staticmethod
+    def _end_of_words(text: str, start: int, count: int) -> int:
+        """Offset just past the next `count` whitespace-separated words from `start`."""
+        position = start
+        for _ in range(count):
+            match = NEXT_WORD_PATTERN.match(text, position)
+            if match is None:
+                break
+            position = match.end()
+        return position
+
+
+_instance: Optional[QueryPreprocessor] = None
+_instance_lock = threading.Lock()
+
+
+def get_query_preprocessor() -> QueryPreprocessor:
+    """Process-wide shared preprocessor."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = QueryPreprocessor()
+    return _instance
@@ -1,25 +1,39 @@
 # rag_system.py
 from enum import global_str
 import os
-from typing import List, Dict, Any, Optional, Tuple
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
 import numpy as np
-import requests
-import spacy
-from sentence_transformers import SentenceTransformer
 import faiss
-from functools import lru_cache
 import re
 from dataclasses import dataclass
-from rank_bm25 import BM25Okapi
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+import functools
 import logging
+import threading
 from pathlib import Path
 import traceback
 
+from utils.bm25_index import IncrementalBM25
+from utils.bot_index import BotFilterIndex
+from utils.concurrency import MeteredExecutor, ReadWriteLock
+from utils.embedding_cache import EmbeddingCache
+from utils.segmenter import ARTICLE_PATTERN, iter_sentences
+from utils.stemmer_client import StemmerCache, StemmerClient
+from utils.token_chunker import TokenBudgetChunker
+from utils import index_factory
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upper bound on (queries x candidates) score cells per batched-search step
+SEARCH_BATCH_CELLS = int(os.getenv("SEARCH_BATCH_CELLS", str(8 * 1024 * 1024)))
+LIST_ITEM_PATTERN = re.compile(r'\d+\.')
+CONTINUATION_PATTERN = re.compile(r'[a-z]')
+
 @dataclass
 class ChunkMetadata:
     """Metadata for each chunk including original text and search-related info."""
@@ -31,6 +45,26 @@ class ChunkMetadata:
     embedding_idx: int
     language: str  # 'en' or 'am'
     special_matches: Dict[str, List[str]]
+    deleted: bool = False  # tombstone: the position is kept until compaction
+
+
+@dataclass
+class PreparedDocument:
+    """A chunked and embedded document, not yet added to the indices."""
+    doc_id: str
+    chunks: List[ChunkMetadata]
+    embeddings: np.ndarray
+    token_counts: Optional[List[int]] = None  # embedding-model tokens per chunk's processed text
+
+
+def _writes_state(method):
+    """Run a RAGProcessor method under the exclusive side of its state lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.state_lock.write():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class RAGProcessor:
     """
@@ -43,27 +77,52 @@ class RAGProcessor:
         stemmer_api_url = os.getenv("STEMMER_API_URL", "http://localhost:5000/api/stemmer/stem"),
         batch_size: int = 32,
         cache_dir: Optional[str] = None,
-        faiss_index: Optional[Any] = None
+        faiss_index: Optional[Any] = None,
+        embedding_workers: int = int(os.getenv("EMBEDDING_POOL_WORKERS", "0")),
+        chunking_mode: str = os.getenv("CHUNKING_MODE", "tokens")
     ):
-        # Initialize spacy for text processing
-        self.nlp = spacy.load("en_core_web_sm", disable=["ner", "parser"])
-        self.nlp.add_pipe("sentencizer")
-        
         # Initialize embedding model with caching
+        self.embedding_model_name = embedding_model_name
         self.embedding_model = self._initialize_embedding_model(embedding_model_name)
         self.embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
         self.stemmer_api_url = stemmer_api_url
         self.batch_size = batch_size
         
+        # Optional multi-process encode pool, started lazily on first large batch
+        self.embedding_workers = embedding_workers
+        self._embedding_pool = None
+        # The pool has one input and one output queue, so concurrent encodes could take
+        # each other's results; starting, using and stopping it is serialized
+        self._embedding_pool_lock = threading.Lock()
+        
+        # "tokens": pack chunks to the model's own token limit; "sentences": the older max_chunk_size packing.
+        # The tokenizer also measures truncation in either mode.
+        self.chunking_mode = chunking_mode
+        self.token_chunker = TokenBudgetChunker.for_model(
+            self.embedding_model,
+            max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "0")) or None,
+            overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "16"))
+        )
+        
         # Initialize FAISS index
-        self.index = faiss_index if faiss_index is not None else faiss.IndexFlatIP(self.embedding_dim)
+        self.index = faiss_index if faiss_index is not None else index_factory.new_index(self.embedding_dim)
+        self.index_version = 0  # bumped whenever the FAISS index is mutated or replaced
+        # Bumped whenever search results could change (index, BM25, metadata or bot access)
+        self.generation = 0
         
         
         # Initialize BM25
         self.tokenized_texts: List[List[str]] = []  # Store all tokenized texts
-        self.bm25: Optional[BM25Okapi] = None  # Will be initialized when we have documents
+        self.bm25: Optional[IncrementalBM25] = None  # Will be initialized when we have documents
         self.chunks_metadata: List[ChunkMetadata] = []
         
+        # bot_id -> chunk positions, used to pre-filter BM25 and FAISS
+        self.bot_index = BotFilterIndex()
+        self._bot_index_source: Optional[int] = None
+        # doc_id -> live chunk positions, for association and deletion
+        self._doc_positions: Dict[str, List[int]] = {}
+        self.num_deleted = 0
+        
         # Patterns for special matching
         self.special_patterns = {
             "article_ref": re.compile(r'article\s+\d+(\.\d+)*'),
@@ -74,55 +133,247 @@ class RAGProcessor:
         
         # Thread pool for parallel processing
         self.executor = ThreadPoolExecutor(max_workers=4)
+        # CPU stage of search (embedding, BM25, FAISS), kept off the event loop
+        self.search_executor = MeteredExecutor(int(os.getenv("SEARCH_WORKERS", "4")), "search")
+        # Searches share the indices; mutations take them exclusively
+        self.state_lock = ReadWriteLock()
+        # Guards lazily rebuilt derived structures (position indexes, boost and live caches)
+        self._derived_lock = threading.RLock()
         
         # Cache directory setup
         self.cache_dir = Path(cache_dir) if cache_dir else None
         if self.cache_dir:
             self.cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Persistent embedding cache keyed by (model, normalized text hash)
+        self.embedding_cache = EmbeddingCache(
+            self.cache_dir / "embedding_cache",
+            embedding_model_name,
+            self.embedding_dim,
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "200000"))
+        ) if self.cache_dir else None
+        
+        # Batched, cached client for the Amharic stemmer service
+        self.stemmer = StemmerClient(
+            stemmer_api_url,
+            cache=StemmerCache(
+                self.cache_dir / "stemmer_cache.sqlite" if self.cache_dir else None,
+                max_entries=int(os.getenv("STEMMER_CACHE_SIZE", "10000"))
+            ),
+            batch_size=int(os.getenv("STEMMER_BATCH_SIZE", "64")),
+            max_concurrency=int(os.getenv("STEMMER_MAX_CONCURRENCY", "4")),
+            timeout=float(os.getenv("STEMMER_TIMEOUT", "30"))
+        )
 
-    def _initialize_embedding_model(self, model_name: str) -> SentenceTransformer:
+    def _initialize_embedding_model(self, model_name: str) -> "SentenceTransformer":
         """Initialize the embedding model with caching."""
+        from sentence_transformers import SentenceTransformer
         return SentenceTransformer(model_name)
 
-    @lru_cache(maxsize=1024)
     def _get_embedding(self, text: str) -> np.ndarray:
-        """Get embedding for a single text with caching."""
-        return self.embedding_model.encode([text])[0]
+        """Get embedding for a single text (served from the embedding cache when possible)."""
+        return self._embed_texts([text])[0]
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode many texts in batches of `batch_size`, longest first so each batch
+        pads to similar lengths. Returns a contiguous float32 matrix in input order,
+        ready for faiss.normalize_L2.
+        """
+        if not texts:
+            return np.zeros((0, self.embedding_dim), dtype=np.float32)
+        if self.embedding_cache is None:
+            return self._encode_texts(texts)
+
+        # Unchanged texts (e.g. untouched articles of a re-uploaded document) are not re-encoded
+        embeddings, missing = self.embedding_cache.get_many(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = self._encode_texts(missing_texts)
+            embeddings[missing] = encoded
+            self.embedding_cache.put_many(missing_texts, encoded)
+        return embeddings
+
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Run the embedding model over `texts` (see _embed_texts)."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        sorted_texts = [texts[i] for i in order]
+
+        pool = self._get_embedding_pool() if len(texts) > self.batch_size else None
+        if pool is not None:
+            with self._embedding_pool_lock:
+                sorted_embeddings = self.embedding_model.encode_multi_process(
+                    sorted_texts, pool, batch_size=self.batch_size
+                )
+        else:
+            sorted_embeddings = self.embedding_model.encode(
+                sorted_texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        embeddings[order] = sorted_embeddings
+        return embeddings
+
+    def _get_embedding_pool(self):
+        """Start the multi-process encode pool on first use when configured."""
+        if self.embedding_workers <= 1:
+            return None
+        with self._embedding_pool_lock:
+            if self._embedding_pool is None:
+                try:
+                    self._embedding_pool = self.embedding_model.start_multi_process_pool(
+                        target_devices=["cpu"] * self.embedding_workers
+                    )
+                    logger.info(f"Started embedding pool with {self.embedding_workers} workers")
+                except Exception as e:
+                    logger.error(f"Failed to start embedding pool, encoding in-process: {e}")
+                    self.embedding_workers = 0
+                    return None
+            return self._embedding_pool
+
+    def close(self):
+        """Release worker pools held by the processor."""
+        with self._embedding_pool_lock:
+            if self._embedding_pool is not None:
+                self.embedding_model.stop_multi_process_pool(self._embedding_pool)
+                self._embedding_pool = None
+        self.executor.shutdown(wait=False)
+        self.search_executor.shutdown()
+        if self.embedding_cache is not None:
+            self.embedding_cache.flush()
     
+    @_writes_state
     def update_index(self, new_index):
         """Update the FAISS index reference"""
         self.index = new_index
+        self.index_version += 1
+        self.generation += 1
+
+    def maybe_rebuild_index(self, configured: str = index_factory.FAISS_INDEX_TYPE) -> bool:
+        """
+        Switch the FAISS index to the type configured for its current size
+        (e.g. flat -> IVF above the threshold), retraining on the stored vectors.
+        """
+        target = index_factory.needs_rebuild(self.index, configured)
+        if target is None:
+            return False
+        self.update_index(index_factory.rebuild_index(self.index, target))
+        return True
 
+    @property
+    def num_live_chunks(self) -> int:
+        with self._derived_lock:
+            self._ensure_position_indexes()
+            return len(self.chunks_metadata) - self.num_deleted
+
+    @_writes_state
     def update_bm25(self, corpus):
-        if corpus:
-            self.bm25 = BM25Okapi(corpus)
-        else:
-            self.bm25 = BM25Okapi([["placeholder"]])  # Fallback
+        """Rebuild the BM25 index from a full tokenized corpus (used on load). None marks a removed position."""
+        self.bm25 = IncrementalBM25()
+        self.bm25.add_documents(corpus or [])
+        self.generation += 1
 
 
     async def process_document(self, doc_id: str, text: str, language: str, bot_id: str) -> Dict[str, Any]:
         """Process a document asynchronously with smart chunking and parallel processing."""
+        async def single_page():
+            yield text
+        return await self.process_document_pages(doc_id, single_page(), language, bot_id)
+
+    async def process_document_pages(
+        self,
+        doc_id: str,
+        pages: AsyncIterator[str],
+        language: str,
+        bot_id: str
+    ) -> Dict[str, Any]:
+        """Prepare a document whose text arrives page by page and commit it on its own."""
+        prepared = await self.prepare_document_pages(doc_id, pages, language, bot_id)
+        return self.commit_documents([prepared])[0]
+
+    async def prepare_document_pages(
+        self,
+        doc_id: str,
+        pages: AsyncIterator[str],
+        language: str,
+        bot_id: str,
+        progress_callback: Optional[Callable[[int], None]] = None
+    ) -> PreparedDocument:
+        """
+        Chunk and embed a document whose text arrives page by page. Chunks are
+        stemmed/cleaned and embedded as soon as they are complete, overlapping with
+        extraction of later pages. Touches no index, so any number of documents can
+        be prepared concurrently; `commit_documents` then adds them to the indices.
+        `progress_callback` receives the number of chunks embedded so far.
+        """
         try:
-            # Generate chunks with proper boundaries
             bot_ids = [bot_id] if isinstance(bot_id, str) else bot_id
-            chunks = await self._generate_smart_chunks(text)
-            logger.info(f"Generated {len(chunks)} chunks for document {doc_id}")
-
-            # Process chunks in parallel
-            chunk_data = await self._process_chunks(doc_id, bot_ids, chunks, language)
-            
-            # Update search indices
-            self._update_search_indices(chunk_data)
+            loop = asyncio.get_running_loop()
+            chunk_data: List[ChunkMetadata] = []
+            embedding_batches: List[np.ndarray] = []
+            token_counts: Optional[List[int]] = [] if self.token_chunker is not None else None
             
-            # Store the processed chunks metadata
-            self.chunks_metadata.extend(chunk_data)  # Add this line
-            
-            # Return processed data
-            return {
-            "doc_id": doc_id,
-            "num_chunks": len(chunks),
+            async for chunks in self._stream_smart_chunks(pages, language=language):
+                # Process chunks in parallel
+                batch = await self._process_chunks(doc_id, bot_ids, chunks, language, first_chunk_id=len(chunk_data))
+                texts = [chunk.processed_text for chunk in batch]
+                embedding_batches.append(await loop.run_in_executor(self.executor, self._embed_texts, texts))
+                if token_counts is not None:
+                    token_counts.extend(await loop.run_in_executor(self.executor, self.token_chunker.count, texts))
+                chunk_data.extend(batch)
+                if progress_callback is not None:
+                    progress_callback(len(chunk_data))
+            logger.info(f"Generated {len(chunk_data)} chunks for document {doc_id}")
+            if not chunk_data:
+                raise ValueError(f"No text extracted for document {doc_id}")
+            return PreparedDocument(
+                doc_id=doc_id,
+                chunks=chunk_data,
+                embeddings=np.concatenate(embedding_batches),
+                token_counts=token_counts
+            )
+
+        except Exception as e:
+            logger.error(f"Error processing document {doc_id}: {e}")
+            raise
+
+    @_writes_state
+    def commit_documents(self, documents: List[PreparedDocument]) -> List[Dict[str, Any]]:
+        """
+        Add prepared documents to FAISS, BM25 and the chunks metadata as one ordered
+        batch, replacing earlier versions of the same documents. If a document
+        appears more than once, the last version wins. Returns one result per
+        input document.
+        """
+        latest = {document.doc_id: document for document in documents}
+        for doc_id in latest:
+            # Re-embedding replaces the document's previous chunks
+            replaced = self.remove_document(doc_id)
+            if replaced:
+                logger.info(f"Replacing {replaced} existing chunks of document {doc_id}")
+
+        # Positions are assigned only now, contiguously in batch order
+        chunk_data = [chunk for document in latest.values() for chunk in document.chunks]
+        for position, chunk in enumerate(chunk_data, start=len(self.chunks_metadata)):
+            chunk.embedding_idx = position
+        embeddings = np.concatenate([document.embeddings for document in latest.values()])
+
+        # One FAISS add and one BM25 append for the whole batch
+        self._update_search_indices(chunk_data, embeddings)
+        self._register_chunks(chunk_data)
+
+        results = {doc_id: self._document_result(document) for doc_id, document in latest.items()}
+        return [results[document.doc_id] for document in documents]
+
+    def _document_result(self, document: PreparedDocument) -> Dict[str, Any]:
+        return {
+            "doc_id": document.doc_id,
+            "num_chunks": len(document.chunks),
             "success": True,
-            "metadata": self._generate_doc_metadata(chunk_data),
+            "metadata": self._generate_doc_metadata(document.chunks, document.token_counts),
             "chunk_data": [
                 {
                     "doc_id": chunk.doc_id,
@@ -134,113 +385,200 @@ class RAGProcessor:
                     "special_matches": chunk.special_matches,
                     "language": chunk.language
                 }
-                for chunk in chunk_data
+                for chunk in document.chunks
             ]
         }
 
-        except Exception as e:
-            logger.error(f"Error processing document {doc_id}: {e}")
-            raise
+    @_writes_state
+    def _register_chunks(self, chunk_data: List[ChunkMetadata]):
+        """Append chunks at their embedding positions and index them by bot and document."""
+        self._ensure_position_indexes()
+        for chunk in chunk_data:
+            position = chunk.embedding_idx
+            self.chunks_metadata.append(chunk)
+            self.bot_index.add_chunk(position, chunk.bot_ids)
+            self._doc_positions.setdefault(chunk.doc_id, []).append(position)
+        self.generation += 1
 
-    def stem_text(self, text: str) -> str:
+    @_writes_state
+    def remove_document(self, doc_id: str) -> int:
         """
-        Directly call the stemmer API to stem the given text.
+        Tombstone every live chunk of a document: its vectors are removed from FAISS
+        and its postings from BM25, while positions stay stable until `compact()`.
+        Returns the number of chunks removed.
         """
-        try:
-            response = requests.post(self.stemmer_api_url, json={"text": text})
-            response.raise_for_status()
-            data = response.json()
-            stemmed_text = data.get("stemmedText", "")
-            logger.info(f"Stemming successful")
-            return stemmed_text if stemmed_text else text
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error communicating with the stemmer API: {e}")
-            return text  # Fallback: return original text
-
-    async def _generate_smart_chunks(self, text: str, max_chunk_size: int = 512) -> List[str]:
+        self._ensure_position_indexes()
+        positions = self._doc_positions.pop(doc_id, [])
+        if not positions:
+            return 0
+
+        for position in positions:
+            self.chunks_metadata[position].deleted = True
+            if self.bm25 is not None:
+                self.bm25.remove_document(position)
+            if position < len(self.tokenized_texts):
+                self.tokenized_texts[position] = []
+        self.bot_index.remove_positions(positions)
+        if index_factory.remove_ids(self.index, np.asarray(positions, dtype=np.int64)):
+            self.index_version += 1  # an HNSW index is unchanged and need not be saved again
+        self.generation += 1
+        self.num_deleted += len(positions)
+        return len(positions)
+
+    @_writes_state
+    def compact(self) -> Dict[int, int]:
+        """
+        Drop tombstoned positions and renumber live chunks densely, rebuilding
+        FAISS (under the new ids) and BM25. Returns the old -> new position mapping.
+        """
+        mapping: Dict[int, int] = {}
+        live_chunks = []
+        for position, chunk in enumerate(self.chunks_metadata):
+            if chunk.deleted:
+                continue
+            mapping[position] = len(live_chunks)
+            chunk.embedding_idx = len(live_chunks)
+            live_chunks.append(chunk)
+
+        index_type = index_factory.choose_index_type(len(live_chunks))
+        self.update_index(index_factory.rebuild_index(self.index, index_type, id_mapping=mapping))
+
+        self.chunks_metadata = live_chunks
+        self.tokenized_texts = [chunk.processed_text.split() for chunk in live_chunks]
+        self.update_bm25(self.tokenized_texts)
+        self.num_deleted = 0
+        self._ensure_position_indexes()
+        logger.info(f"Compacted indices to {len(live_chunks)} live chunks")
+        return mapping
+
+    async def stem_text(self, text: str) -> str:
+        """Stem text with the stemmer service (cached, with a local fallback)."""
+        return await self.stemmer.stem(text)
+
+    async def _generate_smart_chunks(self, text: str, max_chunk_size: int = 512, language: str = "en") -> List[str]:
         """
         Generate chunks with intelligent boundary detection that keeps related content together.
         """
-        def chunk_generator():
-            doc = self.nlp(text)
-            current_chunk = []
-            current_length = 0
-            current_article = None
+        # Process in thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
+        chunks = await loop.run_in_executor(self.executor, self._chunk_text, text, max_chunk_size, language)
+        return chunks
+
+    async def _stream_smart_chunks(
+        self,
+        pages: AsyncIterator[str],
+        max_chunk_size: int = 512,
+        language: str = "en"
+    ) -> AsyncIterator[List[str]]:
+        """
+        Chunk text arriving page by page, yielding the chunks completed by each page.
+        The last chunk of a page may continue on the next one, so it is carried over
+        and re-chunked together with the following page.
+        """
+        loop = asyncio.get_event_loop()
+        carry = ""
+        async for page_text in pages:
+            if not page_text.strip():
+                continue
+            text = f"{carry} {page_text}" if carry else page_text
+            chunks = await loop.run_in_executor(self.executor, self._chunk_text, text, max_chunk_size, language)
+            if not chunks:
+                continue
+            carry = chunks.pop()
+            if chunks:
+                yield chunks
+        if carry:
+            yield [carry]
+
+    def _chunk_text(self, text: str, max_chunk_size: int = 512, language: str = "en") -> List[str]:
+        """Chunk text to the embedding model's token budget, or by `max_chunk_size` in sentences mode."""
+        if self.chunking_mode == "tokens" and self.token_chunker is not None:
+            return self.token_chunker.chunks(text, language)
+        return list(self._chunk_generator(text, max_chunk_size, language))
+
+    def _chunk_generator(self, text: str, max_chunk_size: int = 512, language: str = "en"):
+        """
+        Split text into chunks of about `max_chunk_size` tokens at sentence boundaries,
+        starting new chunks at article headers. Sentences come from the rule-based
+        segmenter, which scans the text once and lazily.
+        """
+        current_chunk = []
+        current_lengths = []
+        current_length = 0
+        current_article = None
+        
+        for sent_text, sent_length in iter_sentences(text, language):
+            # Check if this sentence starts a new article
+            article_match = ARTICLE_PATTERN.match(sent_text)
             
-            for sent in doc.sents:
-                sent_text = sent.text.strip()
-                sent_length = len(sent)
-                
-                # Check if this sentence starts a new article
-                article_match = self.special_patterns["article_ref"].match(sent_text)
-                
-                # Decision logic for chunking
-                should_start_new_chunk = False
-                
-                if article_match:
-                    # If we're starting a new article and have content, finish current chunk
-                    if current_chunk:
-                        should_start_new_chunk = True
-                    current_article = article_match.group()
-                else:
-                    # For non-article-starting sentences, check size limits
-                    if current_length + sent_length > max_chunk_size:
-                        # Before creating a new chunk, look ahead to see if this sentence
-                        # is part of a list or continuing content
-                        is_list_item = bool(re.match(r'^\d+\.', sent_text))
-                        is_continuing = bool(re.match(r'^[a-z]', sent_text))
-                        
-                        # If it's a list item or continuing content and we haven't exceeded
-                        # max_chunk_size by too much, keep it in current chunk
-                        if (is_list_item or is_continuing) and current_length + sent_length < max_chunk_size * 1.5:
-                            should_start_new_chunk = False
-                        else:
-                            should_start_new_chunk = True
-                
-                # Handle chunk creation
-                if should_start_new_chunk and current_chunk:
-                    yield " ".join(current_chunk)
-                    current_chunk = []
-                    current_length = 0
-                
-                # Add the current sentence to the chunk
-                if article_match:
-                    # For article headers, include context from previous chunk if it exists
-                    context_window = 2  # Number of sentences to include for context
-                    if current_chunk and len(current_chunk) > context_window:
-                        context = current_chunk[-context_window:]
-                        current_chunk = context + [sent_text]
-                        current_length = sum(len(s) for s in current_chunk)
+            # Decision logic for chunking
+            should_start_new_chunk = False
+            
+            if article_match:
+                # If we're starting a new article and have content, finish current chunk
+                if current_chunk:
+                    should_start_new_chunk = True
+                current_article = article_match.group()
+            else:
+                # For non-article-starting sentences, check size limits
+                if current_length + sent_length > max_chunk_size:
+                    # Before creating a new chunk, look ahead to see if this sentence
+                    # is part of a list or continuing content
+                    is_list_item = bool(LIST_ITEM_PATTERN.match(sent_text))
+                    is_continuing = bool(CONTINUATION_PATTERN.match(sent_text))
+                    
+                    # If it's a list item or continuing content and we haven't exceeded
+                    # max_chunk_size by too much, keep it in current chunk
+                    if (is_list_item or is_continuing) and current_length + sent_length < max_chunk_size * 1.5:
+                        should_start_new_chunk = False
                     else:
-                        current_chunk.append(sent_text)
-                        current_length = sent_length
-                else:
-                    current_chunk.append(sent_text)
-                    current_length += sent_length
+                        should_start_new_chunk = True
             
-            # Don't forget the last chunk
-            if current_chunk:
+            # Handle chunk creation
+            if should_start_new_chunk and current_chunk:
                 yield " ".join(current_chunk)
-
-        # Process in thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        chunks = await loop.run_in_executor(self.executor, 
-                                        lambda: list(chunk_generator()))
-        return chunks
+                current_chunk = []
+                current_lengths = []
+                current_length = 0
+            
+            # Add the current sentence to the chunk
+            if article_match:
+                # For article headers, include context from previous chunk if it exists
+                context_window = 2  # Number of sentences to include for context
+                if current_chunk and len(current_chunk) > context_window:
+                    current_chunk = current_chunk[-context_window:] + [sent_text]
+                    current_lengths = current_lengths[-context_window:] + [sent_length]
+                    current_length = sum(current_lengths)
+                else:
+                    current_chunk.append(sent_text)
+                    current_lengths.append(sent_length)
+                    current_length = sent_length
+            else:
+                current_chunk.append(sent_text)
+                current_lengths.append(sent_length)
+                current_length += sent_length
+        
+        # Don't forget the last chunk
+        if current_chunk:
+            yield " ".join(current_chunk)
 
     async def _process_chunks(
     self, 
     doc_id: str,
     bot_ids: List[str],  # Changed parameter type to List
     chunks: List[str], 
-    language: str = "en"
+    language: str = "en",
+    first_chunk_id: int = 0
 ) -> List[ChunkMetadata]:
         """Process chunks in parallel based on the specified language."""
         
+        # Amharic chunks are stemmed in batched requests up front rather than one call per chunk
+        stemmed = await self.stemmer.stem_many(chunks) if language == "amh" else None
+        
         async def process_chunk(chunk: str, chunk_id: int, bot_ids: List[str], language: str = "en") -> ChunkMetadata:
             # Function signature fixed to use bot_ids
             if language == "amh":
-                processed_text = self.stem_text(chunk)
+                processed_text = stemmed[chunk_id - first_chunk_id]
             else:
                 processed_text = await self._clean_text(chunk)
             
@@ -262,7 +600,7 @@ class RAGProcessor:
             )
         
         # Pass the language parameter to process_chunk
-        tasks = [process_chunk(chunk, i, bot_ids, language) for i, chunk in enumerate(chunks)]
+        tasks = [process_chunk(chunk, first_chunk_id + i, bot_ids, language) for i, chunk in enumerate(chunks)]
         return await asyncio.gather(*tasks)
 
     async def _clean_text(self, text: str) -> str:
@@ -293,8 +631,9 @@ class RAGProcessor:
 
         return text
 
-    def _update_search_indices(self, chunk_data: List[ChunkMetadata]):
-        """Update both BM25 and FAISS indices."""
+    @_writes_state
+    def _update_search_indices(self, chunk_data: List[ChunkMetadata], embeddings: Optional[np.ndarray] = None):
+        """Update both BM25 and FAISS indices, embedding the chunks unless `embeddings` are given."""
         try:
             # Process new texts for BM25
             new_tokenized_texts = [
@@ -305,17 +644,19 @@ class RAGProcessor:
             # Add to our stored tokenized texts
             self.tokenized_texts.extend(new_tokenized_texts)
             
-            # Reinitialize BM25 with all texts
-            if len(self.tokenized_texts) > 0:
-                self.bm25 = BM25Okapi(self.tokenized_texts)
+            # Append only the new chunks' postings to BM25
+            if self.bm25 is None:
+                self.bm25 = IncrementalBM25()
+            self.bm25.add_documents(new_tokenized_texts)
             
-            # Update FAISS
-            embeddings = np.vstack([
-                self._get_embedding(chunk.processed_text)
-                for chunk in chunk_data
-            ])
+            # Update FAISS, addressing each vector by its chunk position
+            if embeddings is None:
+                embeddings = self._embed_texts([chunk.processed_text for chunk in chunk_data])
             faiss.normalize_L2(embeddings)
-            self.index.add(embeddings)
+            ids = np.fromiter((chunk.embedding_idx for chunk in chunk_data), dtype=np.int64, count=len(chunk_data))
+            self.index.add_with_ids(embeddings, ids)
+            self.index_version += 1
+            self.generation += 1
             
             logger.info(
                 f"Updated indices - BM25 corpus size: {len(self.tokenized_texts)}, "
@@ -330,15 +671,18 @@ class RAGProcessor:
     async def clear_indices(self):
         """Clear all indices and stored data."""
         try:
-            # Clear FAISS index
-            self.index = faiss.IndexFlatIP(self.embedding_dim)
+            with self.state_lock.write():
+                # Clear FAISS index
+                self.update_index(index_factory.new_index(self.embedding_dim))
             
-            # Clear BM25 data
-            self.tokenized_texts = []
-            self.bm25 = None
+                # Clear BM25 data
+                self.tokenized_texts = []
+                self.bm25 = None
             
-            # Clear metadata
-            self.chunks_metadata = []
+                # Clear metadata
+                self.chunks_metadata = []
+                self.num_deleted = 0
+                self._ensure_position_indexes()
             
             logger.info("All indices cleared successfully")
         except Exception as e:
@@ -348,23 +692,35 @@ class RAGProcessor:
     async def add_bot_to_documents(self, doc_ids: List[str], bot_id: str) -> int:
         """
         Add a bot ID to existing documents.
-        Returns the number of chunks modified.
+        Returns the number of chunks modified. The exclusive state lock is taken
+        on `search_executor`, so the event loop does not wait for in-flight searches.
         """
         if not bot_id:
             raise ValueError("bot_id cannot be empty")
-            
+        return await self.search_executor.run(self.add_bot, doc_ids, bot_id)
+
+    @_writes_state
+    def add_bot(self, doc_ids: List[str], bot_id: str) -> int:
+        """Blocking form of `add_bot_to_documents`."""
+        self._ensure_position_indexes()
         modified_count = 0
-        for chunk in self.chunks_metadata:
-            if chunk.doc_id in doc_ids:
+        positions = []
+        for doc_id in set(doc_ids):
+            for position in self._doc_positions.get(doc_id, []):
+                chunk = self.chunks_metadata[position]
                 # Initialize bot_ids as empty list if it doesn't exist
                 if not hasattr(chunk, 'bot_ids'):
                     chunk.bot_ids = []
-                    
+
                 # Add bot_id if not already present
                 if bot_id not in chunk.bot_ids:
                     chunk.bot_ids.append(bot_id)
                     modified_count += 1
-                
+                # Chunks of a document may share one bot_ids list, so index every match
+                positions.append(position)
+        self.bot_index.add_bot(bot_id, positions)
+        self.generation += 1
+
         logger.info(f"Added bot {bot_id} to {modified_count} document chunks")
         return modified_count
 
@@ -373,92 +729,313 @@ class RAGProcessor:
     query: str,
     top_k: int = 5,
     semantic_weight: float = 0.5,
-    bot_id: Optional[str] = None
+    bot_id: Optional[str] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
 ) -> List[Dict[str, Any]]:
+        """
+        Hybrid search. Query cleaning/stemming is awaited here; embedding, BM25
+        and FAISS scoring run on `search_executor` so the event loop stays free.
+        """
         try:
             # Validate inputs
             if top_k <= 0:
                 raise ValueError("top_k must be greater than 0")
             
-            if not self.chunks_metadata:
+            if not self.num_live_chunks:
                 logger.warning("Search attempted with empty chunks metadata")
                 return []
 
             # Clean and preprocess query
-            if self.nlp.meta["lang"] == "en":
-                cleaned_query = await self._clean_text(query)
-            else:
-                cleaned_query = self.stem_text(query)
+            cleaned_query = await self._clean_text(query)
 
-            # KEY CHANGE: Check if bot_id is in the bot_ids list
-            allowed_indices = [
-                idx for idx, chunk in enumerate(self.chunks_metadata)
-                if not bot_id or bot_id in chunk.bot_ids
-            ]
+            return await self.search_executor.run(
+                self._search_sync, cleaned_query, top_k, semantic_weight, bot_id, nprobe, ef_search
+            )
+
+        except Exception as e:
+            logger.error(f"Search error: {str(e)}\n{traceback.format_exc()}")
+            raise
+
+    def _search_sync(
+        self,
+        cleaned_query: str,
+        top_k: int,
+        semantic_weight: float,
+        bot_id: Optional[str],
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """CPU stage of `search`. The indices are read under the shared side of the state lock."""
+        # The model needs no index state, so the embedding is computed before taking the lock
+        query_embedding = self._get_embedding(cleaned_query).reshape(1, -1).astype(np.float32)
+        faiss.normalize_L2(query_embedding)
+
+        with self.state_lock.read():
+            # KEY CHANGE: Only chunks whose bot_ids contain bot_id are candidates
+            candidates = self._candidate_positions(bot_id)
         
-            if not allowed_indices:
+            if candidates.size == 0:
                 logger.info(f"No documents found for bot {bot_id}" if bot_id else "No documents in index")
                 return []
 
-            # Get BM25 scores
+            # Get BM25 scores for the candidates only
             tokenized_query = cleaned_query.split()
             if self.bm25:
-                bm25_scores = self.bm25.get_scores(tokenized_query)
+                bm25_scores = self.bm25.get_scores(tokenized_query, candidates)
             else:
-                bm25_scores = np.zeros(len(self.chunks_metadata))
+                bm25_scores = np.zeros(candidates.size, dtype=np.float32)
                 logger.warning("BM25 index not initialized")
 
-            # Get semantic scores
-            query_embedding = self._get_embedding(cleaned_query).reshape(1, -1)
-            faiss.normalize_L2(query_embedding)
-            distances, indices = self.index.search(query_embedding, self.index.ntotal)
-
-            # Combine scores efficiently using numpy
-            valid_scores = []
-            for idx in allowed_indices:
-                semantic_pos = np.where(indices[0] == idx)[0]
-                if semantic_pos.size == 0:
-                    continue  # Skip chunks not in semantic results
-                    
-                semantic_score = distances[0][semantic_pos[0]]
-                bm25_score = bm25_scores[idx]
-                
-                # Normalize scores
-                norm_bm25 = (bm25_score - np.min(bm25_scores)) / (np.max(bm25_scores) - np.min(bm25_scores) + 1e-9)
-                norm_semantic = (semantic_score + 1) / 2  # Convert cosine to [0,1]
-                
-                # Calculate dynamic boost from special matches
-                boost = 1.0 + 0.1 * sum(
-                    len(matches) 
-                    for matches in self.chunks_metadata[idx].special_matches.values()
+            # Get semantic scores, restricting FAISS to the candidates
+            semantic_scores = self._semantic_scores(
+                query_embedding, candidates, top_k, nprobe=nprobe, ef_search=ef_search
+            )[0]
+
+            final_scores = self._hybrid_scores(
+                semantic_scores, bm25_scores, candidates, semantic_weight
+            )
+            return self._format_results(self._top_k(final_scores, candidates, top_k))
+
+    async def search_many(
+        self,
+        queries: List[str],
+        bot_ids: Optional[List[Optional[str]]] = None,
+        top_k: int = 5,
+        semantic_weight: float = 0.5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Hybrid search for many queries at once, each with its own optional bot
+        filter; returns one result list per query, as `search` would. Queries are
+        cleaned in one executor call and embedded in one encode call. Queries that
+        share a bot filter are scored together: one FAISS search over their query
+        matrix and one BM25 pass over the postings of their combined terms.
+        """
+        if top_k <= 0:
+            raise ValueError("top_k must be greater than 0")
+        if bot_ids is not None and len(bot_ids) != len(queries):
+            raise ValueError("bot_ids must have one entry per query")
+        if not queries or not self.num_live_chunks:
+            return [[] for _ in queries]
+
+        loop = asyncio.get_running_loop()
+        cleaned_queries = await loop.run_in_executor(
+            self.executor, lambda: [self._clean_text_sync(query) for query in queries]
+        )
+        return await self.search_executor.run(
+            self._search_many_sync, cleaned_queries, bot_ids or [None] * len(queries),
+            top_k, semantic_weight, nprobe, ef_search
+        )
+
+    def _search_many_sync(
+        self,
+        cleaned_queries: List[str],
+        bot_ids: List[Optional[str]],
+        top_k: int,
+        semantic_weight: float,
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> List[List[Dict[str, Any]]]:
+        """CPU stage of `search_many`, under the shared side of the state lock."""
+        query_embeddings = np.ascontiguousarray(self._embed_texts(cleaned_queries), dtype=np.float32)
+        faiss.normalize_L2(query_embeddings)
+
+        groups: Dict[Optional[str], List[int]] = {}
+        for row, bot_id in enumerate(bot_ids):
+            groups.setdefault(bot_id or None, []).append(row)
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in cleaned_queries]
+        with self.state_lock.read():
+            for bot_id, rows in groups.items():
+                candidates = self._candidate_positions(bot_id)
+                if candidates.size == 0:
+                    continue
+                # Bound the score matrices for large candidate sets
+                step = max(1, SEARCH_BATCH_CELLS // candidates.size)
+                for first in range(0, len(rows), step):
+                    batch = rows[first:first + step]
+                    if self.bm25:
+                        bm25_scores = self.bm25.get_scores_many(
+                            [cleaned_queries[row].split() for row in batch], candidates
+                        )
+                    else:
+                        bm25_scores = np.zeros((len(batch), candidates.size), dtype=np.float32)
+                    semantic_scores = self._semantic_scores(
+                        query_embeddings[batch], candidates, top_k, nprobe=nprobe, ef_search=ef_search
+                    )
+                    final_scores = self._hybrid_scores(
+                        semantic_scores, bm25_scores, candidates, semantic_weight
+                    )
+                    for row, scores in zip(batch, final_scores):
+                        results[row] = self._format_results(self._top_k(scores, candidates, top_k))
+        return results
+
+    def _format_results(self, top_results: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Result dicts with chunk metadata for (position, score) pairs."""
+        return [{
+            "doc_id": self.chunks_metadata[idx].doc_id,
+            "bot_ids": self.chunks_metadata[idx].bot_ids,
+            "chunk_id": self.chunks_metadata[idx].chunk_id,
+            "text": self.chunks_metadata[idx].original_text,
+            "score": float(score),
+            "language": self.chunks_metadata[idx].language,
+            "special_matches": self.chunks_metadata[idx].special_matches
+        } for idx, score in top_results]
+
+    def _ensure_position_indexes(self):
+        """Rebuild the bot and document position indexes if chunks metadata was replaced wholesale (e.g. on load)."""
+        with self._derived_lock:
+            if self._bot_index_source != id(self.chunks_metadata) or \
+                    self.bot_index.indexed_count != len(self.chunks_metadata):
+                self.bot_index.rebuild(self.chunks_metadata)
+                self._doc_positions = {}
+                self.num_deleted = 0
+                for position, chunk in enumerate(self.chunks_metadata):
+                    if chunk.deleted:
+                        self.num_deleted += 1
+                    else:
+                        self._doc_positions.setdefault(chunk.doc_id, []).append(position)
+                self._bot_index_source = id(self.chunks_metadata)
+                self._live_cache_key = None
+
+    def _live_positions(self) -> np.ndarray:
+        """Sorted positions of chunks that are not tombstoned."""
+        cache_key = (id(self.chunks_metadata), len(self.chunks_metadata), self.num_deleted)
+        with self._derived_lock:
+            if getattr(self, "_live_cache_key", None) != cache_key:
+                self._live_cache = self._compute_live_positions()
+                self._live_cache_key = cache_key
+            return self._live_cache
+
+    def _compute_live_positions(self) -> np.ndarray:
+        if self.num_deleted:
+            return np.flatnonzero(np.fromiter(
+                (not chunk.deleted for chunk in self.chunks_metadata),
+                dtype=bool,
+                count=len(self.chunks_metadata)
+            )).astype(np.int64)
+        return np.arange(len(self.chunks_metadata), dtype=np.int64)
+
+    def _candidate_positions(self, bot_id: Optional[str]) -> np.ndarray:
+        """Sorted chunk positions a query may return."""
+        self._ensure_position_indexes()
+        if not bot_id:
+            return self._live_positions()
+        positions = self.bot_index.positions(bot_id)
+        return positions[positions < len(self.chunks_metadata)]
+
+    def _semantic_scores(
+        self,
+        query_embeddings: np.ndarray,
+        candidates: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Cosine scores of the candidates for each query row, as a (queries x candidates)
+        matrix aligned with `candidates`; NaN where FAISS returned no hit. All rows go
+        through one search call. A subset is searched through an IDSelector so other
+        vectors are never scored. Flat indexes score every candidate; approximate
+        indexes return a bounded number of nearest neighbours.
+        """
+        k = index_factory.semantic_k(self.index, candidates.size, top_k)
+        restricted = candidates.size < self.index.ntotal
+        selector = faiss.IDSelectorBatch(candidates) if restricted else None
+        params = index_factory.search_parameters(
+            self.index, k, selector, nprobe=nprobe, ef_search=ef_search
+        )
+        try:
+            distances, indices = self.index.search(query_embeddings, k, params=params)
+        except RuntimeError:
+            # Index type without selector support: search without it and filter below
+            params = index_factory.search_parameters(self.index, k, nprobe=nprobe, ef_search=ef_search)
+            distances, indices = self.index.search(
+                query_embeddings, self.index.ntotal if params is None else k, params=params
+            )
+
+        scores = np.full((query_embeddings.shape[0], candidates.size), np.nan, dtype=np.float32)
+        rows = np.broadcast_to(np.arange(indices.shape[0])[:, None], indices.shape)
+        valid = indices >= 0
+        rows, hits, hit_scores = rows[valid], indices[valid], distances[valid]
+        slots = np.searchsorted(candidates, hits)
+        in_range = slots < candidates.size
+        in_range[in_range] = candidates[slots[in_range]] == hits[in_range]
+        scores[rows[in_range], slots[in_range]] = hit_scores[in_range]
+        return scores
+
+    def _hybrid_scores(
+        self,
+        semantic_scores: np.ndarray,
+        bm25_scores: np.ndarray,
+        candidates: np.ndarray,
+        semantic_weight: float
+    ) -> np.ndarray:
+        """
+        Fuse semantic and BM25 scores of the candidates in one pass, for one query
+        or row-wise for a (queries x candidates) matrix.
+
+        Approximate indexes only return a bounded set of neighbours. Candidates
+        FAISS did not return are given the lowest semantic score it returned for
+        that query, so strong lexical matches still rank; candidates with neither
+        a semantic hit nor a BM25 match are returned as -inf.
+        """
+        missing = np.isnan(semantic_scores)
+        if missing.any():
+            hit_rows = ~missing.all(axis=-1, keepdims=True)
+            floor = np.where(
+                hit_rows,
+                np.where(missing, np.inf, semantic_scores).min(axis=-1, keepdims=True),
+                -1.0
+            )
+            semantic_scores = np.where(missing, floor, semantic_scores)
+
+        # Normalize scores (per query)
+        bm25_min = bm25_scores.min(axis=-1, keepdims=True)
+        bm25_max = bm25_scores.max(axis=-1, keepdims=True)
+        norm_bm25 = (bm25_scores - bm25_min) / (bm25_max - bm25_min + 1e-9)
+        norm_semantic = (semantic_scores + 1) / 2  # Convert cosine to [0,1]
+
+        # Combine scores with weights and boost from special matches
+        final_scores = (
+            semantic_weight * norm_semantic +
+            (1 - semantic_weight) * norm_bm25
+        ) * self._special_match_boosts()[candidates]
+
+        return np.where(missing & (bm25_scores <= 0), -np.inf, final_scores)
+
+    def _special_match_boosts(self) -> np.ndarray:
+        """Per-position boost factors, recomputed only when the metadata list changes."""
+        cache_key = (id(self.chunks_metadata), len(self.chunks_metadata))
+        with self._derived_lock:
+            if getattr(self, "_boost_cache_key", None) != cache_key:
+                self._boost_cache = np.fromiter(
+                    (
+                        1.0 + 0.1 * sum(len(matches) for matches in chunk.special_matches.values())
+                        for chunk in self.chunks_metadata
+                    ),
+                    dtype=np.float32,
+                    count=len(self.chunks_metadata)
                 )
-                
-                # Combine scores with weights and boost
-                final_score = (
-                    semantic_weight * norm_semantic +
-                    (1 - semantic_weight) * norm_bm25
-                ) * boost
-                
-                valid_scores.append((idx, final_score))
-
-            # Sort and select top results
-            valid_scores.sort(key=lambda x: x[1], reverse=True)
-            top_results = valid_scores[:top_k]
-
-            # Format results with chunk metadata
-            return [{
-                "doc_id": self.chunks_metadata[idx].doc_id,
-                "bot_ids": self.chunks_metadata[idx].bot_ids,
-                "chunk_id": self.chunks_metadata[idx].chunk_id,
-                "text": self.chunks_metadata[idx].original_text,
-                "score": float(score),
-                "language": self.chunks_metadata[idx].language,
-                "special_matches": self.chunks_metadata[idx].special_matches
-            } for idx, score in top_results]
+                self._boost_cache_key = cache_key
+            return self._boost_cache
 
-        except Exception as e:
-            logger.error(f"Search error: {str(e)}\n{traceback.format_exc()}")
-            raise
+    @staticmethod
+    def _top_k(scores: np.ndarray, candidates: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """Select the top_k candidate positions by score, best first."""
+        finite = np.isfinite(scores)
+        candidates, candidate_scores = candidates[finite], scores[finite]
+        if candidates.size == 0:
+            return []
+
+        if candidates.size > top_k:
+            part = np.argpartition(-candidate_scores, top_k - 1)[:top_k]
+            candidates, candidate_scores = candidates[part], candidate_scores[part]
+
+        order = np.argsort(-candidate_scores, kind="stable")
+        return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
 
     def _calculate_boost(self, query: str, chunk: ChunkMetadata) -> float:
         """Calculate boost factor based on special matches."""
@@ -479,9 +1056,13 @@ class RAGProcessor:
             
         return boost
 
-    def _generate_doc_metadata(self, chunk_data: List[ChunkMetadata]) -> Dict[str, Any]:
-        """Generate document metadata and statistics."""
-        return {
+    def _generate_doc_metadata(
+        self,
+        chunk_data: List[ChunkMetadata],
+        token_counts: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        """Generate document metadata and statistics, including how much text the model truncates."""
+        metadata = {
             "num_chunks": len(chunk_data),
             "avg_chunk_length": np.mean([
                 len(chunk.original_text.split()) 
@@ -495,6 +1076,19 @@ class RAGProcessor:
                 for pattern in self.special_patterns
             }
         }
+        if token_counts:
+            limit = self.token_chunker.limit
+            truncated = [count - limit for count in token_counts if count > limit]
+            metadata["tokens"] = {
+                "chunking_mode": self.chunking_mode,
+                "model_limit": limit,
+                "avg_chunk_tokens": round(float(np.mean(token_counts)), 1),
+                "max_chunk_tokens": int(max(token_counts)),
+                "truncated_chunks": len(truncated),
+                "truncated_tokens": int(sum(truncated)),
+                "truncated_ratio": round(sum(truncated) / sum(token_counts), 4)
+            }
+        return metadata
 
     async def save_state(self, path: str):
         """Save index state to disk."""
@@ -0,0 +1,76 @@
+# result_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class QueryResultCache:
+    """
+    TTL + LRU cache for retrieval results.
+
+    Entries belong to an index generation: the first lookup or insert with a
+    newer generation drops everything cached for older ones, so results never
+    outlive a change to the indices they were computed from. Generations only
+    grow, so a result computed against an older generation (a search that
+    raced a commit) is not cached, and looking one up is a miss.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()  # key -> (expires_at, value), LRU first
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key) if self._sync_generation(generation) else None
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if not self._sync_generation(generation):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _sync_generation(self, generation: int) -> bool:
+        """Advance to `generation`, dropping older entries. False if it is older than the current one."""
+        if self._generation is not None and generation < self._generation:
+            return False
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "generation": self._generation,
+        }
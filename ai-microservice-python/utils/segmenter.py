@@ -0,0 +1,74 @@
+# segmenter.py
+import re
+from typing import Iterator, Tuple
+
+# Sentence-final punctuation: Latin, plus the Ethiopic full stop (።), question mark (፧)
+# and paragraph separator (፨); closing quotes/brackets stay with their sentence
+SENTENCE_END_PATTERN = re.compile(r'[.!?።፧፨]+["\'”’)\]]*(?=\s)|\n[ \t]*\n\s*')
+# Article headers that start a new chunk, e.g. "Article 12", "ARTICLE 4.2", "አንቀጽ 5"
+ARTICLE_PATTERN = re.compile(r'(?:article|አንቀጽ)\s*\d+(?:\.\d+)*', re.IGNORECASE)
+# Roughly what a word tokenizer counts: words (any script), numbers and single punctuation marks
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+LAST_WORD_PATTERN = re.compile(r'(\S+)\s*$')
+NUMBERED_LINE_PATTERN = re.compile(r'\n[ \t]*\(?(?:\d+(?:\.\d+)*|[a-z])\)?\.(?=\s)', re.IGNORECASE)
+# List and clause numbering opening a sentence ("1.", "2.3.", "(a).", "iv."), whose period is not a sentence end
+ENUMERATOR_PATTERN = re.compile(r'\(?(?:\d+(?:\.\d+)*|[a-z]|(?=[ivx])x{0,3}(?:ix|iv|v?i{0,3}))\)?\.', re.IGNORECASE)
+ENGLISH_ABBREVIATIONS = frozenset({
+    "art.", "arts.", "sec.", "no.", "nos.", "para.", "paras.", "cl.", "ch.", "p.", "pp.", "vol.",
+    "proc.", "reg.", "cf.", "e.g.", "i.e.", "etc.", "viz.", "vs.", "v.", "mr.", "mrs.", "ms.",
+    "dr.", "prof.", "st.", "co.", "ltd.", "inc.", "jan.", "feb.", "mar.", "apr.", "jun.", "jul.",
+    "aug.", "sep.", "sept.", "oct.", "nov.", "dec.",
+})
+# Amharic text ends sentences with ።; Latin periods mostly appear in dotted abbreviations
+AMHARIC_ABBREVIATIONS = frozenset({"ዓ.ም.", "ዓ.ዓ.", "ክ.ዘ.", "ት.ቤት.", "ቁ.", "ገጽ."})
+ABBREVIATIONS = {"en": ENGLISH_ABBREVIATIONS, "amh": AMHARIC_ABBREVIATIONS | ENGLISH_ABBREVIATIONS}
+
+
+def count_tokens(text: str) -> int:
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+
+def _ends_sentence(text: str, start: int, end: int, language: str) -> bool:
+    """Whether the period (or other sentence-final mark) ending at `end` closes the sentence begun at `start`."""
+    match = LAST_WORD_PATTERN.search(text, max(start, end - 64), end)
+    if match is None:
+        return True
+    word = match.group(1)
+    if not word.endswith("."):
+        return True  # ! ? ። ፧ ፨
+    if word.lower() in ABBREVIATIONS.get(language, ENGLISH_ABBREVIATIONS):
+        return False
+    # "1." or "(b)." opening a sentence numbers it; "Article 3." heads the sentence that follows
+    if ENUMERATOR_PATTERN.fullmatch(word) and not text[start:match.start()].strip():
+        return False
+    return not ARTICLE_PATTERN.fullmatch(text[start:end].strip().rstrip("."))
+
+
+def _emit(text: str, start: int, end: int) -> Iterator[Tuple[str, int]]:
+    sentence = text[start:end].strip()
+    if sentence:
+        yield sentence, count_tokens(sentence)
+
+
+def iter_sentences(text: str, language: str = "en") -> Iterator[Tuple[str, int]]:
+    """
+    Lazily split text into (sentence, token count) pairs with a single regex
+    scan, without building a parsed document, so memory stays bounded by the
+    longest sentence however large the text is. Boundaries are sentence-final
+    punctuation followed by whitespace (skipping abbreviations and clause
+    numbering), blank lines, and line breaks before a numbered clause.
+    """
+    start = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        end = match.end()
+        if match.group()[0] == ".":
+            # A numbered clause starting on a new line closes whatever precedes it
+            numbered = NUMBERED_LINE_PATTERN.search(text, start, end + 1)
+            if numbered is not None:
+                yield from _emit(text, start, numbered.start())
+                start = numbered.start()
+            if not _ends_sentence(text, start, end, language):
+                continue
+        yield from _emit(text, start, end)
+        start = end
+    yield from _emit(text, start, len(text))
@@ -0,0 +1,278 @@
+# stemmer_client.py
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Expanded before stemming, as the stemmer service does
+AMHARIC_ABBREVIATIONS = {
+    "ት/ቤት": "ትምህርት ቤት",
+    "ት/ርት": "ትምህርት",
+    "መ/ቤት": "መስሪያ ቤት",
+    "ክ/ከተማ": "ክፍለ ከተማ",
+    "ፍ/ቤት": "ፍርድ ቤት",
+    "ጽ/ቤት": "ጽህፈት ቤት",
+    "ጠ/ሚንስትር": "ጠቅላይ ሚኒስተር",
+    "ዶ/ር": "ዶክተር",
+    "ም/ቤት": "ምክር ቤተ",
+    "ሚ/ር": "ሚኒስትር",
+    "አ/አ": "አዲስ ኣበባ",
+    "ዓ.ም.": "ዓመተ ምህረት",
+    "ዓ.ም": "ዓመተ ምህረት",
+}
+# What a service predating batches answers to {"texts": [...]}: it only reads "text"
+LEGACY_MISSING_TEXT_MESSAGE = "Text is required"
+# ASCII punctuation plus Ethiopic wordspace, full stop, commas, colons and question mark
+_PUNCTUATION = re.compile(r"[!\"&'()*+,\-./:;<=>?@\[\]^_`{|}~፡-፨]")
+
+
+def local_stem(text: str) -> str:
+    """
+    In-process fallback used while the stemmer service is unreachable. It only
+    normalizes (abbreviations, punctuation, whitespace) and does not strip affixes,
+    so recall is lower than with the service, but text stays searchable.
+    """
+    for abbreviation, expansion in AMHARIC_ABBREVIATIONS.items():
+        text = text.replace(abbreviation, expansion)
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class StemmerCache:
+    """LRU cache of stemmed outputs keyed by text hash, backed by SQLite on disk."""
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS stems (key TEXT PRIMARY KEY, stemmed TEXT NOT NULL)")
+            self._db.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+            if missing and self._db is not None:
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, stemmed FROM stems WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, stemmed in rows:
+                        found[key] = stemmed
+                        self._remember(key, stemmed)
+        return found
+
+    def put_many(self, items: Dict[str, str]):
+        if not items:
+            return
+        with self._lock:
+            for key, stemmed in items.items():
+                self._remember(key, stemmed)
+            if self._db is not None:
+                self._db.executemany("INSERT OR REPLACE INTO stems (key, stemmed) VALUES (?, ?)", items.items())
+                self._db.commit()
+
+    def _remember(self, key: str, stemmed: str):
+        self._memory[key] = stemmed
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class StemmerClient:
+    """
+    Async client for the Amharic stemmer service.
+
+    Texts are deduplicated and looked up in the cache first; the rest are sent
+    in batched requests (`{"texts": [...]}`) over a pooled HTTP client, with at
+    most `max_concurrency` requests in flight. A batch the service rejects as
+    too large (413) is split in half, and rate-limited requests (429) are
+    retried with backoff. Batching is only given up for good when the service
+    clearly predates it (404/405, or the legacy "Text is required" 400). When
+    the service fails, the affected texts go through `local_stem` and are not
+    cached.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        cache: Optional[StemmerCache] = None,
+        batch_size: int = 64,
+        batch_max_chars: int = 32000,  # keeps batches under the service's request body limit
+        max_concurrency: int = 4,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,  # seconds
+        backoff_max: float = 8.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_url = api_url
+        self.cache = cache if cache is not None else StemmerCache()
+        self.batch_size = batch_size
+        self.batch_max_chars = batch_max_chars
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._supports_batch = True
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                transport=self._transport
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def stem(self, text: str) -> str:
+        return (await self.stem_many([text]))[0]
+
+    async def stem_many(self, texts: Sequence[str]) -> List[str]:
+        """Stem every text, preserving order."""
+        keys = [text_key(text) for text in texts]
+        results = await asyncio.to_thread(self.cache.get_many, list(set(keys)))
+
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in results and key not in pending:
+                pending[key] = text
+
+        if pending:
+            batches = self._batches(list(pending.items()))
+            stemmed = await asyncio.gather(*(self._stem_batch(batch) for batch in batches))
+            fresh: Dict[str, str] = {}
+            for batch, outputs in zip(batches, stemmed):
+                for (key, text), output in zip(batch, outputs):
+                    if output is None:
+                        results[key] = local_stem(text)
+                    else:
+                        # An empty result means nothing survived stemming; keep the original text
+                        results[key] = fresh[key] = output or text
+            await asyncio.to_thread(self.cache.put_many, fresh)
+            logger.info(
+                f"Stemmed {len(pending)} texts in {len(batches)} request(s), "
+                f"{len(texts) - len(pending)} served from cache"
+            )
+
+        return [results[key] for key in keys]
+
+    def _batches(self, items):
+        batches, current, chars = [], [], 0
+        for item in items:
+            if current and (len(current) >= self.batch_size or chars + len(item[1]) > self.batch_max_chars):
+                batches.append(current)
+                current, chars = [], 0
+            current.append(item)
+            chars += len(item[1])
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _stem_batch(self, batch) -> List[Optional[str]]:
+        """Stem one batch via the service; None for each text it could not stem."""
+        return await self._stem_texts([text for _, text in batch])
+
+    async def _stem_texts(self, texts: List[str]) -> List[Optional[str]]:
+        try:
+            if self._supports_batch:
+                response = await self._post({"texts": texts})
+                if response.status_code == 200 and "stemmedTexts" in response.json():
+                    return response.json()["stemmedTexts"]
+                if response.status_code == 413 and len(texts) > 1:
+                    middle = len(texts) // 2
+                    first, second = await asyncio.gather(
+                        self._stem_texts(texts[:middle]), self._stem_texts(texts[middle:])
+                    )
+                    return first + second
+                if not self._rejects_batches(response):
+                    response.raise_for_status()
+                    raise ValueError(f"Unexpected stemmer response with status {response.status_code}")
+                logger.info("Stemmer service does not support batches, stemming texts one by one")
+                self._supports_batch = False
+
+            outputs = []
+            for text in texts:
+                response = await self._post({"text": text})
+                response.raise_for_status()
+                outputs.append(response.json().get("stemmedText", ""))
+            return outputs
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Error communicating with the stemmer API, using local fallback: {e!r}")
+            return [None] * len(texts)
+
+    @staticmethod
+    def _rejects_batches(response: httpx.Response) -> bool:
+        """Whether the service predates batched requests, as opposed to failing this one."""
+        if response.status_code in (404, 405):
+            return True
+        if response.status_code != 400:
+            return False
+        try:
+            return response.json().get("msg") == LEGACY_MISSING_TEXT_MESSAGE
+        except ValueError:
+            return False
+
+    async def _post(self, payload) -> httpx.Response:
+        """POST under the concurrency limit, backing off and retrying while rate limited."""
+        client = self.client
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                response = await client.post(self.api_url, json=payload)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            logger.warning(f"Stemmer service is rate limiting (attempt {attempt + 1})")
+            await asyncio.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+        return response
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the service sends it."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.cache.close()
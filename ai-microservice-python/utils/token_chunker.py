@@ -0,0 +1,116 @@
+# token_chunker.py
+import copy
+import itertools
+import logging
+import threading
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from utils.segmenter import ARTICLE_PATTERN, iter_sentences
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BATCH = 1024  # sentences tokenized per call
+
+
+class TokenBudgetChunker:
+    """
+    Packs sentences into chunks that fit the embedding model's input exactly,
+    measured with the model's own tokenizer, so no chunk is silently truncated
+    when it is encoded.
+
+    Sentences are tokenized in batches and packed greedily up to `max_tokens`;
+    an article header always starts a new chunk. When a chunk fills up, the next
+    one repeats up to `overlap_tokens` worth of its trailing sentences. A
+    sentence longer than the budget is cut into budget-sized token windows.
+    """
+
+    def __init__(self, tokenizer: Any, limit: int, max_tokens: Optional[int] = None, overlap_tokens: int = 0):
+        # A private copy: fast tokenizers must not be shared with threads encoding at the same time
+        self._tokenizer = copy.deepcopy(tokenizer)
+        self._lock = threading.Lock()
+        self.limit = limit  # tokens the model sees; anything past this is truncated
+        self.max_tokens = min(max_tokens, limit) if max_tokens else limit
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+
+    @classmethod
+    def for_model(cls, model: Any, max_tokens: Optional[int] = None, overlap_tokens: int = 0) -> Optional["TokenBudgetChunker"]:
+        """Build a chunker for a SentenceTransformer, or None if it exposes no tokenizer."""
+        tokenizer = getattr(model, "tokenizer", None)
+        max_seq_length = getattr(model, "max_seq_length", None)
+        if tokenizer is None or not max_seq_length:
+            logger.warning("Embedding model exposes no tokenizer; token-aware chunking is unavailable")
+            return None
+        limit = max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+        return cls(tokenizer, limit, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+    def count(self, texts: List[str]) -> List[int]:
+        """Token counts of `texts` without special tokens, in one tokenizer call."""
+        if not texts:
+            return []
+        with self._lock:
+            encoded = self._tokenizer(texts, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def split(self, text: str) -> List[str]:
+        """Cut text into consecutive windows of at most `max_tokens` tokens."""
+        if not getattr(self._tokenizer, "is_fast", False):
+            return [text]  # offsets need a fast tokenizer; the excess shows up in the truncation stats
+        with self._lock:
+            offsets = self._tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        windows = []
+        for first in range(0, len(offsets), self.max_tokens):
+            last = min(first + self.max_tokens, len(offsets)) - 1
+            end = offsets[last + 1][0] if last + 1 < len(offsets) else len(text)
+            window = text[offsets[first][0]:end].strip()
+            if window:
+                windows.append(window)
+        return windows
+
+    def _counted_sentences(self, text: str, language: str) -> Iterator[Tuple[str, int]]:
+        sentences = (sentence for sentence, _ in iter_sentences(text, language))
+        while True:
+            batch = list(itertools.islice(sentences, SENTENCE_BATCH))
+            if not batch:
+                return
+            yield from zip(batch, self.count(batch))
+
+    def _pack(self, sentences: Iterable[Tuple[str, int]]) -> Iterator[str]:
+        chunk: List[Tuple[str, int]] = []
+        total = 0
+        for sentence, length in sentences:
+            is_article = bool(ARTICLE_PATTERN.match(sentence))
+            if length <= self.max_tokens:
+                pieces = [(sentence, length)]
+            else:
+                windows = self.split(sentence)
+                pieces = list(zip(windows, self.count(windows)))
+            for piece, piece_length in pieces:
+                if chunk and (is_article or total + piece_length > self.max_tokens):
+                    yield " ".join(text for text, _ in chunk)
+                    # Articles start clean; otherwise carry trailing sentences as overlap
+                    carried: List[Tuple[str, int]] = []
+                    if not is_article:
+                        budget = min(self.overlap_tokens, self.max_tokens - piece_length)
+                        for text, text_length in reversed(chunk):
+                            if text_length > budget:
+                                break
+                            carried.insert(0, (text, text_length))
+                            budget -= text_length
+                    chunk, total = carried, sum(text_length for _, text_length in carried)
+                chunk.append((piece, piece_length))
+                total += piece_length
+                is_article = False
+        if chunk:
+            yield " ".join(text for text, _ in chunk)
+
+    def chunks(self, text: str, language: str = "en") -> List[str]:
+        """
+        Chunk text to the token budget. Packing adds sentence lengths, and joining
+        sentences can tokenize slightly differently, so the packed chunks are
+        measured again and any that still exceed the budget are split.
+        """
+        packed = list(self._pack(self._counted_sentences(text, language)))
+        result = []
+        for chunk, length in zip(packed, self.count(packed)):
+            result.extend(self.split(chunk) if length > self.max_tokens else [chunk])
+        return result
@@ -34,7 +34,8 @@ async function uploadDocument(file, metadata, userId) {
 
   await newDoc.save();
   const pdfFullPath = path.resolve(file.path).replace(/\\/g, '/'); // Replace backslashes
-  const aiServiceUrl = process.env.AI_SERVICE_URL;
+  // Embedding writes to the index, so it goes to the writer instance when read replicas are deployed
+  const aiServiceUrl = process.env.AI_WRITER_URL || process.env.AI_SERVICE_URL;
 
   if (!fs.existsSync(pdfFullPath)) {
     newDoc.status = 'failed';
@@ -53,19 +54,21 @@ async function uploadDocument(file, metadata, userId) {
     form.append('languages', language);
     form.append('bot_ids', bot_id.toString());
 
+    // The AI service queues the document and answers right away; progress is
+    // polled through GET /api/documents/:id/status
     const response = await axios.post(`${aiServiceUrl}/embed_documents`, form, {
       headers: form.getHeaders(),
-      timeout: 300000, // 5-minute timeout
+      timeout: 30000,
     });
 
-    // Update document status on success
-    newDoc.status = 'completed';
-    newDoc.processingError = null;
+    const [job] = response.data.jobs || [];
+    newDoc.processingJobId = job ? job.job_id : null;
     await newDoc.save();
 
     return {
       docId: newDoc._id,
-      chunksAdded: response.data.chunks_added,
+      jobId: newDoc.processingJobId,
+      status: newDoc.status,
     };
   } catch (error) {
     newDoc.status = 'failed';
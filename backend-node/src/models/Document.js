@@ -8,6 +8,7 @@ const DocumentSchema = new mongoose.Schema(
     status: { type: String, enum: ['processing', 'completed', 'failed'], default: 'processing' },
     processingError: { type: String, default: null },
     processingProgress: { type: Number, default: 0 },
+    processingJobId: { type: String, default: null }, // AI service ingestion job
     category: { type: String, default: 'uncategorized' },
     docScope: {
       type: String,
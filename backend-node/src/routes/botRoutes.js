@@ -130,8 +130,8 @@ router.post("/add", authMiddleware, upload.array("files"), async (req, res) => {
           formData.append('doc_ids', docId);
         });
         
-        // Call the endpoint to associate documents
-        const aiServiceUrl = process.env.AI_SERVICE_URL || 'http://localhost:8000';
+        // Call the endpoint to associate documents (writes go to the writer instance)
+        const aiServiceUrl = process.env.AI_WRITER_URL || process.env.AI_SERVICE_URL || 'http://localhost:8000';
         await axios.post(`${aiServiceUrl}/associate_documents_with_bot`, formData, {
           headers: { 'Content-Type': 'multipart/form-data' }
         });
@@ -70,7 +70,7 @@ router.post("/upload", authMiddleware, upload.array("files", 1000), async (req,
     res.json({
       msg: errors.length
         ? "Some files failed to process"
-        : "All files processed successfully",
+        : "All files queued for processing",
       results,
       errors,
     });
@@ -145,7 +145,30 @@ router.get("/:id/status", authMiddleware, async (req, res) => {
       return res.status(404).json({ msg: "Document not found." });
     }
 
-    res.json({ status: document.status });
+    if (document.status === "processing") {
+      // Ingestion runs as a background job on the AI service; sync its progress
+      try {
+        const aiServiceUrl = process.env.AI_WRITER_URL || process.env.AI_SERVICE_URL || "http://localhost:8000";
+        const { data } = await axios.get(`${aiServiceUrl}/documents/${docId}/status`, { timeout: 5000 });
+        if (data.status === "completed") {
+          document.status = "completed";
+          document.processingError = null;
+        } else if (data.status === "failed" || data.status === "cancelled") {
+          document.status = "failed";
+          document.processingError = data.error || data.status;
+        }
+        document.processingProgress = data.progress || 0;
+        await document.save();
+      } catch (error) {
+        console.error(`Error fetching processing status for ${docId}:`, error.message);
+      }
+    }
+
+    res.json({
+      status: document.status,
+      progress: document.processingProgress,
+      error: document.processingError,
+    });
   } catch (err) {
     console.error("Status fetch error:", err);
     res.status(500).json({ msg: "Server error while fetching status." });
@@ -206,6 +229,17 @@ router.delete("/:id", authMiddleware, async (req, res) => {
       }
     }
 
+    // Remove the document's chunks from the AI service indices (writes go to the writer instance)
+    const aiServiceUrl = process.env.AI_WRITER_URL || process.env.AI_SERVICE_URL || "http://localhost:8000";
+    try {
+      await axios.delete(`${aiServiceUrl}/documents/${docId}`);
+    } catch (error) {
+      // 404 means the document was never embedded
+      if (!error.response || error.response.status !== 404) {
+        console.error(`Error removing document ${docId} from AI service:`, error.message);
+      }
+    }
+
     // Delete the document record
     await Document.deleteOne({ _id: docId });
 
@@ -5,7 +5,19 @@ const { stateOfTheArtAmharicStemmer } = require('../helpers/amh_stemmer');
 console.log('State of the Art Amharic Stemmer:', typeof stateOfTheArtAmharicStemmer); // Should log 'function'
 
 router.post('/stem', (req, res) => {
-    const { text } = req.body;
+    const { text, texts } = req.body;
+
+    // Batched form: { texts: [...] } -> { stemmedTexts: [...] }
+    if (Array.isArray(texts)) {
+        try {
+            const stemmedTexts = texts.map((t) => (t ? stateOfTheArtAmharicStemmer(t) : ''));
+            console.log(`Stemmed ${texts.length} texts`);
+            return res.json({ stemmedTexts });
+        } catch (error) {
+            console.error('Error in stemming:', error.message);
+            return res.status(500).json({ msg: 'Server error in stemming text' });
+        }
+    }
 
     if (!text) {
         return res.status(400).json({ msg: 'Text is required' });